@@ -1,8 +1,10 @@
 from typing import Dict, Any, List
-from .config import AgentState
+from .config import AgentState, ExecutionEngine
 from .graph import create_graph
 from app.models.data_sources import DataSource
 from app.models.agent_response import FormatResponseLLMResponse
+from app.models.cost_estimate import CostEstimate
+from app.models.relationships import Relationship
 from pydantic import BaseModel
 from typing import Optional
 
@@ -11,6 +13,8 @@ class DataAnalysisAgentResponse(BaseModel):
     query: str
     result: FormatResponseLLMResponse
     code_generated: Optional[str] = None
+    execution_engine: Optional[ExecutionEngine] = None
+    cost_estimate: Optional[CostEstimate] = None
 
 
 class DataAnalysisAgent:
@@ -19,13 +23,15 @@ class DataAnalysisAgent:
     def __init__(self):
         self.graph = create_graph()
 
-    async def analyze(self, project_id: str, query: str, datasets: List[DataSource], past_messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def analyze(self, project_id: str, query: str, datasets: List[DataSource], past_messages: List[Dict[str, Any]], engine_preference: Optional[str] = None, relationships: Optional[List[Relationship]] = None) -> Dict[str, Any]:
         """
         Analyze data based on user query
 
         Args:
             project_id: The project ID containing the datasets
             query: Natural language query from user
+            engine_preference: Execution engine configured for the project, if any
+            relationships: Known relationships between the datasets, used to estimate join costs
 
         Returns:
             Analysis results
@@ -35,7 +41,9 @@ class DataAnalysisAgent:
             project_id=project_id,
             current_query=query,
             datasets=datasets,
-            past_messages=past_messages
+            past_messages=past_messages,
+            engine_preference=engine_preference,
+            relationships=relationships or []
         )
 
         # Run the graph using run_sync
@@ -43,5 +51,7 @@ class DataAnalysisAgent:
         return DataAnalysisAgentResponse(
             query=query,
             result=result.get("formatted_response", None),
-            code_generated=result.get("generated_code", None)
+            code_generated=result.get("generated_code", None),
+            execution_engine=result.get("execution_engine", None),
+            cost_estimate=result.get("cost_estimate", None)
         )
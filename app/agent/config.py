@@ -1,10 +1,16 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import List, Dict, Any, Optional, Union, ClassVar
+from typing import List, Dict, Any, Optional, Union, ClassVar, Literal
 from app.models.visuals import VisualConcept, VisualData
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from app.config import get_settings, Settings
 from app.models.agent_response import Intent, AnalyzeQuestionLLMResponse, FormatResponseLLMResponse
 from app.models.data_sources import DataSource
+from app.models.relationships import Relationship
+from app.models.cost_estimate import CostEstimate
+
+
+# Engine that answered a question; "plan" when the planner's operation plan ran without generated code
+ExecutionEngine = Literal["pandas", "polars", "duckdb", "plan"]
 
 
 class AgentConfig(BaseModel):
@@ -27,9 +33,19 @@ class AgentState(BaseModel):
     intent: Intent = Intent.UNKNOWN
     datasets: Optional[List[DataSource]] = []
     required_datasets: Optional[List[DataSource]] = []
+    required_columns: Optional[Dict[str, List[str]]] = None
+    relationships: Optional[List[Relationship]] = []
     current_query: Optional[str] = None
     past_messages: Optional[List[Dict[str, Any]]] = []
+    # Engine requested for the project ("pandas", "polars", "duckdb", "auto"); None uses the EXECUTION_ENGINE setting
+    engine_preference: Optional[str] = None
+    # Engine that answered (see ExecutionEngine)
+    execution_engine: Optional[ExecutionEngine] = None
     generated_code: Optional[str] = None
+    # Static cost estimate of generated_code and the strategy chosen for it
+    cost_estimate: Optional[CostEstimate] = None
+    # Times the code was sent back to the LLM with cost_estimate.hint
+    cost_regenerations: int = 0
     execution_result: Optional[Any] = None
     formatted_response: Optional[FormatResponseLLMResponse] = None
     messages: List[Union[SystemMessage, HumanMessage,
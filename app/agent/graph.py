@@ -2,14 +2,23 @@ from langgraph.graph import StateGraph, END
 from app.agent.config import AgentState
 from app.agent.node_functions.classify import classify_query
 from app.agent.node_functions.analyze import analyze_intent
+from app.agent.node_functions.select_engine import select_engine
 from app.agent.node_functions.generate_code import generate_code
+from app.agent.node_functions.generate_sql import generate_sql
+from app.agent.node_functions.estimate_cost import estimate_cost
 from app.agent.node_functions.format import format_response
 from app.agent.node_functions.execute_code import execute_code_node
+from app.agent.node_functions.execute_sql import execute_sql_node
+from app.agent.node_functions.execute_plan import execute_plan_node
 from app.agent.node_functions.handle_non_data_query import handle_non_data_query
 from app.agent.node_functions.create_visual_concept import create_visual_concept
 from app.agent.node_functions.generate_demo_visual_data import generate_demo_visual_data
 from app.agent.node_functions.generate_visual_code import generate_visual_code
 from app.models.agent_response import Intent
+from app.models.cost_estimate import CostStrategy
+from app.config import get_settings
+
+settings = get_settings()
 
 
 def route_intent(state: AgentState) -> str:
@@ -21,6 +30,30 @@ def route_intent(state: AgentState) -> str:
         return "handle_non_data_query"
 
 
+def route_engine(state: AgentState) -> str:
+    if state.execution_engine == "duckdb":
+        return "generate_sql"
+    if settings.OPERATION_PLANS_ENABLED and getattr(state.analysis, "operation_plan", None):
+        return "execute_plan"
+    return "generate_code"
+
+
+def route_plan(state: AgentState) -> str:
+    # A plan that could not run leaves no result behind
+    if state.execution_result is None:
+        return "generate_code"
+    return "format_response"
+
+
+def route_cost(state: AgentState) -> str:
+    strategy = state.cost_estimate.strategy if state.cost_estimate else CostStrategy.RUN
+    if strategy == CostStrategy.REGENERATE:
+        return "generate_code"
+    if strategy == CostStrategy.COLUMNAR:
+        return "generate_sql"
+    return "execute_code"
+
+
 def create_graph() -> StateGraph:
     """Create the agent workflow graph"""
 
@@ -29,11 +62,16 @@ def create_graph() -> StateGraph:
     # Nodes
     workflow.add_node("classify_query", classify_query)
     workflow.add_node("analyze_intent", analyze_intent)
+    workflow.add_node("select_engine", select_engine)
     workflow.add_node("generate_code", generate_code)
+    workflow.add_node("generate_sql", generate_sql)
+    workflow.add_node("estimate_cost", estimate_cost)
     workflow.add_node("create_visual_concept", create_visual_concept)
     workflow.add_node("generate_demo_visual_data", generate_demo_visual_data)
     workflow.add_node("generate_visual_code", generate_visual_code)
     workflow.add_node("execute_code", execute_code_node)
+    workflow.add_node("execute_sql", execute_sql_node)
+    workflow.add_node("execute_plan", execute_plan_node)
     workflow.add_node("format_response", format_response)
     workflow.add_node("handle_non_data_query", handle_non_data_query)
 
@@ -44,12 +82,26 @@ def create_graph() -> StateGraph:
         lambda state: route_intent(state)
     )
 
-    workflow.add_edge("analyze_intent", "generate_code")
-    workflow.add_edge("generate_code", "execute_code")
+    workflow.add_edge("analyze_intent", "select_engine")
+    workflow.add_conditional_edges(
+        "select_engine",
+        lambda state: route_engine(state)
+    )
+    workflow.add_conditional_edges(
+        "execute_plan",
+        lambda state: route_plan(state)
+    )
+    workflow.add_edge("generate_code", "estimate_cost")
+    workflow.add_conditional_edges(
+        "estimate_cost",
+        lambda state: route_cost(state)
+    )
+    workflow.add_edge("generate_sql", "execute_sql")
     workflow.add_edge("create_visual_concept", "generate_demo_visual_data")
     workflow.add_edge("generate_demo_visual_data", "generate_visual_code")
     workflow.add_edge("generate_visual_code", "execute_code")
     workflow.add_edge("execute_code", "format_response")
+    workflow.add_edge("execute_sql", "format_response")
     workflow.add_edge("format_response", END)
     workflow.add_edge("handle_non_data_query", END)
 
@@ -2,7 +2,7 @@ from typing import Dict, Any, List
 from app.utils.prompt_engine import render_prompt
 from app.agent.config import AgentState
 from app.utils.llm_provider import ainvoke_llm
-from app.models.agent_response import AnalyzeQuestionLLMResponse
+from app.models.agent_response import AnalyzeQuestionLLMResponse, DatasetColumns
 from app.models.data_sources import DataSource
 
 
@@ -22,12 +22,25 @@ async def analyze_intent_llm(query: str, datasets: List[DataSource], past_messag
     return result
 
 
+def get_column_projection(required_columns: List[DatasetColumns], datasets: List[DataSource]) -> Dict[str, List[str]]:
+    """Keep the known columns the planner asked for, per dataset. Datasets without any are loaded in full."""
+    known_columns = {str(d.id): {col.name for col in d.columnMetadata} for d in datasets}
+    projection = {}
+    for dataset_columns in required_columns:
+        columns = [c for c in dataset_columns.columns if c in known_columns.get(dataset_columns.dataset_id, set())]
+        if columns:
+            projection[dataset_columns.dataset_id] = columns
+    return projection
+
+
 async def analyze_intent(state: AgentState) -> Dict[str, Any]:
     try:
         result: AnalyzeQuestionLLMResponse = await analyze_intent_llm(state.current_query, state.datasets, state.past_messages)
         state.analysis = result
         state.required_datasets = [d for d in state.datasets if str(
             d.id) in result.required_dataset_ids]
+        state.required_columns = get_column_projection(
+            result.required_columns, state.required_datasets)
         return state
     except Exception as e:
         raise e
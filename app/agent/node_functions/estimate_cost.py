@@ -0,0 +1,36 @@
+import logging
+from app.agent.config import AgentState
+from app.config import get_settings
+from app.models.cost_estimate import CostStrategy
+from app.utils.cost_estimator import estimate_code_cost, choose_strategy
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def estimate_cost(state: AgentState) -> AgentState:
+    """Estimate the cost of the generated code before running it and pick a strategy"""
+    if not settings.COST_ESTIMATION_ENABLED:
+        return state
+    datasets = state.required_datasets if state.required_datasets else state.datasets
+    estimate = estimate_code_cost(state.generated_code, datasets, state.relationships)
+    if estimate is None:
+        return state
+
+    # Only an "auto" engine may be switched; a project pinned to an engine keeps it
+    preference = state.engine_preference or settings.EXECUTION_ENGINE
+    state.cost_estimate = choose_strategy(
+        estimate,
+        can_regenerate=state.cost_regenerations < settings.COST_MAX_REGENERATIONS,
+        can_use_columnar=preference == "auto"
+    )
+    logger.info(
+        f"Estimated {estimate.estimated_seconds}s for generated code "
+        f"({estimate.rows_scanned} rows, {len(estimate.operations)} costly operations): {estimate.strategy.value}"
+    )
+    if estimate.strategy == CostStrategy.REGENERATE:
+        state.cost_regenerations += 1
+    elif estimate.strategy == CostStrategy.COLUMNAR:
+        state.execution_engine = "duckdb"
+    return state
@@ -1,15 +1,53 @@
-from app.utils.code_executer import execute_pandas_code
-from app.utils.blob_storage import get_dataframes_dict
+import logging
+import time
+from app.utils.code_sandbox import run_generated_code
+from app.utils.code_analysis import widen_column_projection, get_code_column_projection
+from app.utils.blob_storage import lazy_dataframes_dict
 from app.utils.json_encoders import ensure_json_serializable
+from app.utils.result_cache import get_result_key, get_cached_result, cache_result
 from app.agent.config import AgentState
+from app.models.cost_estimate import CostStrategy
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 
 async def execute_code_node(state: AgentState) -> AgentState:
     """Execute the generated code and update state"""
-    dataframes = await get_dataframes_dict(state.required_datasets)
+    engine = state.execution_engine or "pandas"
+    state.execution_engine = engine
+    # An identical question over unchanged data needs no rerun
+    result_key = get_result_key(state.generated_code, state.required_datasets, engine)
+    is_cached, result = await get_cached_result(result_key)
+    if is_cached:
+        logger.info("Using memoised result of generated code")
+        state.execution_result = result
+        return state
+
+    # The planner's projection where it gave one, otherwise the columns the code names
+    projection = {
+        **get_code_column_projection(state.generated_code, state.required_datasets),
+        **widen_column_projection(state.generated_code, state.required_datasets, state.required_columns),
+    }
     print("EXECUTING THIS CODE")
     print(state.generated_code)
-    result = execute_pandas_code(
-        state.generated_code, dataframes)
+    estimate = state.cost_estimate
+    # Datasets are only loaded once the code reads them; a column outside the projection
+    # makes the worker load the full dataset and rerun
+    async with lazy_dataframes_dict(state.required_datasets, columns=projection) as (dataframes, load_frame, load_derived):
+        if estimate and estimate.strategy == CostStrategy.SAMPLE:
+            # Expensive code runs on a sample first, so errors surface before the full run
+            started_at = time.perf_counter()
+            await run_generated_code(
+                state.generated_code, dataframes, engine, sample_rows=estimate.sample_rows,
+                load_frame=load_frame, load_derived=load_derived)
+            estimate.sample_seconds = round(time.perf_counter() - started_at, 3)
+            if estimate.rows_scanned:
+                estimate.extrapolated_seconds = round(
+                    estimate.sample_seconds * max(1, estimate.rows_scanned / estimate.sample_rows), 3)
+            logger.info(f"Sample run took {estimate.sample_seconds}s, full run extrapolated to {estimate.extrapolated_seconds}s")
+        result = await run_generated_code(
+            state.generated_code, dataframes, engine, load_frame=load_frame, load_derived=load_derived)
+    await cache_result(result_key, result, state.required_datasets)
     state.execution_result = ensure_json_serializable(result)
     return state
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from app.agent.config import AgentState
+from app.utils.blob_storage import get_dataframes_dict
+from app.utils.json_encoders import ensure_json_serializable
+from app.utils.plan_interpreter import execute_plan, get_plan_columns, validate_plan
+from app.utils.result_cache import get_result_key, get_cached_result, cache_result
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+async def execute_plan_node(state: AgentState) -> AgentState:
+    """
+    Run the planner's operation plan. When the plan does not fit the data, execution_result
+    stays unset and the graph falls back to generating code.
+    """
+    plan = state.analysis.operation_plan
+    datasets = state.required_datasets if state.required_datasets else state.datasets
+    plan_json = plan.model_dump_json()
+    try:
+        validate_plan(plan, datasets)
+        result_key = get_result_key(plan_json, datasets, "plan")
+        is_cached, result = await get_cached_result(result_key)
+        if not is_cached:
+            plan_datasets = [d for d in datasets if str(d.id) in get_plan_columns(plan)]
+            # Only the columns the plan touches are loaded; a dataset that is only counted still needs one
+            projection = {
+                str(d.id): get_plan_columns(plan)[str(d.id)] or [d.columnMetadata[0].name]
+                for d in plan_datasets if d.columnMetadata
+            }
+            # The interpreter never modifies its inputs, so cached frames are used without copying
+            dataframes = await get_dataframes_dict(plan_datasets, columns=projection, copy=False)
+            result = await asyncio.to_thread(execute_plan, plan, plan_datasets, dataframes)
+            await cache_result(result_key, result, datasets)
+    except Exception as e:
+        logger.warning(f"Operation plan failed, falling back to generated code: {str(e)}")
+        return state
+
+    state.execution_engine = "plan"
+    state.generated_code = plan_json
+    state.execution_result = ensure_json_serializable(result)
+    return state
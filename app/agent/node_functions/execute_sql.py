@@ -0,0 +1,25 @@
+import logging
+from app.utils.duckdb_engine import execute_duckdb_query
+from app.utils.json_encoders import ensure_json_serializable
+from app.utils.result_cache import get_result_key, get_cached_result, cache_result
+from app.agent.config import AgentState
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+async def execute_sql_node(state: AgentState) -> AgentState:
+    """Run the generated SQL with DuckDB and update state"""
+    logger.debug(f"Executing SQL: {state.generated_code}")
+    data_sources = state.required_datasets if state.required_datasets else state.datasets
+    state.execution_engine = "duckdb"
+    result_key = get_result_key(state.generated_code, data_sources, "duckdb")
+    is_cached, result = await get_cached_result(result_key)
+    if is_cached:
+        state.execution_result = result
+        return state
+
+    result = await execute_duckdb_query(state.generated_code, data_sources)
+    await cache_result(result_key, result, data_sources)
+    state.execution_result = ensure_json_serializable(result)
+    return state
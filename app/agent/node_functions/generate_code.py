@@ -3,15 +3,36 @@ from app.agent.config import AgentState
 from app.utils.llm_provider import ainvoke_llm
 from app.utils.prompt_engine import render_prompt
 from app.models.data_sources import DataSource
+from app.models.relationships import Relationship
+from app.utils.key_index import get_indexed_columns
 
 
-async def generate_code_llm(query: str, operations: list, datasets: list[DataSource]) -> str:
-    user_prompt = render_prompt("generate_code/user.jinja", {
+# Prompt directory of each engine that runs generated Python
+CODE_PROMPTS = {
+    "pandas": "generate_code",
+    "polars": "generate_polars_code",
+}
+
+
+async def generate_code_llm(query: str, operations: list, datasets: list[DataSource], columns: dict[str, list[str]] = None, engine: str = "pandas", performance_hint: str = None, relationships: list[Relationship] = None) -> str:
+    columns = columns or {}
+    prompt_dir = CODE_PROMPTS.get(engine, "generate_code")
+    # The index helpers live on the pandas datasets mapping; only offer columns that will be loaded
+    indexed_columns = {}
+    if engine == "pandas":
+        for data_source_id, indexed in get_indexed_columns(datasets, relationships).items():
+            loaded = [column for column in indexed if not columns.get(data_source_id) or column in columns[data_source_id]]
+            if loaded:
+                indexed_columns[data_source_id] = loaded
+    user_prompt = render_prompt(f"{prompt_dir}/user.jinja", {
         "query": query,
         "operations": operations,
-        "datasets": [d.to_llm_dict() for d in datasets]
+        # Only describe the columns that will actually be loaded
+        "datasets": [d.to_llm_dict(columns.get(str(d.id))) for d in datasets],
+        "performance_hint": performance_hint,
+        "indexed_columns": indexed_columns
     })
-    system_prompt = render_prompt("generate_code/system.jinja")
+    system_prompt = render_prompt(f"{prompt_dir}/system.jinja")
     result = await ainvoke_llm(
         user_prompt=user_prompt,
         system_prompt=system_prompt,
@@ -21,10 +42,16 @@ async def generate_code_llm(query: str, operations: list, datasets: list[DataSou
 
 
 async def generate_code(state: AgentState) -> Dict[str, Any]:
+    # Set when the previous attempt was estimated too expensive to run
+    performance_hint = state.cost_estimate.hint if state.cost_estimate else None
     code = await generate_code_llm(
         state.analysis.analysis_description if state.analysis else state.current_query,
         state.analysis.suggested_operations if state.analysis else [],
-        state.required_datasets if state.required_datasets else state.datasets
+        state.required_datasets if state.required_datasets else state.datasets,
+        state.required_columns,
+        state.execution_engine or "pandas",
+        performance_hint,
+        state.relationships
     )
     state.generated_code = code
     return state
@@ -0,0 +1,36 @@
+from typing import Dict, Any
+from app.agent.config import AgentState
+from app.utils.llm_provider import ainvoke_llm
+from app.utils.prompt_engine import render_prompt
+from app.utils.duckdb_engine import get_table_name, strip_sql_fences
+from app.models.data_sources import DataSource
+
+
+async def generate_sql_llm(query: str, operations: list, datasets: list[DataSource], columns: dict[str, list[str]] = None) -> str:
+    columns = columns or {}
+    user_prompt = render_prompt("generate_sql/user.jinja", {
+        "query": query,
+        "operations": operations,
+        "datasets": [
+            {**d.to_llm_dict(columns.get(str(d.id))), "table": get_table_name(str(d.id))}
+            for d in datasets
+        ]
+    })
+    system_prompt = render_prompt("generate_sql/system.jinja")
+    result = await ainvoke_llm(
+        user_prompt=user_prompt,
+        system_prompt=system_prompt,
+        profile="code"
+    )
+    return strip_sql_fences(result.content)
+
+
+async def generate_sql(state: AgentState) -> Dict[str, Any]:
+    sql = await generate_sql_llm(
+        state.analysis.analysis_description if state.analysis else state.current_query,
+        state.analysis.suggested_operations if state.analysis else [],
+        state.required_datasets if state.required_datasets else state.datasets,
+        state.required_columns
+    )
+    state.generated_code = sql
+    return state
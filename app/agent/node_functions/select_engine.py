@@ -0,0 +1,27 @@
+import logging
+from app.agent.config import AgentState, ExecutionEngine
+from app.config import get_settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def select_execution_engine(preference: str, total_size: int) -> ExecutionEngine:
+    """
+    Resolve an engine preference ("pandas", "polars", "duckdb" or "auto") to the engine that runs the question.
+    "auto" picks DuckDB once the data sources are too large to load comfortably into pandas.
+    """
+    if preference in ("pandas", "polars", "duckdb"):
+        return preference
+    return "duckdb" if total_size > settings.DUCKDB_AUTO_THRESHOLD_BYTES else "pandas"
+
+
+async def select_engine(state: AgentState) -> AgentState:
+    """Pick the engine that answers the question"""
+    datasets = state.required_datasets if state.required_datasets else state.datasets
+    total_size = sum(d.size for d in datasets)
+    state.execution_engine = select_execution_engine(
+        state.engine_preference or settings.EXECUTION_ENGINE, total_size)
+    logger.info(f"Answering with {state.execution_engine} over {len(datasets)} datasets ({total_size} bytes)")
+    return state
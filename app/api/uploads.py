@@ -3,8 +3,8 @@ from typing import List, Optional, Dict
 import uuid
 from datetime import datetime
 import pandas as pd
-from azure.storage.blob import BlobServiceClient
 from app.config import get_settings
+from app.utils.blob_storage import get_container_client
 from app.services.azure_ai import query_azure_openai
 from app.services.mongodb import get_database
 from bson.objectid import ObjectId
@@ -26,13 +26,8 @@ async def upload_csv_files(
     dataset_id = str(uuid.uuid4())
     file_metadata = []
     
-    # Initialize Azure Blob Storage client
-    blob_service_client = BlobServiceClient.from_connection_string(
-        settings.AZURE_STORAGE_CONNECTION_STRING
-    )
-    container_client = blob_service_client.get_container_client(
-        settings.AZURE_STORAGE_CONTAINER
-    )
+    # Shared Azure Blob Storage client
+    container_client = get_container_client()
     
     try:
         # Verify project exists if project_id is provided
@@ -60,7 +55,7 @@ async def upload_csv_files(
             
             # Upload to Azure Blob Storage
             blob_client = container_client.get_blob_client(safe_filename)
-            blob_client.upload_blob(content)
+            await blob_client.upload_blob(content)
             blob_urls[file.filename] = blob_client.url
             
             # Store basic file metadata
@@ -107,7 +102,7 @@ async def upload_csv_files(
                 blob_path = next((f["blob_path"] for f in file_metadata if f["filename"] == filename), None)
                 if blob_path:
                     blob_client = container_client.get_blob_client(blob_path)
-                    blob_client.delete_blob()
+                    await blob_client.delete_blob()
             except:
                 pass
         raise HTTPException(
@@ -142,13 +137,8 @@ async def analyze_dataset(
                 "relationships": dataset.get("relationships", [])
             }
         
-        # Initialize Azure Blob Storage client
-        blob_service_client = BlobServiceClient.from_connection_string(
-            settings.AZURE_STORAGE_CONNECTION_STRING
-        )
-        container_client = blob_service_client.get_container_client(
-            settings.AZURE_STORAGE_CONTAINER
-        )
+        # Shared Azure Blob Storage client
+        container_client = get_container_client()
         
         # Process each file
         dataframes = {}
@@ -164,7 +154,8 @@ async def analyze_dataset(
             try:
                 # Download blob content
                 blob_client = container_client.get_blob_client(blob_path)
-                blob_content = blob_client.download_blob().readall()
+                download_stream = await blob_client.download_blob()
+                blob_content = await download_stream.readall()
                 
                 # Process with pandas
                 import io
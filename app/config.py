@@ -17,7 +17,100 @@ class Settings(BaseSettings):
     # Azure Storage
     AZURE_STORAGE_CONNECTION_STRING: str
     AZURE_STORAGE_CONTAINER: str = "csvfiles"
+    AZURE_STORAGE_POOL_SIZE: int = 32
+    AZURE_STORAGE_CONNECTION_TIMEOUT: int = 20
+    AZURE_STORAGE_READ_TIMEOUT: int = 120
+
+    # Large blob streaming
+    BLOB_STREAMING_THRESHOLD_BYTES: int = 256 * 1024 * 1024
+    BLOB_DOWNLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+    BLOB_DOWNLOAD_CONCURRENCY: int = 4
+    BLOB_STREAM_MAX_BUFFERED_CHUNKS: int = 8
+
+    # CSV parsing: "pandas" or "pyarrow" (multi-threaded); CSV_ARROW_DTYPES keeps pyarrow frames Arrow-backed
+    CSV_PARSE_ENGINE: str = "pandas"
+    CSV_ARROW_DTYPES: bool = False
+    # Store new data sources with compact dtypes unless the project overrides it
+    COMPACT_DTYPES: bool = True
+    # Store text columns holding dates in a single format as datetime64, detected on this many values
+    CSV_PARSE_DATES: bool = True
+    DATE_DETECTION_SAMPLE_ROWS: int = 1000
+
+    # Parse pool
+    PARSE_POOL_KIND: str = "thread"
+    PARSE_POOL_WORKERS: int = 4
+    PARSE_POOL_MAX_QUEUE: int = 16
+    PARSE_JOB_TIMEOUT_SECONDS: int = 300
+    PARSE_SLOT_WAIT_TIMEOUT_SECONDS: int = 60
+
+    # Query engine: "pandas", "polars", "duckdb" or "auto" (DuckDB once the data sources exceed DUCKDB_AUTO_THRESHOLD_BYTES)
+    EXECUTION_ENGINE: str = "auto"
+    DUCKDB_AUTO_THRESHOLD_BYTES: int = 512 * 1024 * 1024
+    DUCKDB_MEMORY_LIMIT: str = "2GB"
+    DUCKDB_THREADS: int = 4
+    DUCKDB_WORK_DIR: str = "/tmp/duckdb"
+    DUCKDB_FILE_CACHE_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    DUCKDB_MAX_RESULT_ROWS: int = 10000
+    DUCKDB_QUERY_TIMEOUT_SECONDS: int = 300
+
+    # Operation plans: queries the planner expresses as data, run without generated code
+    OPERATION_PLANS_ENABLED: bool = True
+    PLAN_MAX_RESULT_ROWS: int = 10000
+    PLAN_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Materialised joins of high-confidence one-to-many relationships, stored as Parquet next to the sources
+    MATERIALIZED_JOINS_ENABLED: bool = True
+    MATERIALIZED_JOIN_MAX_ROWS: int = 10_000_000
+    # Failed builds are retried after this long even if neither side changed; at most this many are remembered
+    MATERIALIZED_JOIN_RETRY_SECONDS: int = 3600
+    MATERIALIZED_JOIN_MAX_FAILED_BUILDS: int = 1000
+
+    # Static cost estimation of generated code, in vectorised row operations per second
+    COST_ESTIMATION_ENABLED: bool = True
+    COST_UNITS_PER_SECOND: int = 20_000_000
+    COST_RUN_MAX_SECONDS: float = 10
+    COST_SAMPLE_ROWS: int = 100_000
+    COST_MAX_REGENERATIONS: int = 1
+
+    # Code sandbox: pre-forked worker processes that run generated code
+    SANDBOX_WORKERS: int = 4
+    SANDBOX_TIMEOUT_SECONDS: int = 60
+    # Heap and private allocations of each worker (RLIMIT_DATA); shared frames it maps do not count
+    SANDBOX_MEMORY_LIMIT_BYTES: int = 2 * 1024 * 1024 * 1024
+    SANDBOX_MAX_JOBS_PER_WORKER: int = 100
+    # Limit for each KPI of generate_stats
+    KPI_TIMEOUT_SECONDS: int = 30
+
+    # Shared-memory frames handed to sandbox workers without copying
+    SHARED_FRAMES_ENABLED: bool = True
+    SHARED_FRAMES_DIR: str = "/dev/shm/flowai-frames"
+    SHARED_FRAMES_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    # Never use more than this share of the filesystem holding SHARED_FRAMES_DIR (Docker's /dev/shm is 64 MB by default)
+    SHARED_FRAMES_MAX_FILESYSTEM_FRACTION: float = 0.5
+
+    # Compiled code cache, per process
+    CODE_CACHE_MAX_ENTRIES: int = 512
+
+    # Memoised results of generated code, keyed on the code and its data source versions
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL_SECONDS: int = 14 * 24 * 60 * 60
+    RESULT_CACHE_MAX_ENTRIES: int = 50000
+    RESULT_CACHE_MAX_RESULT_BYTES: int = 1024 * 1024
+
+    # DataFrame cache
+    DATAFRAME_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    DATAFRAME_LOAD_CONCURRENCY: int = 4
+    # Key indexes on relationship join columns and date columns, per process
+    KEY_INDEX_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Joins probe an index only when the indexed side has this many times the probe side's rows;
+    # hashing a small dimension table in merge is faster than probing its index
+    KEY_INDEX_JOIN_MIN_RATIO: float = 4.0
+    # Derived columns (parsed dates, periods, normalised text) of loaded frames, cached in the API process
+    # and handed to sandbox workers as shared frames
+    DERIVED_COLUMN_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # pandas copy-on-write: callers get shallow views of cached frames instead of deep copies
+    COPY_ON_WRITE: bool = True
 
 @lru_cache()
 def get_settings():
-    return Settings() 
\ No newline at end of file
+    return Settings() 
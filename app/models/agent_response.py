@@ -3,6 +3,7 @@
 from pydantic import BaseModel
 from enum import Enum
 from typing import List, Any, Optional
+from app.models.operation_plan import OperationPlan
 
 
 class Intent(str, Enum):
@@ -30,10 +31,18 @@ class ClassifyQueryLLMResponse(BaseModel):
     reason: str
 
 
+class DatasetColumns(BaseModel):
+    dataset_id: str
+    columns: List[str]
+
+
 class AnalyzeQuestionLLMResponse(BaseModel):
     required_dataset_ids: List[str]
     analysis_description: str
     suggested_operations: List[str]
+    required_columns: List[DatasetColumns] = []
+    # Set when the question fits the operation plan schema; runs without generating code
+    operation_plan: Optional[OperationPlan] = None
 
 
 class FormatResponseLLMResponse(BaseModel):
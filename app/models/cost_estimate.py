@@ -0,0 +1,42 @@
+from pydantic import BaseModel
+from enum import Enum
+from typing import List, Optional
+
+
+class CostStrategy(str, Enum):
+    # Cheap enough to run as generated
+    RUN = "run"
+    # Answer with SQL on DuckDB, which streams from disk and parallelises joins and aggregations
+    COLUMNAR = "columnar"
+    # Run on the first rows of each frame before the full run, to fail fast and measure
+    SAMPLE = "sample"
+    # Ask the LLM for a cheaper version of the code
+    REGENERATE = "regenerate"
+
+
+class OperationCost(BaseModel):
+    """Estimated cost of one operation in generated code"""
+    operation: str
+    line: int
+    # Rows the operation reads
+    rows: int
+    # Estimated rows the operation produces, for joins
+    output_rows: Optional[int] = None
+    # Cost in vectorised row operations
+    cost: float
+    note: Optional[str] = None
+
+
+class CostEstimate(BaseModel):
+    """Static cost estimate of generated code and the strategy chosen for it"""
+    rows_scanned: int
+    cost: float
+    estimated_seconds: float
+    operations: List[OperationCost] = []
+    strategy: CostStrategy = CostStrategy.RUN
+    # Instruction for the LLM when the strategy is to regenerate
+    hint: Optional[str] = None
+    # Filled in when the code was run on a sample first
+    sample_rows: Optional[int] = None
+    sample_seconds: Optional[float] = None
+    extrapolated_seconds: Optional[float] = None
@@ -1,10 +1,22 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 class DataSourceColumnMetadata(BaseModel):
     name: str
     type: str
+    # strftime format of a text column stored as datetime64, which CSV readers must convert it with
+    format: Optional[str] = None
+
+class CsvDialect(BaseModel):
+    encoding: str
+    delimiter: str
+
+class DataSourceLoadFailure(BaseModel):
+    dataSourceId: str
+    filename: str
+    blobPath: str
+    error: str
 
 class DataSource(BaseModel):
     id: str
@@ -13,6 +25,10 @@ class DataSource(BaseModel):
     filename: str
     blobPath: str
     blobUrl: str
+    columnarBlobPath: Optional[str] = None
+    dialect: Optional[CsvDialect] = None
+    # columnMetadata describes compact dtypes and loaders must produce them
+    compactDtypes: bool = False
     size: int
     rows: int
     columns: int
@@ -21,16 +37,31 @@ class DataSource(BaseModel):
     status: str
     createdAt: datetime
     lastUpdatedAt: datetime
-    def to_llm_dict(self) -> Dict[str, Any]:
-        """Convert the DataSource to a plain dictionary."""
+    def get_date_formats(self) -> Dict[str, str]:
+        """Date format of each column parsed to datetime64 at upload"""
+        return {col.name: col.format for col in self.columnMetadata if col.format}
+    def to_llm_dict(self, columns: Optional[list[str]] = None) -> Dict[str, Any]:
+        """Convert the DataSource to a plain dictionary, optionally limited to the given columns."""
+        if not columns:
+            return {
+                "id": self.id,
+                "type": self.type,
+                "filename": self.filename,
+                "rows": self.rows,
+                "columns": self.columns,
+                "sampleData": self.sampleData,
+                "columnMetadata": self.columnMetadata,
+                "blobPath": self.blobPath
+            }
+        column_metadata = [col for col in self.columnMetadata if col.name in columns]
         return {
             "id": self.id,
             "type": self.type,
             "filename": self.filename,
             "rows": self.rows,
-            "columns": self.columns,
-            "sampleData": self.sampleData,
-            "columnMetadata": self.columnMetadata,
+            "columns": len(column_metadata),
+            "sampleData": [{col.name: row.get(col.name) for col in column_metadata} for row in self.sampleData],
+            "columnMetadata": column_metadata,
             "blobPath": self.blobPath
         }
     
@@ -0,0 +1,49 @@
+from pydantic import BaseModel
+from typing import Dict
+from datetime import datetime
+from app.models.data_sources import DataSource, DataSourceColumnMetadata
+
+
+class MaterializedJoin(BaseModel):
+    """
+    A relationship's joined frame stored as Parquet next to its data sources,
+    offered to analysis as a virtual data source while both sides are unchanged.
+    """
+    dataSourceId: str
+    relationshipId: str
+    projectId: str
+    manyDataSourceId: str
+    oneDataSourceId: str
+    # Content version of each side the join was built from
+    sourceVersions: Dict[str, str]
+    filename: str
+    blobPath: str
+    blobUrl: str
+    compactDtypes: bool = False
+    size: int
+    rows: int
+    columns: int
+    sampleData: list[dict]
+    columnMetadata: list[DataSourceColumnMetadata]
+    createdAt: datetime
+
+    def to_data_source(self) -> DataSource:
+        """The virtual data source; its blob is the Parquet file, read like any columnar sidecar"""
+        return DataSource(
+            id=self.dataSourceId,
+            projectId=self.projectId,
+            type="join",
+            filename=self.filename,
+            blobPath=self.blobPath,
+            blobUrl=self.blobUrl,
+            columnarBlobPath=self.blobPath,
+            compactDtypes=self.compactDtypes,
+            size=self.size,
+            rows=self.rows,
+            columns=self.columns,
+            sampleData=self.sampleData,
+            columnMetadata=self.columnMetadata,
+            status="READY",
+            createdAt=self.createdAt,
+            lastUpdatedAt=self.createdAt,
+        )
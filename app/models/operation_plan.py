@@ -0,0 +1,82 @@
+from pydantic import BaseModel
+from enum import Enum
+from typing import List, Any, Optional
+
+
+class FilterOperator(str, Enum):
+    EQ = "eq"
+    NE = "ne"
+    GT = "gt"
+    GTE = "gte"
+    LT = "lt"
+    LTE = "lte"
+    IN = "in"
+    NOT_IN = "not_in"
+    BETWEEN = "between"
+    CONTAINS = "contains"
+    IS_NULL = "is_null"
+    NOT_NULL = "not_null"
+
+
+class AggregateFunction(str, Enum):
+    SUM = "sum"
+    MEAN = "mean"
+    MEDIAN = "median"
+    MIN = "min"
+    MAX = "max"
+    COUNT = "count"
+    NUNIQUE = "nunique"
+
+
+class JoinHow(str, Enum):
+    INNER = "inner"
+    LEFT = "left"
+
+
+class ColumnRef(BaseModel):
+    dataset_id: str
+    column: str
+
+
+class PlanFilter(BaseModel):
+    column: ColumnRef
+    operator: FilterOperator
+    # A list for "in"/"not_in", [low, high] for "between", unused for the null checks
+    value: Optional[Any] = None
+
+
+class PlanJoin(BaseModel):
+    """Join another dataset onto the plan's frame"""
+    dataset_id: str
+    left_on: List[ColumnRef]
+    right_on: List[str]
+    how: JoinHow = JoinHow.INNER
+
+
+class PlanAggregation(BaseModel):
+    # None counts rows
+    column: Optional[ColumnRef] = None
+    function: AggregateFunction
+    alias: str
+
+
+class PlanSort(BaseModel):
+    # Output column: a group_by column name or an aggregation alias
+    column: str
+    ascending: bool = True
+
+
+class OperationPlan(BaseModel):
+    """
+    A query expressed as data: filter, join, group, aggregate, sort and limit over the datasets.
+    Executed by the plan interpreter instead of generated code.
+    """
+    base_dataset_id: str
+    joins: List[PlanJoin] = []
+    filters: List[PlanFilter] = []
+    group_by: List[ColumnRef] = []
+    aggregations: List[PlanAggregation] = []
+    # Columns returned when nothing is aggregated
+    select: List[ColumnRef] = []
+    sort: List[PlanSort] = []
+    limit: Optional[int] = None
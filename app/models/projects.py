@@ -6,6 +6,8 @@ from app.models.stats import ProjectStats
 class ProjectRequestBody(BaseModel):
     name: str
     description: Optional[str] = ""
+    compactDtypes: Optional[bool] = None
+    executionEngine: Optional[str] = None
     class Config:
         json_schema_extra = {
             "example": {
@@ -24,6 +26,10 @@ class Project(BaseModel):
     createdAt: datetime
     userId: str
     stats: Optional[list[ProjectStats]] = []
+    # Store new data sources with compact dtypes; None uses the COMPACT_DTYPES setting
+    compactDtypes: Optional[bool] = None
+    # "pandas", "polars", "duckdb" or "auto"; None uses the EXECUTION_ENGINE setting
+    executionEngine: Optional[str] = None
     lastUpdatedAt: datetime
 
     class Config:
@@ -2,7 +2,7 @@ from pydantic import BaseModel
 from typing import List
 from enum import Enum
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
 class StatType(str, Enum):
@@ -15,12 +15,19 @@ class ProjectStats(BaseModel):
     id: str
     title: str
     description: str
-    value: float
+    # None when the KPI code failed, see error
+    value: Optional[float] = None
+    error: Optional[str] = None
+    # Wall-clock time to compute the value, including the wait for a sandbox worker;
+    # None when the value was reused from the result cache
+    durationMs: Optional[float] = None
     type: StatType
     projectId: str
     userId: str
     required_dataset_ids: List[str]
     python_code: str
+    # Engine python_code was written for
+    engine: str = "pandas"
     createdAt: datetime
 
     def to_llm_dict(self) -> Dict[str, Any]:
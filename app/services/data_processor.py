@@ -3,22 +3,22 @@ import os
 from typing import List, Dict, Any
 import json
 from fastapi import HTTPException
-from azure.storage.blob import BlobServiceClient
 from app.config import get_settings
+from app.utils.blob_storage import get_container_client
+from app.utils.code_cache import compile_generated_code
 from io import StringIO
 
 settings = get_settings()
 
-def execute_chart_code(code_lines: List[str], dataset_id: str, blob_urls: Dict[str, str]) -> Dict[str, Any]:
+async def execute_chart_code(code_lines: List[str], dataset_id: str, blob_urls: Dict[str, str]) -> Dict[str, Any]:
     """Execute the generated code lines and return the chart data."""
     try:
         # Create a directory for this dataset if it doesn't exist
         dataset_dir = f"data/{dataset_id}"
         os.makedirs(dataset_dir, exist_ok=True)
         
-        # Initialize Azure Blob Storage client
-        blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(settings.AZURE_STORAGE_CONTAINER)
+        # Shared Azure Blob Storage client
+        container_client = get_container_client()
         
         # Download and save CSV files locally
         for filename, url in blob_urls.items():
@@ -28,8 +28,8 @@ def execute_chart_code(code_lines: List[str], dataset_id: str, blob_urls: Dict[s
                 blob_path = url.split(settings.AZURE_STORAGE_CONTAINER + '/')[1]
                 # Download using blob client
                 blob_client = container_client.get_blob_client(blob_path)
-                blob_data = blob_client.download_blob()
-                content = blob_data.content_as_text()
+                blob_data = await blob_client.download_blob()
+                content = await blob_data.content_as_text()
                 df = pd.read_csv(StringIO(content))
                 df.to_csv(file_path, index=False)
         
@@ -49,7 +49,7 @@ def execute_chart_code(code_lines: List[str], dataset_id: str, blob_urls: Dict[s
                             )
                 
                 # Execute the line
-                exec(line, {"pd": pd}, local_ns)
+                exec(compile_generated_code(line).code, {"pd": pd}, local_ns)
         
         # Get the chart_data from the local namespace
         if "chart_data" not in local_ns:
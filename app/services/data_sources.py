@@ -3,13 +3,20 @@ from app.services.mongodb import get_collection
 from app.models.data_sources import DataSource
 from datetime import datetime
 import logging
-from app.utils.blob_storage import upload_to_blob_storage
-from app.utils.csv_parser import read_and_parse_csv
+from app.utils.blob_storage import cleanup_uploaded_blobs, upload_to_blob_storage
+from app.utils.csv_parser import read_and_parse_csv, get_column_types
+from app.utils.dtypes import compact_dataframe
+from app.utils.dataframe_cache import invalidate_dataframe
+from app.utils.columnar import dataframe_to_parquet_bytes, get_columnar_blob_path
+from app.utils.parse_pool import run_parse_job
 from bson.objectid import ObjectId
 from app.services.projects import get_project
+from app.services.materialized_joins import delete_materialized_joins
 from typing import List
+from app.config import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 async def get_data_sources(project_id: str, user_id: str) -> List[DataSource]:
     """
@@ -48,7 +55,8 @@ async def upload_data_source(project_id: str, file: UploadFile, user_id: str):
         projects_collection = get_collection("projects")
         
         # Verify project exists
-        await get_project(project_id, user_id)
+        project = await get_project(project_id, user_id)
+        compact = project.compactDtypes if project.compactDtypes is not None else settings.COMPACT_DTYPES
 
         # Upload file to Azure Blob Storage
         # Read and validate file
@@ -56,7 +64,10 @@ async def upload_data_source(project_id: str, file: UploadFile, user_id: str):
         file_size = len(content)
         
         # Parse CSV
-        df, sample_data, column_names, column_types = await read_and_parse_csv(content, file_size, file.filename)
+        df, sample_data, column_names, column_types, date_formats, dialect = await read_and_parse_csv(content, file_size, file.filename)
+        if compact:
+            df = await run_parse_job(compact_dataframe, df, description=f"compacting {file.filename}")
+            column_types = get_column_types(df)
         
         # Upload to blob storage
         # Get the current timestamp
@@ -64,6 +75,18 @@ async def upload_data_source(project_id: str, file: UploadFile, user_id: str):
         timestamp = now.strftime("%Y%m%d_%H%M%S")
         safe_filename = f"{project_id}/{timestamp}_{file.filename}"
         blob_url = await upload_to_blob_storage(content, safe_filename)
+        invalidate_dataframe(safe_filename)
+
+        # Store a typed columnar copy so later loads skip CSV parsing
+        columnar_blob_path = None
+        parquet_content = await run_parse_job(dataframe_to_parquet_bytes, df, description=f"writing columnar copy of {file.filename}")
+        if parquet_content is not None:
+            try:
+                columnar_blob_path = get_columnar_blob_path(safe_filename)
+                await upload_to_blob_storage(parquet_content, columnar_blob_path)
+            except Exception as e:
+                logger.warning(f"Columnar copy upload failed, readers will use the CSV: {str(e)}")
+                columnar_blob_path = None
         
         # Create file metadata
         file_metadata = {
@@ -71,13 +94,16 @@ async def upload_data_source(project_id: str, file: UploadFile, user_id: str):
             "filename": file.filename,
             "blobPath": safe_filename,
             "blobUrl": blob_url,
+            "columnarBlobPath": columnar_blob_path,
+            "dialect": dialect.model_dump(),
+            "compactDtypes": compact,
             "size": file_size,
             "type": 'csv',
             "rows": len(df),
             "columns": len(df.columns),
             "sampleData": sample_data,
             "columnMetadata": [
-                {"name": name, "type": column_types[name]} 
+                {"name": name, "type": column_types[name], "format": date_formats.get(name)}
                 for name in column_names
             ],
             "createdAt": now,
@@ -100,6 +126,9 @@ async def upload_data_source(project_id: str, file: UploadFile, user_id: str):
         
         return DataSource(id=str(created_data_source["_id"]), **created_data_source)
     
+    except TimeoutError as e:
+        logger.error(f"Upload timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=f"Upload timed out: {str(e)}")
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -115,12 +144,23 @@ async def delete_data_source(project_id: str, data_source_id: str, user_id: str)
         # Verify project exists
         await get_project(project_id, user_id)
 
+        data_source = await datasources_collection.find_one({"_id": ObjectId(data_source_id)})
+
         # Delete the data source from Azure Blob Storage
         # await cleanup_uploaded_blobs(data_source_id)
 
         # Delete the data source from MongoDB
         await datasources_collection.delete_one({"_id": ObjectId(data_source_id)})
 
+        # Drop the cached dataframe so a later upload to the same path is never served stale
+        if data_source and data_source.get("blobPath"):
+            invalidate_dataframe(data_source["blobPath"])
+
+        # The columnar copy and the joins built from this data source are derived from it
+        if data_source and data_source.get("columnarBlobPath"):
+            await cleanup_uploaded_blobs([{"path": data_source["columnarBlobPath"]}])
+        await delete_materialized_joins(project_id, data_source_id)
+
         return True
     
     except Exception as e:
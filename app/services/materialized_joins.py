@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+from app.services.mongodb import get_collection
+from app.config import get_settings
+from app.models.data_sources import DataSource, DataSourceColumnMetadata
+from app.models.materialized_joins import MaterializedJoin
+from app.models.relationships import Relationship, RelationshipConfidence, RelationshipType
+from app.utils.blob_storage import cleanup_uploaded_blobs, get_dataframes_dict, upload_to_blob_storage
+from app.utils.dataframe_cache import get_content_version, invalidate_dataframe
+from app.utils.join_builder import write_joined_parquet
+from app.utils.parse_pool import run_parse_job
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Joins on these never multiply the rows of the many side
+MATERIALIZED_RELATIONSHIP_TYPES = {RelationshipType.ONE_TO_MANY, RelationshipType.MANY_TO_ONE}
+
+# Project id -> running refresh, so concurrent requests start one
+_refreshes: dict[str, asyncio.Task] = {}
+# Project id -> latest sources and relationships of refreshes requested while one was running, run when it ends
+_pending_refreshes: dict[str, tuple[List[DataSource], List[Relationship]]] = {}
+# (relationship id, source versions) of builds that failed -> when, oldest first.
+# Not retried until a side changes or MATERIALIZED_JOIN_RETRY_SECONDS pass.
+_failed_builds: dict[tuple, float] = {}
+
+
+def get_join_data_source_id(relationship_id: str) -> str:
+    """Id of the virtual data source holding a relationship's materialised join"""
+    return f"join_{relationship_id}"
+
+
+def _resolve_table(table: str, data_sources: List[DataSource]) -> Optional[DataSource]:
+    """The data source a relationship names, by id or filename; the latest upload wins"""
+    matches = [ds for ds in data_sources if ds.type != "join" and table in (str(ds.id), ds.filename)]
+    return max(matches, key=lambda ds: ds.lastUpdatedAt, default=None)
+
+
+def _get_join_sides(relationship: Relationship, data_sources: List[DataSource]) -> Optional[tuple[DataSource, str, DataSource, str]]:
+    """The many side and its key, then the one side and its key, of a relationship worth materialising"""
+    if relationship.confidence != RelationshipConfidence.HIGH or relationship.type not in MATERIALIZED_RELATIONSHIP_TYPES:
+        return None
+    data_source_a = _resolve_table(relationship.tableA, data_sources)
+    data_source_b = _resolve_table(relationship.tableB, data_sources)
+    if data_source_a is None or data_source_b is None or data_source_a.id == data_source_b.id:
+        return None
+    if relationship.type == RelationshipType.ONE_TO_MANY:
+        many, many_key, one, one_key = data_source_b, relationship.keyB, data_source_a, relationship.keyA
+    else:
+        many, many_key, one, one_key = data_source_a, relationship.keyA, data_source_b, relationship.keyB
+    if many.rows > settings.MATERIALIZED_JOIN_MAX_ROWS:
+        return None
+    if many_key not in {col.name for col in many.columnMetadata} or one_key not in {col.name for col in one.columnMetadata}:
+        return None
+    return many, many_key, one, one_key
+
+
+def _get_source_versions(many: DataSource, one: DataSource) -> dict[str, str]:
+    return {str(many.id): get_content_version(many), str(one.id): get_content_version(one)}
+
+
+def _get_build_key(relationship: Relationship, many: DataSource, one: DataSource) -> tuple:
+    return relationship.id, tuple(sorted(_get_source_versions(many, one).items()))
+
+
+def _has_failed(build_key: tuple) -> bool:
+    failed_at = _failed_builds.get(build_key)
+    if failed_at is None:
+        return False
+    if time.monotonic() - failed_at > settings.MATERIALIZED_JOIN_RETRY_SECONDS:
+        del _failed_builds[build_key]
+        return False
+    return True
+
+
+def _record_failure(build_key: tuple) -> None:
+    _failed_builds.pop(build_key, None)
+    _failed_builds[build_key] = time.monotonic()
+    while len(_failed_builds) > settings.MATERIALIZED_JOIN_MAX_FAILED_BUILDS:
+        del _failed_builds[next(iter(_failed_builds))]
+
+
+async def _delete_materialized_join(document: dict) -> None:
+    invalidate_dataframe(document["blobPath"])
+    await cleanup_uploaded_blobs([{"path": document["blobPath"]}])
+
+
+async def _materialize_join(relationship: Relationship, many: DataSource, many_key: str, one: DataSource, one_key: str) -> None:
+    """Build a relationship's joined frame, store it as Parquet and replace the previous build"""
+    dataframes = await get_dataframes_dict([many, one], copy=False)
+    one_name = os.path.splitext(one.filename)[0]
+    content, rows, column_types, sample_data = await run_parse_job(
+        write_joined_parquet, dataframes[str(many.id)], dataframes[str(one.id)], many_key, one_key, one_name,
+        description=f"joining {many.filename} with {one.filename}"
+    )
+    if content is None:
+        raise ValueError("the joined frame cannot be stored as Parquet")
+
+    now = datetime.now()
+    blob_path = f"{relationship.projectId}/joins/{now.strftime('%Y%m%d_%H%M%S')}_{relationship.id}.parquet"
+    blob_url = await upload_to_blob_storage(content, blob_path)
+    materialized_join = MaterializedJoin(
+        dataSourceId=get_join_data_source_id(relationship.id),
+        relationshipId=relationship.id,
+        projectId=relationship.projectId,
+        manyDataSourceId=str(many.id),
+        oneDataSourceId=str(one.id),
+        sourceVersions=_get_source_versions(many, one),
+        filename=f"{many.filename} joined with {one.filename}",
+        blobPath=blob_path,
+        blobUrl=blob_url,
+        compactDtypes=many.compactDtypes or one.compactDtypes,
+        size=len(content),
+        rows=rows,
+        columns=len(column_types),
+        sampleData=sample_data,
+        columnMetadata=[DataSourceColumnMetadata(name=name, type=dtype) for name, dtype in column_types.items()],
+        createdAt=now,
+    )
+    previous = await get_collection("materializedJoins").find_one_and_replace(
+        {"relationshipId": relationship.id}, materialized_join.model_dump(), upsert=True
+    )
+    if previous is not None and previous.get("blobPath") != blob_path:
+        await _delete_materialized_join(previous)
+    logger.info(f"Materialised {many.filename} joined with {one.filename}: {rows} rows in {blob_path}")
+
+
+async def delete_materialized_joins(project_id: str, data_source_id: str = None) -> int:
+    """
+    Delete a project's materialised joins and their blobs, e.g. when their relationships are
+    replaced, or only those with data_source_id on either side when it is deleted.
+    Returns the number of joins deleted.
+    """
+    collection = get_collection("materializedJoins")
+    query = {"projectId": project_id}
+    if data_source_id is not None:
+        query["$or"] = [{"manyDataSourceId": data_source_id}, {"oneDataSourceId": data_source_id}]
+    documents = [document async for document in collection.find(query)]
+    for document in documents:
+        await collection.delete_one({"_id": document["_id"]})
+        await _delete_materialized_join(document)
+    if documents:
+        logger.info(f"Deleted {len(documents)} materialised joins of project {project_id}")
+    return len(documents)
+
+
+async def refresh_materialized_joins(project_id: str, data_sources: List[DataSource], relationships: List[Relationship]) -> None:
+    """
+    Build the project's materialised joins that are missing or stale because either side
+    changed, and delete those whose relationship is gone or no longer qualifies.
+    """
+    collection = get_collection("materializedJoins")
+    stored = {document["relationshipId"]: document async for document in collection.find({"projectId": project_id})}
+    wanted = {}
+    for relationship in relationships:
+        sides = _get_join_sides(relationship, data_sources)
+        if sides is not None:
+            wanted[relationship.id] = (relationship, sides)
+
+    for relationship_id, document in stored.items():
+        if relationship_id not in wanted:
+            await collection.delete_one({"_id": document["_id"]})
+            await _delete_materialized_join(document)
+
+    for relationship_id, (relationship, (many, many_key, one, one_key)) in wanted.items():
+        document = stored.get(relationship_id)
+        if document is not None and document.get("sourceVersions") == _get_source_versions(many, one):
+            continue
+        if _has_failed(_get_build_key(relationship, many, one)):
+            continue
+        try:
+            await _materialize_join(relationship, many, many_key, one, one_key)
+        except Exception as e:
+            logger.error(f"Materialising {many.filename} joined with {one.filename} failed: {str(e)}")
+            _record_failure(_get_build_key(relationship, many, one))
+
+
+def schedule_materialized_join_refresh(project_id: str, data_sources: List[DataSource], relationships: List[Relationship]) -> None:
+    """
+    Refresh a project's materialised joins in the background.
+    If a refresh is already running, another one with these sources and relationships follows it.
+    """
+    if not settings.MATERIALIZED_JOINS_ENABLED:
+        return
+    if project_id in _refreshes:
+        _pending_refreshes[project_id] = (data_sources, relationships)
+        return
+
+    async def refresh():
+        sources = (data_sources, relationships)
+        try:
+            while sources is not None:
+                try:
+                    await refresh_materialized_joins(project_id, *sources)
+                except Exception as e:
+                    logger.error(f"Materialised join refresh failed for project {project_id}: {str(e)}")
+                sources = _pending_refreshes.pop(project_id, None)
+        finally:
+            _refreshes.pop(project_id, None)
+            _pending_refreshes.pop(project_id, None)
+
+    _refreshes[project_id] = asyncio.create_task(refresh())
+
+
+async def get_materialized_join_data_sources(project_id: str, data_sources: List[DataSource], relationships: List[Relationship]) -> List[DataSource]:
+    """
+    Get virtual data sources for the project's up-to-date materialised joins, to offer next to its data sources.
+    Joins that are missing or stale are rebuilt in the background and offered once ready.
+    """
+    if not settings.MATERIALIZED_JOINS_ENABLED:
+        return []
+    try:
+        collection = get_collection("materializedJoins")
+        stored = {document["relationshipId"]: document async for document in collection.find({"projectId": project_id})}
+        virtual_data_sources = []
+        needs_refresh = False
+        for relationship in relationships:
+            sides = _get_join_sides(relationship, data_sources)
+            if sides is None:
+                continue
+            many, _, one, _ = sides
+            document = stored.get(relationship.id)
+            if document is None or document.get("sourceVersions") != _get_source_versions(many, one):
+                needs_refresh = needs_refresh or not _has_failed(_get_build_key(relationship, many, one))
+                continue
+            virtual_data_sources.append(MaterializedJoin(**document).to_data_source())
+        if needs_refresh or len(stored) > len(virtual_data_sources):
+            schedule_materialized_join_refresh(project_id, data_sources, relationships)
+        return virtual_data_sources
+    except Exception as e:
+        logger.warning(f"Materialised joins unavailable for project {project_id}: {str(e)}")
+        return []
@@ -22,6 +22,8 @@ async def create_project(user_id: str, project: ProjectRequestBody):
             "status": "CREATED",
             "createdAt": datetime.now(),
             "userId": user_id,
+            "compactDtypes": project.compactDtypes,
+            "executionEngine": project.executionEngine,
             "lastUpdatedAt": datetime.now(),
         }
         
@@ -7,6 +7,8 @@ from app.services.mongodb import get_collection
 from app.config import get_settings
 from app.services.projects import get_project
 from app.models.relationships import Relationship, RelationshipLLMResponse
+from app.models.data_sources import DataSource
+from app.services.materialized_joins import delete_materialized_joins, schedule_materialized_join_refresh
 from app.utils.llm_provider import ainvoke_llm
 from app.utils.prompt_engine import render_prompt
 from typing import List
@@ -81,6 +83,8 @@ async def establish_relationships(project_id: str, user_id: str):
         ]
          # Delete all existing relationships for this project
         await relationships_collection.delete_many({"projectId": project_id, "userId": user_id})
+        # Every replaced relationship's join is stale, even when materialised joins are disabled
+        await delete_materialized_joins(project_id)
         # Insert the new relationship document
         await relationships_collection.insert_many(relationships)
         
@@ -97,6 +101,13 @@ async def establish_relationships(project_id: str, user_id: str):
         created_relationships = []
         async for relationship in relationships_collection.find({"projectId": project_id, "userId": user_id}):
             created_relationships.append(Relationship(id=str(relationship["_id"]), **relationship))
+
+        # Prebuild the joins of the new relationships
+        schedule_materialized_join_refresh(
+            project_id,
+            [DataSource(id=str(ds["_id"]), **ds) for ds in data_sources],
+            created_relationships
+        )
         
         return created_relationships
     
@@ -10,13 +10,18 @@ from app.models.stats import StatsLLMResponse
 from datetime import datetime
 from bson.objectid import ObjectId
 import json
+import asyncio
+import time
 from app.utils.json_encoders import ensure_json_serializable
-from app.utils.blob_storage import get_dataframes_dict
-from app.utils.code_executer import execute_pandas_code
+from app.utils.blob_storage import lazy_dataframes_dict
+from app.utils.code_sandbox import run_generated_code
+from app.utils.result_cache import get_result_key, get_cached_result, cache_result
+from app.config import get_settings
 from app.services.data_sources import get_data_sources
 from app.services.relationships import get_relationships
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
 async def generate_stats(project_id: str, user_id: str = "google-oauth2|105273317112514853668") -> List[ProjectStats]:
@@ -32,6 +37,8 @@ async def generate_stats(project_id: str, user_id: str = "google-oauth2|10527331
 
         # Verify project exists
         project = await get_project(project_id, user_id)
+        # KPI code runs on Polars when the project asks for it, otherwise on pandas
+        engine = "polars" if (project.executionEngine or settings.EXECUTION_ENGINE) == "polars" else "pandas"
 
         # Get dataSources collection
 
@@ -45,7 +52,7 @@ async def generate_stats(project_id: str, user_id: str = "google-oauth2|10527331
         relationships_info = [r.to_llm_dict() for r in relationships]
 
         # Call the LLM to analyze relationships
-        system_prompt = render_prompt("generate_kpis/system.jinja")
+        system_prompt = render_prompt("generate_kpis/system.jinja", {"engine": engine})
         user_prompt = render_prompt("generate_kpis/user.jinja", {
             "project_details": ensure_json_serializable(project),
             "data_sources": ensure_json_serializable(data_source_info),
@@ -59,28 +66,68 @@ async def generate_stats(project_id: str, user_id: str = "google-oauth2|10527331
             response_model=StatsLLMResponse
         )
         stats = llm_response.stats
+        # KPIs whose code and data are unchanged since the last refresh reuse their value
+        results = {}
+        result_keys = []
+        for index, stat in enumerate(stats):
+            stat_data_sources = [ds for ds in data_sources if str(ds.id) in stat.required_dataset_ids]
+            result_key = get_result_key(stat.python_code, stat_data_sources, engine, 'get_kpi_value')
+            result_keys.append((result_key, stat_data_sources))
+            is_cached, result = await get_cached_result(result_key)
+            if is_cached:
+                results[index] = result
+        logger.info(f"Reusing {len(results)} of {len(stats)} KPI values")
+
+        # Only the data sources of recomputed KPIs are loaded
         all_used_data_source_ids = []
-        for stat in stats:
-            all_used_data_source_ids.extend(stat.required_dataset_ids)
+        for index, stat in enumerate(stats):
+            if index not in results:
+                all_used_data_source_ids.extend(stat.required_dataset_ids)
         all_used_data_source_ids = list(set(all_used_data_source_ids))
 
-        dataframes = await get_dataframes_dict(data_sources, all_used_data_source_ids)
+        # KPIs run concurrently across the sandbox workers against one load of the frames;
+        # a failing or slow KPI is stored with its error instead of failing the others
+        durations = {}
+        errors = {}
+
+        async def evaluate_kpi(index: int, stat, dataframes: dict, load_frame, load_derived):
+            started_at = time.perf_counter()
+            try:
+                result = await run_generated_code(
+                    stat.python_code, dataframes, engine, 'get_kpi_value',
+                    timeout=settings.KPI_TIMEOUT_SECONDS, load_frame=load_frame, load_derived=load_derived)
+                results[index] = result
+                result_key, stat_data_sources = result_keys[index]
+                await cache_result(result_key, result, stat_data_sources)
+            except Exception as e:
+                logger.warning(f"KPI '{stat.title}' failed: {str(e)}")
+                errors[index] = str(e)
+            durations[index] = round((time.perf_counter() - started_at) * 1000, 1)
+
+        if len(results) < len(stats):
+            # Each data source is loaded once, when the first KPI reads it
+            async with lazy_dataframes_dict(data_sources, all_used_data_source_ids) as (dataframes, load_frame, load_derived):
+                await asyncio.gather(*[
+                    evaluate_kpi(index, stat, dataframes, load_frame, load_derived)
+                    for index, stat in enumerate(stats) if index not in results
+                ])
 
         now = datetime.now()
         stats_with_value = []
-        for stat in stats:
-            result = execute_pandas_code(
-                stat.python_code, dataframes, 'get_kpi_value')
+        for index, stat in enumerate(stats):
             stats_with_value.append({
                 "title": stat.title,
                 "description": stat.description,
                 "type": stat.type,
                 "projectId": project_id,
                 "userId": user_id,
-                "value": result,
+                "value": results.get(index),
+                "error": errors.get(index),
+                "durationMs": durations.get(index),
                 "createdAt": now,
                 "required_dataset_ids": stat.required_dataset_ids,
-                "python_code": stat.python_code
+                "python_code": stat.python_code,
+                "engine": engine
             })
          # Delete all existing relationships for this project
         await stats_collection.delete_many({"projectId": project_id, "userId": user_id})
@@ -9,6 +9,9 @@ from app.agent import DataAnalysisAgent
 from app.models.data_sources import DataSource
 from app.models.agent_response import FormatResponseLLMResponse, ResponseType
 from app.agent import DataAnalysisAgentResponse
+from app.services.projects import get_project
+from app.services.relationships import get_relationships
+from app.services.materialized_joins import get_materialized_join_data_sources
 
 logger = logging.getLogger(__name__)
 
@@ -182,13 +185,19 @@ async def create_user_message(project_id: str, thread_id: str, user_id: str, mes
 
 async def call_agent(project_id: str, thread_id: str, user_id: str, current_message: str, past_messages: List[Message], datasets: List[DataSource]):
     try:
+        project = await get_project(project_id, user_id)
+        relationships = await get_relationships(project_id, user_id)
+        # Joins of the project's relationships, prebuilt, are offered as extra datasets
+        datasets = datasets + await get_materialized_join_data_sources(project_id, datasets, relationships)
         agent = DataAnalysisAgent()
         agent_response: DataAnalysisAgentResponse = await agent.analyze(
             project_id=project_id,
             query=current_message,
             datasets=datasets,
             past_messages=[message.to_llm_dict()
-                           for message in past_messages[-10:]]
+                           for message in past_messages[-10:]],
+            engine_preference=project.executionEngine,
+            relationships=relationships
         )
         ai_message = await create_assistant_message(project_id, thread_id, user_id, agent_response.result)
         return ai_message, agent_response
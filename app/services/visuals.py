@@ -6,6 +6,7 @@ from typing import List
 import asyncio
 import logging
 from app.services.data_sources import get_data_sources
+from app.services.materialized_joins import get_materialized_join_data_sources
 from app.services.relationships import get_relationships
 from app.utils.json_encoders import ensure_json_serializable
 import json
@@ -18,8 +19,10 @@ from app.services.stats import get_project_stats
 from app.models.stats import ProjectStats
 from app.models.relationships import Relationship
 from app.models.projects import Project
-from app.utils.code_executer import execute_pandas_code
-from app.utils.blob_storage import get_dataframes_dict
+from app.utils.code_sandbox import run_generated_code
+from app.utils.blob_storage import lazy_dataframes_dict
+from app.utils.code_analysis import get_code_column_projection
+from app.utils.result_cache import get_result_key, get_cached_result, cache_result
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
@@ -94,9 +97,15 @@ async def get_visual_data(visual_concept: VisualConcept, data_sources: List[Data
             visual_sample_data=visual_sample_data
         )
 
-        dataframes = await get_dataframes_dict(data_sources)
-        result = execute_pandas_code(
-            visual_python_code, dataframes)
+        result_key = get_result_key(visual_python_code, data_sources)
+        is_cached, result = await get_cached_result(result_key)
+        if not is_cached:
+            # Visual code is handed every data source but only loads the ones it reads
+            projection = get_code_column_projection(visual_python_code, data_sources)
+            async with lazy_dataframes_dict(data_sources, columns=projection) as (dataframes, load_frame, load_derived):
+                result = await run_generated_code(
+                    visual_python_code, dataframes, load_frame=load_frame, load_derived=load_derived)
+            await cache_result(result_key, result, data_sources)
 
         return {
             **visual_concept.model_dump(),
@@ -189,6 +198,7 @@ async def generate_visuals(project_id: str, user_id: str = "google-oauth2|105273
         project = await get_project(project_id, user_id)
         data_sources: List[DataSource] = await get_data_sources(project_id, user_id)
         relationships: List[Relationship] = await get_relationships(project_id, user_id)
+        data_sources += await get_materialized_join_data_sources(project_id, data_sources, relationships)
         stats: List[ProjectStats] = await get_project_stats(project_id, user_id)
 
         visual_concepts: List[VisualConcept] = await generate_visual_concepts(
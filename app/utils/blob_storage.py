@@ -1,14 +1,75 @@
+import asyncio
 import logging
-from azure.storage.blob import BlobServiceClient
+import queue
+import resource
+import threading
+import time
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Union
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
 from app.config import get_settings
 import pandas as pd
 import io
-from app.models.data_sources import DataSource
+from app.models.data_sources import CsvDialect, DataSource, DataSourceLoadFailure
+from app.utils.columnar import parquet_bytes_to_dataframe
+from app.utils.datetime_columns import parse_datetime_columns
+from app.utils.dtypes import compact_dataframe
+from app.utils.parse_pool import run_parse_job
+from app.utils.csv_parser import read_csv_frame
+from app.utils.dataframe_cache import get_content_version, get_or_load_dataframe
+from app.utils.derived_columns import get_derived_column
+from app.utils.shared_frames import SharedFrameHandle, acquire_shared_frame, share_dataframe, release_shared_frames
+from app.utils.lazy_datasets import DeferredFrame, record_dataset_access
 
 # Set up logging
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Global Azure Blob Storage client instance, shared by every request
+blob_service_client: BlobServiceClient = None
+blob_http_session: aiohttp.ClientSession = None
+
+async def connect_to_blob_storage():
+    """Create the shared Azure Blob Storage client with a pooled transport"""
+    global blob_service_client, blob_http_session
+
+    logger.info("Connecting to Azure Blob Storage...")
+    blob_http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=settings.AZURE_STORAGE_POOL_SIZE)
+    )
+    transport = AioHttpTransport(
+        session=blob_http_session,
+        session_owner=False,
+        connection_timeout=settings.AZURE_STORAGE_CONNECTION_TIMEOUT,
+        read_timeout=settings.AZURE_STORAGE_READ_TIMEOUT
+    )
+    blob_service_client = BlobServiceClient.from_connection_string(
+        settings.AZURE_STORAGE_CONNECTION_STRING,
+        transport=transport
+    )
+    logger.info(f"Azure Blob Storage client ready (pool size {settings.AZURE_STORAGE_POOL_SIZE})")
+
+async def close_blob_storage_connection():
+    """Close the shared Azure Blob Storage client and its connection pool"""
+    global blob_service_client, blob_http_session
+
+    if blob_service_client:
+        await blob_service_client.close()
+        blob_service_client = None
+    if blob_http_session:
+        await blob_http_session.close()
+        blob_http_session = None
+        logger.info("Azure Blob Storage connection closed")
+
+def get_container_client() -> ContainerClient:
+    """Get the container client of the shared Azure Blob Storage client"""
+    if not blob_service_client:
+        raise RuntimeError("Azure Blob Storage client not created. Call connect_to_blob_storage() first.")
+    return blob_service_client.get_container_client(settings.AZURE_STORAGE_CONTAINER)
+
 async def upload_to_blob_storage(content: bytes, blob_path: str) -> str:
     """
     Upload content to Azure Blob Storage.
@@ -26,17 +87,11 @@ async def upload_to_blob_storage(content: bytes, blob_path: str) -> str:
     logger.info(f"Uploading to blob storage: {blob_path}")
     
     try:
-        # Initialize Azure Blob Storage client
-        blob_service_client = BlobServiceClient.from_connection_string(
-            settings.AZURE_STORAGE_CONNECTION_STRING
-        )
-        container_client = blob_service_client.get_container_client(
-            settings.AZURE_STORAGE_CONTAINER
-        )
+        container_client = get_container_client()
         
         # Upload to Azure Blob Storage
         blob_client = container_client.get_blob_client(blob_path)
-        blob_client.upload_blob(content)
+        await blob_client.upload_blob(content)
         
         logger.info(f"Successfully uploaded blob: {blob_path}")
         return blob_client.url
@@ -58,19 +113,14 @@ async def cleanup_uploaded_blobs(blobs: list[dict[str, str]]):
     logger.info(f"Cleaning up {len(blobs)} uploaded blobs")
     
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(
-            settings.AZURE_STORAGE_CONNECTION_STRING
-        )
-        container_client = blob_service_client.get_container_client(
-            settings.AZURE_STORAGE_CONTAINER
-        )
+        container_client = get_container_client()
         
         for blob in blobs:
             try:
                 blob_path = blob.get("path")
                 if blob_path:
                     blob_client = container_client.get_blob_client(blob_path)
-                    blob_client.delete_blob()
+                    await blob_client.delete_blob()
                     logger.info(f"Deleted blob: {blob_path}")
             except Exception as cleanup_error:
                 logger.error(f"Error cleaning up blob {blob.get('path')}: {str(cleanup_error)}")
@@ -88,21 +138,15 @@ async def download_from_blob_storage(blob_path: str) -> bytes:
         The blob content as bytes, or None if download fails
     """
     try:
-        # Get settings
-        settings = get_settings()
-        
-        # Create the BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        
         # Get the container client
-        container_client = blob_service_client.get_container_client(settings.AZURE_STORAGE_CONTAINER)
+        container_client = get_container_client()
         
         # Get the blob client
         blob_client = container_client.get_blob_client(blob_path)
         
-        # Download the blob - use synchronous methods
-        download_stream = blob_client.download_blob()
-        blob_content = download_stream.readall()
+        # Download the blob without blocking the event loop
+        download_stream = await blob_client.download_blob()
+        blob_content = await download_stream.readall()
         
         logger.info(f"Successfully downloaded blob: {blob_path}")
         return blob_content
@@ -111,42 +155,392 @@ async def download_from_blob_storage(blob_path: str) -> bytes:
         logger.error(f"Error downloading blob {blob_path}: {str(e)}")
         return None 
     
-async def generate_blob_df(blob_path: str) -> pd.DataFrame:
+async def download_blob_to_file(blob_path: str, file_path: str) -> int:
     """
-    Generate a CSV from a blob
+    Download a blob straight to a local file, a chunk at a time, so large blobs never sit in memory.
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        Exception: If the download fails
     """
-    # Now load the actual data from blob storage
-    
-    try:
-        # Get blob path and download content       
-        blob_content = await download_from_blob_storage(blob_path)
-       
-        # Try different encodings to read the CSV
+    blob_client = get_container_client().get_blob_client(blob_path)
+    download_stream = await blob_client.download_blob(max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY)
+    written = 0
+    with open(file_path, "wb") as f:
+        async for chunk in download_stream.chunks():
+            await asyncio.to_thread(f.write, chunk)
+            written += len(chunk)
+    logger.info(f"Downloaded blob {blob_path} to {file_path} ({written} bytes)")
+    return written
+
+
+class DataFrameLoadError(Exception):
+    """Raised when one or more data sources could not be loaded into dataframes"""
+
+    def __init__(self, failures: list[DataSourceLoadFailure]):
+        self.failures = failures
+        details = "; ".join(f"{f.filename} ({f.dataSourceId}): {f.error}" for f in failures)
+        super().__init__(f"Failed to load {len(failures)} data source(s): {details}")
+
+
+def parse_csv_bytes(content: bytes, dialect: CsvDialect = None, columns: list[str] = None, compact: bool = False, date_formats: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Parse raw CSV bytes into a DataFrame in a single pass using the dialect detected at upload.
+    Data sources uploaded before dialects were recorded fall back to trying common encodings.
+    Columns in date_formats are converted to datetime64 with the formats detected at upload.
+    When compact is set the frame is converted to the compact dtypes recorded at upload.
+    """
+    if dialect:
+        df = read_csv_frame(content, dialect, columns=columns)
+    else:
         try:
-            df = pd.read_csv(io.BytesIO(blob_content))
+            df = pd.read_csv(io.BytesIO(content), usecols=columns)
         except UnicodeDecodeError:
             try:
-                df = pd.read_csv(io.BytesIO(blob_content), encoding='latin1')
+                df = pd.read_csv(io.BytesIO(content), encoding='latin1', usecols=columns)
             except Exception:
-                df = pd.read_csv(io.BytesIO(blob_content), encoding='utf-8', errors='replace')
-        
-        return df
-        
+                df = pd.read_csv(io.BytesIO(content), encoding='utf-8', encoding_errors='replace', usecols=columns)
+    if date_formats:
+        df = parse_datetime_columns(df, date_formats)
+    return compact_dataframe(df) if compact else df
+
+
+class BlobChunkReader(io.RawIOBase):
+    """
+    Read-only file object fed with downloaded blob chunks through a bounded queue,
+    so a parser running in a worker thread can consume a blob while it downloads.
+    """
+
+    def __init__(self, max_buffered_chunks: int):
+        super().__init__()
+        self._queue = queue.Queue(maxsize=max_buffered_chunks)
+        self._current = memoryview(b"")
+        self._error: Exception = None
+        self._finished = False
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self.peak_buffered_bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def feed(self, chunk: bytes) -> None:
+        """Queue a chunk for the parser, or None to signal the end of the blob. Blocks while the queue is full."""
+        if chunk is not None:
+            with self._lock:
+                self._buffered_bytes += len(chunk)
+                self.peak_buffered_bytes = max(self.peak_buffered_bytes, self._buffered_bytes)
+        while True:
+            if self.closed:
+                raise ValueError("Reader was closed before the download finished")
+            try:
+                self._queue.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fail(self, error: Exception) -> None:
+        """Make the parser raise the given download error on its next read"""
+        self._error = error
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            if self._error:
+                raise self._error
+            if self._finished:
+                return 0
+            try:
+                chunk = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                self._finished = True
+                return 0
+            with self._lock:
+                self._buffered_bytes -= len(chunk)
+            self._current = memoryview(chunk)
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+async def stream_blob_chunks(blob_path: str, blob_size: int) -> AsyncIterator[bytes]:
+    """
+    Download a blob as ranged chunks, keeping up to BLOB_DOWNLOAD_CONCURRENCY
+    requests in flight and yielding the chunks in order as they complete.
+    """
+    chunk_size = settings.BLOB_DOWNLOAD_CHUNK_SIZE
+    blob_client = get_container_client().get_blob_client(blob_path)
+
+    async def fetch_range(offset: int) -> bytes:
+        download_stream = await blob_client.download_blob(offset=offset, length=min(chunk_size, blob_size - offset))
+        return await download_stream.readall()
+
+    pending = deque()
+    try:
+        for offset in range(0, blob_size, chunk_size):
+            pending.append(asyncio.create_task(fetch_range(offset)))
+            if len(pending) >= settings.BLOB_DOWNLOAD_CONCURRENCY:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _parse_csv_stream(reader: BlobChunkReader, **read_csv_kwargs) -> pd.DataFrame:
+    """Parse CSV from a chunk reader, closing it so the downloader stops if parsing fails"""
+    try:
+        return pd.read_csv(io.BufferedReader(reader, buffer_size=settings.BLOB_DOWNLOAD_CHUNK_SIZE), **read_csv_kwargs)
+    finally:
+        reader.close()
+
+
+async def stream_blob_df(blob_path: str, blob_size: int, dialect: CsvDialect = None, columns: list[str] = None, compact: bool = False, date_formats: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Parse a CSV blob while it downloads, without ever holding the whole file in memory.
+    Logs throughput and peak memory once done.
+    """
+    reader = BlobChunkReader(settings.BLOB_STREAM_MAX_BUFFERED_CHUNKS)
+    read_csv_kwargs = {"encoding": dialect.encoding, "sep": dialect.delimiter} if dialect else {}
+    read_csv_kwargs["usecols"] = columns
+    started_at = time.perf_counter()
+
+    async def feed_reader():
+        try:
+            async with aclosing(stream_blob_chunks(blob_path, blob_size)) as chunks:
+                async for chunk in chunks:
+                    await asyncio.to_thread(reader.feed, chunk)
+            await asyncio.to_thread(reader.feed, None)
+        except Exception as e:
+            reader.fail(e)
+
+    # The reader lives in this process, so the streamed parse uses a thread rather than the parse pool
+    df, _ = await asyncio.gather(
+        asyncio.to_thread(_parse_csv_stream, reader, **read_csv_kwargs),
+        feed_reader()
+    )
+
+    elapsed = time.perf_counter() - started_at
+    throughput_mb = blob_size / (1024 * 1024) / elapsed if elapsed > 0 else 0
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(
+        f"Streamed {blob_path}: {blob_size} bytes in {elapsed:.2f}s ({throughput_mb:.1f} MB/s), "
+        f"peak buffered {reader.peak_buffered_bytes} bytes, process peak RSS {max_rss_mb:.0f} MB"
+    )
+    if date_formats:
+        df = await asyncio.to_thread(parse_datetime_columns, df, date_formats)
+    if compact:
+        df = await asyncio.to_thread(compact_dataframe, df)
+    return df
+
+
+async def load_blob_df(blob_path: str, columnar_blob_path: str = None, blob_size: int = None, dialect: CsvDialect = None, columns: list[str] = None, compact: bool = False, date_formats: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Load a DataFrame from a blob, preferring the columnar sidecar when one exists.
+    When columns is given only those columns are read.
+    When compact is set the frame gets the compact dtypes recorded for the data source at upload.
+    CSV reads convert the columns in date_formats to datetime64, as the sidecar stores them.
+    Parsing runs in the parse pool so it overlaps with other downloads.
+    CSV blobs larger than BLOB_STREAMING_THRESHOLD_BYTES are parsed while they download.
+
+    Raises:
+        Exception: If neither the sidecar nor the CSV can be loaded
+    """
+    if columnar_blob_path:
+        try:
+            columnar_content = await download_from_blob_storage(columnar_blob_path)
+            if columnar_content is not None:
+                return await run_parse_job(parquet_bytes_to_dataframe, columnar_content, columns, compact, description=f"reading {columnar_blob_path}")
+        except Exception as e:
+            logger.warning(f"Falling back to CSV for {blob_path}, could not read {columnar_blob_path}: {str(e)}")
+
+    if blob_size and blob_size > settings.BLOB_STREAMING_THRESHOLD_BYTES:
+        try:
+            return await stream_blob_df(blob_path, blob_size, dialect, columns, compact, date_formats)
+        except UnicodeDecodeError:
+            logger.warning(f"Streamed parse of {blob_path} is not UTF-8, retrying with a full download")
+
+    blob_content = await download_from_blob_storage(blob_path)
+    if blob_content is None:
+        raise ValueError(f"Could not download blob {blob_path}")
+
+    return await run_parse_job(parse_csv_bytes, blob_content, dialect, columns, compact, date_formats, description=f"parsing {blob_path}")
+
+
+async def generate_blob_df(blob_path: str, columnar_blob_path: str = None, blob_size: int = None, dialect: CsvDialect = None, compact: bool = False, date_formats: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Generate a DataFrame from a blob, preferring the columnar sidecar when one exists.
+    CSVs larger than BLOB_STREAMING_THRESHOLD_BYTES are streamed when blob_size is given.
+    """
+    try:
+        return await load_blob_df(blob_path, columnar_blob_path, blob_size, dialect=dialect, compact=compact, date_formats=date_formats)
     except Exception as e:
         logger.error(f"Error loading {blob_path}: {str(e)}")
         return None
 
 
-async def get_dataframes_dict(data_sources: list[DataSource], data_source_ids: list[str] = None) -> dict[str, pd.DataFrame]:
-    """
-    Get a dictionary of dataframes for the given data source ids
-    """
+def _get_used_data_sources(data_sources: list[DataSource], data_source_ids: list[str] = None) -> list[DataSource]:
     if data_source_ids:
-        used_data_sources = [ds for ds in data_sources if str(ds.id) in data_source_ids]
-    else:
-        used_data_sources = data_sources
+        return [ds for ds in data_sources if str(ds.id) in data_source_ids]
+    return data_sources
+
+
+def _get_used_columns(data_source: DataSource, columns: dict[str, list[str]] = None) -> list[str]:
+    """Get the projected columns of a data source in file order, or None to load all of them"""
+    if not columns or not columns.get(str(data_source.id)):
+        return None
+    # Keep the file's column order whatever order the projection lists them in
+    requested = set(columns[str(data_source.id)])
+    return [col.name for col in data_source.columnMetadata if col.name in requested] or None
+
+
+async def _load_dataframe(data_source: DataSource, used_columns: list[str], semaphore: asyncio.Semaphore, copy: bool = True) -> pd.DataFrame:
+    """Load a data source through the dataframe cache, sharing the load with concurrent requests for it"""
+    async def load() -> pd.DataFrame:
+        async with semaphore:
+            return await load_blob_df(
+                data_source.blobPath, data_source.columnarBlobPath, data_source.size, data_source.dialect,
+                used_columns, data_source.compactDtypes, data_source.get_date_formats()
+            )
+
+    return await get_or_load_dataframe(data_source.blobPath, get_content_version(data_source), used_columns, load, copy)
+
+
+async def _gather_data_sources(used_data_sources: list[DataSource], load: Callable[[DataSource], Awaitable[Any]]) -> tuple[dict[str, Any], list[DataSourceLoadFailure]]:
+    """Load data sources concurrently, collecting the failures instead of stopping at the first"""
+    results = await asyncio.gather(
+        *[load(data_source) for data_source in used_data_sources],
+        return_exceptions=True
+    )
+
     dataframes = {}
-    for data_source in used_data_sources:
-        df = await generate_blob_df(data_source.blobPath)
-        dataframes[str(data_source.id)] = df
-    return dataframes
\ No newline at end of file
+    failures = []
+    for data_source, result in zip(used_data_sources, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error loading data source {data_source.id} ({data_source.blobPath}): {str(result)}")
+            failures.append(DataSourceLoadFailure(
+                dataSourceId=str(data_source.id),
+                filename=data_source.filename,
+                blobPath=data_source.blobPath,
+                error=str(result)
+            ))
+            continue
+        dataframes[str(data_source.id)] = result
+    return dataframes, failures
+
+
+async def get_dataframes_dict(data_sources: list[DataSource], data_source_ids: list[str] = None, columns: dict[str, list[str]] = None, copy: bool = True) -> dict[str, pd.DataFrame]:
+    """
+    Get a dictionary of dataframes for the given data source ids.
+    Data sources are fetched concurrently, at most DATAFRAME_LOAD_CONCURRENCY at a time.
+
+    Args:
+        data_sources: Data sources of the project
+        data_source_ids: Only load these data sources; None loads all of them
+        columns: Optional column projection per data source id; data sources without an entry are loaded in full
+        copy: Hand out private views of cached frames; only callers that never mutate them may pass False
+
+    Raises:
+        DataFrameLoadError: If any of the data sources could not be loaded
+    """
+    semaphore = asyncio.Semaphore(settings.DATAFRAME_LOAD_CONCURRENCY)
+
+    async def load_data_source(data_source: DataSource) -> pd.DataFrame:
+        return await _load_dataframe(data_source, _get_used_columns(data_source, columns), semaphore, copy)
+
+    dataframes, failures = await _gather_data_sources(_get_used_data_sources(data_sources, data_source_ids), load_data_source)
+    if failures:
+        raise DataFrameLoadError(failures)
+    return dataframes
+
+
+async def _share_data_source(data_source: DataSource, used_columns: list[str], semaphore: asyncio.Semaphore) -> Union[SharedFrameHandle, pd.DataFrame]:
+    """Get a shared-memory handle to a data source, loading and sharing it on first use"""
+    version = get_content_version(data_source)
+    handle = acquire_shared_frame(data_source.blobPath, version, used_columns)
+    if handle is not None:
+        return handle
+    # Read-only use: the frame is only serialized, never handed to generated code in this process
+    df = await _load_dataframe(data_source, used_columns, semaphore, copy=False)
+    if not settings.SHARED_FRAMES_ENABLED:
+        return df
+    handle = await asyncio.to_thread(share_dataframe, data_source.blobPath, version, used_columns, df)
+    return handle if handle is not None else df
+
+
+async def _share_derived_column(data_source: DataSource, column: str, transformation: str, semaphore: asyncio.Semaphore) -> Union[SharedFrameHandle, pd.Series]:
+    """
+    Get a shared-memory handle to a derived column of a data source (see get_derived_column),
+    computing it from the cached frame and sharing it on first use
+    """
+    version = get_content_version(data_source)
+    df = await _load_dataframe(data_source, [column], semaphore, copy=False)
+    # Counts the cache hit even when the shared copy below already exists
+    series = await asyncio.to_thread(get_derived_column, df, column, transformation, data_source.blobPath, version)
+    if not settings.SHARED_FRAMES_ENABLED:
+        return series
+    handle = acquire_shared_frame(data_source.blobPath, version, [column], transformation)
+    if handle is None:
+        handle = await asyncio.to_thread(
+            share_dataframe, data_source.blobPath, version, [column], series.to_frame(column), transformation)
+    return handle if handle is not None else series
+
+
+@asynccontextmanager
+async def lazy_dataframes_dict(data_sources: list[DataSource], data_source_ids: list[str] = None, columns: dict[str, list[str]] = None) -> AsyncIterator[tuple[dict[str, DeferredFrame], Callable[[str, bool], Awaitable[Union[SharedFrameHandle, pd.DataFrame]]], Callable[[str, str, str], Awaitable[Union[SharedFrameHandle, pd.Series]]]]]:
+    """
+    Like get_dataframes_dict, but for sandbox workers and with nothing loaded up front. Yields deferred
+    frames and the loaders to pass to run_generated_code as load_frame and load_derived: a data source
+    is loaded only when the generated code first reads it, and only with its projected columns until
+    the code needs more. Each data source version is written to shared memory once and reused by later
+    requests, and frames that cannot be shared are passed by value; derived columns are shared from the
+    derived column cache the same way. The references taken here are released on exit.
+    Several jobs may share one context; each data source and derived column is loaded once.
+
+    Which data sources and columns were actually read is recorded on exit (see get_dataset_access_stats).
+    """
+    used_data_sources = {str(ds.id): ds for ds in _get_used_data_sources(data_sources, data_source_ids)}
+    semaphore = asyncio.Semaphore(settings.DATAFRAME_LOAD_CONCURRENCY)
+    loads: dict[tuple[str, bool], asyncio.Future] = {}
+    derivations: dict[tuple[str, str, str], asyncio.Future] = {}
+
+    async def load_frame(data_source_id: str, all_columns: bool) -> Union[SharedFrameHandle, pd.DataFrame]:
+        data_source = used_data_sources[data_source_id]
+        used_columns = None if all_columns else _get_used_columns(data_source, columns)
+        key = (data_source_id, used_columns is None)
+        if key not in loads:
+            loads[key] = asyncio.ensure_future(_share_data_source(data_source, used_columns, semaphore))
+        return await asyncio.shield(loads[key])
+
+    async def load_derived(data_source_id: str, column: str, transformation: str) -> Union[SharedFrameHandle, pd.Series]:
+        key = (data_source_id, column, transformation)
+        if key not in derivations:
+            derivations[key] = asyncio.ensure_future(
+                _share_derived_column(used_data_sources[data_source_id], column, transformation, semaphore))
+        return await asyncio.shield(derivations[key])
+
+    deferred = {}
+    for data_source_id, data_source in used_data_sources.items():
+        used_columns = _get_used_columns(data_source, columns)
+        deferred[data_source_id] = DeferredFrame(
+            data_source_id, tuple(used_columns) if used_columns else None, data_source.blobPath, get_content_version(data_source))
+    try:
+        yield deferred, load_frame, load_derived
+    finally:
+        # Loads still running when a job was cancelled or timed out take references too
+        futures = [*loads.values(), *derivations.values()]
+        await asyncio.gather(*futures, return_exceptions=True)
+        handles = [
+            future.result() for future in futures
+            if not future.cancelled() and future.exception() is None and isinstance(future.result(), SharedFrameHandle)
+        ]
+        release_shared_frames(handles)
+        read = {}
+        for data_source_id, is_full in sorted(loads, key=lambda key: key[1]):
+            read[data_source_id] = None if is_full else list(deferred[data_source_id].columns)
+        record_dataset_access(list(used_data_sources), read)
@@ -0,0 +1,82 @@
+import ast
+import logging
+from app.models.data_sources import DataSource
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def get_referenced_names(code: str) -> set[str]:
+    """
+    Collect every string literal and attribute name in the code.
+    Column access in pandas goes through one of the two (df["col"], df.col).
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            names.add(node.value)
+        elif isinstance(node, ast.Attribute):
+            names.add(node.attr)
+    return names
+
+
+def widen_column_projection(code: str, data_sources: list[DataSource], projection: dict[str, list[str]]) -> dict[str, list[str]]:
+    """
+    Drop the projection of any data source whose code references a column outside it,
+    so that data source is loaded in full instead of failing at runtime.
+
+    Args:
+        code: Generated code that will run against the data sources
+        data_sources: Data sources the code runs against
+        projection: Column projection per data source id
+
+    Returns:
+        The projection, without the data sources that need all their columns
+    """
+    if not projection:
+        return {}
+    referenced = get_referenced_names(code)
+    widened = {}
+    for data_source in data_sources:
+        data_source_id = str(data_source.id)
+        columns = projection.get(data_source_id)
+        if not columns:
+            continue
+        missing = {col.name for col in data_source.columnMetadata} & referenced - set(columns)
+        if missing:
+            logger.info(f"Loading all columns of {data_source_id}: code also uses {sorted(missing)}")
+            continue
+        widened[data_source_id] = columns
+    return widened
+
+
+# Names that suggest code works on whole frames (every column) rather than named columns
+WHOLE_FRAME_NAMES = {
+    "columns", "iloc", "describe", "select_dtypes", "info", "dtypes", "values", "to_numpy", "T",
+    "transpose", "melt", "stack", "to_dict", "to_records", "itertuples", "iterrows", "corr", "cov",
+}
+
+
+def get_code_column_projection(code: str, data_sources: list[DataSource]) -> dict[str, list[str]]:
+    """
+    Columns each data source should be loaded with, from the column names the code mentions.
+
+    Only data sources with a Parquet sidecar are projected, since only there a projection
+    skips reading the other columns. Code that works on whole frames gets no projection.
+    A column the code turns out to need anyway is loaded when it fails on the projection.
+    """
+    referenced = get_referenced_names(code)
+    if not referenced or referenced & WHOLE_FRAME_NAMES:
+        return {}
+    projection = {}
+    for data_source in data_sources:
+        if not data_source.columnarBlobPath:
+            continue
+        columns = [col.name for col in data_source.columnMetadata if col.name in referenced]
+        if columns:
+            projection[str(data_source.id)] = columns
+    return projection
@@ -0,0 +1,162 @@
+import ast
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from types import CodeType
+from typing import Callable, NamedTuple, Optional
+from app.config import get_settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Modules generated code has no business importing
+FORBIDDEN_IMPORTS = {
+    "builtins", "ctypes", "http", "importlib", "multiprocessing", "os", "pathlib", "pickle",
+    "requests", "shutil", "signal", "socket", "subprocess", "sys", "threading", "urllib",
+}
+
+
+class CompiledCode(NamedTuple):
+    code: CodeType
+    # Names of the functions (and other names) defined at the top level
+    functions: frozenset
+    # Top-level packages the code imports that are in FORBIDDEN_IMPORTS
+    forbidden_imports: tuple
+
+
+class _CacheEntry:
+    def __init__(self, compiled: CompiledCode):
+        self.compiled = compiled
+        # Entry point name -> function, resolved on first use
+        self.entry_points: dict[str, Callable] = {}
+
+
+# sha256 of the source -> entry, least recently used first
+_entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Counters of this process at the last take_code_cache_usage
+_taken = dict(_stats)
+# Lookups sandbox workers reported with their jobs
+_worker_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _with_hit_rate(stats: dict) -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return {**stats, "hitRate": stats["hits"] / lookups if lookups else 0.0}
+
+
+def _analyse_code(source: str, filename: str) -> CompiledCode:
+    """Parse, validate and compile source code"""
+    tree = ast.parse(source, filename=filename)
+    functions = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.add(node.name)
+        elif isinstance(node, ast.Assign):
+            # e.g. main = build_result
+            functions.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imported.add(node.module.split(".")[0])
+    return CompiledCode(
+        code=compile(tree, filename, "exec"),
+        functions=frozenset(functions),
+        forbidden_imports=tuple(sorted(imported & FORBIDDEN_IMPORTS)),
+    )
+
+
+def _get_entry(source: str, filename: str) -> _CacheEntry:
+    key = hashlib.sha256(source.encode()).hexdigest()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry
+        _stats["misses"] += 1
+
+    # Compile outside the lock; a concurrent miss on the same source just compiles twice
+    entry = _CacheEntry(_analyse_code(source, filename))
+    with _lock:
+        entry = _entries.setdefault(key, entry)
+        while len(_entries) > settings.CODE_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return entry
+
+
+def compile_generated_code(source: str, filename: str = "<generated>") -> CompiledCode:
+    """
+    Get the compiled and validated form of generated source code, compiling it on first use.
+
+    Raises:
+        SyntaxError: If the source does not parse
+        ValueError: If the source imports a module in FORBIDDEN_IMPORTS
+    """
+    compiled = _get_entry(source, filename).compiled
+    if compiled.forbidden_imports:
+        raise ValueError(f"Code imports forbidden modules: {', '.join(compiled.forbidden_imports)}")
+    return compiled
+
+
+def get_entry_point(source: str, entry_point: str, filename: str = "<generated>") -> Callable:
+    """
+    Get a function defined by generated code, e.g. main or build_chart.
+
+    The module body runs once per source and the function is reused by later calls,
+    so generated code must not rely on module-level state being fresh.
+
+    Raises:
+        SyntaxError: If the source does not parse
+        ValueError: If the source imports a forbidden module or does not define entry_point
+    """
+    entry = _get_entry(source, filename)
+    compiled = entry.compiled
+    if compiled.forbidden_imports:
+        raise ValueError(f"Code imports forbidden modules: {', '.join(compiled.forbidden_imports)}")
+    if entry_point not in compiled.functions:
+        raise ValueError(f"Code did not define {entry_point} function")
+
+    function: Optional[Callable] = entry.entry_points.get(entry_point)
+    if function is None:
+        namespace = {}
+        exec(compiled.code, namespace)
+        function = namespace[entry_point]
+        entry.entry_points[entry_point] = function
+    return function
+
+
+def take_code_cache_usage() -> dict:
+    """Get this process's hit/miss/eviction counts since the last call, for a sandbox worker to report"""
+    with _lock:
+        usage = {name: _stats[name] - _taken[name] for name in _stats}
+        _taken.update(_stats)
+    return usage
+
+
+def record_code_cache_usage(usage: dict) -> None:
+    """Add counts a sandbox worker took with take_code_cache_usage to the workers' totals"""
+    with _lock:
+        for name, value in usage.items():
+            _worker_stats[name] += value
+
+
+def get_code_cache_stats() -> dict:
+    """
+    Get hit/miss/eviction counters and the hit rate of the compiled code cache.
+    Each process (including every sandbox worker) has its own cache; the workers' lookups
+    are reported with each job and summed under sandboxWorkers.
+    """
+    with _lock:
+        return {
+            **_with_hit_rate(_stats),
+            "entries": len(_entries),
+            "maxEntries": settings.CODE_CACHE_MAX_ENTRIES,
+            "sandboxWorkers": _with_hit_rate(_worker_stats),
+        }
@@ -1,23 +1,24 @@
+from collections.abc import Mapping
 import pandas as pd
+import polars as pl
 import logging
+from app.utils.code_cache import get_entry_point
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Errors raised when generated code reaches for a column that is not in its frames
+MISSING_COLUMN_ERRORS = (KeyError, AttributeError, pl.exceptions.ColumnNotFoundError)
 
-def execute_pandas_code(code: str, dataframes: dict[str, pd.DataFrame]):
+
+def execute_pandas_code(code: str, dataframes: Mapping[str, pd.DataFrame], entry_point: str = 'main'):
     """
     Execute the pandas code
     """
     # Execute the generated code
     try:
-        # Create namespace for execution
-        namespace = {}
-        exec(code, namespace)
-        get_result = namespace.get('main')
-
-        if not get_result:
-            raise ValueError(f"Code did not define main function")
+        # Compiled once per distinct source
+        get_result = get_entry_point(code, entry_point)
 
         # Run the analysis
         result = get_result(dataframes)
@@ -25,3 +26,66 @@ def execute_pandas_code(code: str, dataframes: dict[str, pd.DataFrame]):
     except Exception as e:
         logger.error(f"Error executing code: {str(e)}")
         raise e
+
+
+def polars_result_to_python(result):
+    """
+    Convert a Polars result to the plain dict/records shape pandas code returns,
+    collecting lazy frames on the way.
+    """
+    if isinstance(result, pl.LazyFrame):
+        result = result.collect()
+    if isinstance(result, pl.DataFrame):
+        return result.to_dicts()
+    if isinstance(result, pl.Series):
+        return result.to_list()
+    if isinstance(result, dict):
+        return {key: polars_result_to_python(value) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [polars_result_to_python(value) for value in result]
+    return result
+
+
+class _PolarsFrames(Mapping):
+    """LazyFrames over pandas frames, converted when the code first reads each one"""
+
+    def __init__(self, dataframes: Mapping[str, pd.DataFrame]):
+        self._dataframes = dataframes
+        self._frames: dict[str, pl.LazyFrame] = {}
+
+    def __getitem__(self, key: str) -> pl.LazyFrame:
+        if key not in self._frames:
+            # Polars keeps the input width when summing, so any narrower integer columns are widened
+            # back to Int64 (lazily) to aggregate like pandas does
+            self._frames[key] = pl.from_pandas(self._dataframes[key]).lazy().with_columns(
+                pl.col(pl.Int8, pl.Int16, pl.Int32).cast(pl.Int64))
+        return self._frames[key]
+
+    def __iter__(self):
+        return iter(self._dataframes)
+
+    def __len__(self) -> int:
+        return len(self._dataframes)
+
+
+def execute_polars_code(code: str, dataframes: Mapping[str, pd.DataFrame], entry_point: str = 'main'):
+    """
+    Execute Polars code against the dataframes, passed in as LazyFrames so Polars
+    can optimise the whole query and run it on every core.
+    """
+    try:
+        get_result = get_entry_point(code, entry_point)
+
+        return polars_result_to_python(get_result(_PolarsFrames(dataframes)))
+    except Exception as e:
+        logger.error(f"Error executing code: {str(e)}")
+        raise e
+
+
+def execute_generated_code(code: str, dataframes: Mapping[str, pd.DataFrame], engine: str = 'pandas', entry_point: str = 'main'):
+    """
+    Execute generated code with the executor of the engine it was generated for
+    """
+    if engine == 'polars':
+        return execute_polars_code(code, dataframes, entry_point)
+    return execute_pandas_code(code, dataframes, entry_point)
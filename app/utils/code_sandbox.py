@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import multiprocessing
+import pickle
+import resource
+import time
+import traceback
+from multiprocessing.connection import Connection
+from typing import Any, Awaitable, Callable, Union
+import pandas as pd
+from app.config import get_settings
+from app.utils.code_cache import take_code_cache_usage, record_code_cache_usage
+from app.utils.code_executer import execute_generated_code, MISSING_COLUMN_ERRORS
+from app.utils.dataframe_cache import configure_copy_on_write
+from app.utils.shared_frames import SharedFrameHandle
+from app.utils.lazy_datasets import LazyDatasets
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Workers fork from a server that already imported these, so a replacement starts in milliseconds
+SANDBOX_PRELOAD_MODULES = ["numpy", "pandas", "polars", "pyarrow", "app.utils.code_cache", "app.utils.code_executer", "app.utils.derived_columns", "app.utils.key_index", "app.utils.lazy_datasets", "app.utils.shared_frames"]
+
+MISSING_COLUMN_ERROR_NAMES = {error.__name__ for error in MISSING_COLUMN_ERRORS}
+
+
+class CodeExecutionError(Exception):
+    """
+    Raised when generated code fails in the sandbox.
+
+    kind is one of:
+        - "exception": the code raised; exception_type names the exception
+        - "timeout": the code ran past its wall-clock limit and its worker was killed
+        - "memory": the code hit the worker memory limit
+        - "worker_died": the worker exited without answering (e.g. a native crash)
+    """
+
+    def __init__(self, kind: str, message: str, exception_type: str = None, traceback: str = None):
+        self.kind = kind
+        self.message = message
+        self.exception_type = exception_type
+        self.traceback = traceback
+        super().__init__(f"[{kind}] {message}")
+
+    @property
+    def is_missing_column(self) -> bool:
+        """Whether the code reached for a column its frames do not have"""
+        return self.kind == "exception" and self.exception_type in MISSING_COLUMN_ERROR_NAMES
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "message": self.message,
+            "exceptionType": self.exception_type,
+            "traceback": self.traceback,
+        }
+
+
+def _send_job(connection: Connection, job: tuple) -> None:
+    """
+    Send a job with its frames' column buffers out of band, so they are written
+    to the pipe directly instead of being copied into one large pickle first.
+    """
+    buffers = []
+    payload = pickle.dumps(job, protocol=5, buffer_callback=buffers.append)
+    connection.send(len(buffers))
+    connection.send_bytes(payload)
+    for buffer in buffers:
+        connection.send_bytes(buffer.raw())
+
+
+def _receive_job(connection: Connection) -> tuple:
+    """Receive a job sent by _send_job"""
+    buffer_count = connection.recv()
+    payload = connection.recv_bytes()
+    buffers = [connection.recv_bytes() for _ in range(buffer_count)]
+    return pickle.loads(payload, buffers=buffers)
+
+
+def _run_job(code: str, engine: str, entry_point: str, dataframes: dict, sample_rows: int = None, fetch: Callable[[str, bool], Any] = None, fetch_derived: Callable[[str, str, str], Any] = None) -> Any:
+    """
+    Run a job against a lazy mapping of its frames, so frames are only mapped or fetched
+    when the code reads them. The code is rerun once when:
+        - without copy-on-write, it writes into a read-only shared column in place: on private
+          copies of the frames
+        - it reaches for a column a projected frame does not have: with every column loaded
+    """
+    datasets = LazyDatasets(dataframes, fetch, sample_rows, fetch_derived)
+    retried = set()
+    while True:
+        try:
+            return execute_generated_code(code, datasets, engine, entry_point)
+        except ValueError as e:
+            if "read-only" not in str(e) or "copies" in retried or not datasets.has_shared_frames:
+                raise
+            logger.info("Generated code modifies its frames in place, rerunning on private copies")
+            retried.add("copies")
+            datasets.use_private_copies()
+        except MISSING_COLUMN_ERRORS:
+            if "columns" in retried or not datasets.load_all_columns():
+                raise
+            logger.info("Generated code reads columns outside its projection, rerunning with every column")
+            retried.add("columns")
+
+
+def _sandbox_worker_main(connection: Connection, memory_limit_bytes: int) -> None:
+    """
+    Worker loop: run one job at a time and answer with ("ok", result, usage) or ("error", details, usage),
+    where usage is the job's lookups in the worker's compiled code cache.
+    While a job runs, the worker may ask for a deferred frame with ("load", data_source_id, all_columns)
+    and for a derived column of one with ("derive", data_source_id, column, transformation).
+    The worker exits after a MemoryError, since the heap may be left in a bad state.
+    """
+    if memory_limit_bytes:
+        # RLIMIT_DATA counts the heap and private allocations. RLIMIT_AS would also count the address space
+        # polars and pyarrow reserve per thread and the shared frames the worker maps, about 1 GB before any job
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit_bytes, memory_limit_bytes))
+    configure_copy_on_write()
+
+    def fetch(data_source_id: str, all_columns: bool) -> Any:
+        connection.send(("load", data_source_id, all_columns))
+        status, frame = _receive_job(connection)
+        if status == "error":
+            raise RuntimeError(f"Could not load dataset {data_source_id}: {frame}")
+        return frame
+
+    def fetch_derived(data_source_id: str, column: str, transformation: str) -> Any:
+        connection.send(("derive", data_source_id, column, transformation))
+        status, derived = _receive_job(connection)
+        if status == "error":
+            raise RuntimeError(f"Could not derive {transformation} of {data_source_id}.{column}: {derived}")
+        return derived
+
+    while True:
+        try:
+            code, engine, entry_point, dataframes, sample_rows = _receive_job(connection)
+        except (EOFError, OSError):
+            return
+        try:
+            result = _run_job(code, engine, entry_point, dataframes, sample_rows, fetch, fetch_derived)
+            # Fail here rather than in send() if the result cannot cross the pipe
+            connection.send_bytes(pickle.dumps(("ok", result, take_code_cache_usage())))
+        except MemoryError:
+            connection.send(("error", {"kind": "memory", "message": "Code exceeded the memory limit", "exception_type": "MemoryError"}, {}))
+            return
+        except Exception as e:
+            connection.send(("error", {
+                "kind": "exception",
+                "message": str(e),
+                "exception_type": type(e).__name__,
+                "traceback": traceback.format_exc(),
+            }, take_code_cache_usage()))
+
+
+class SandboxWorker:
+    """A sandbox worker process and the parent's end of its pipe"""
+
+    def __init__(self, context: multiprocessing.context.BaseContext):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_sandbox_worker_main,
+            args=(child_connection, settings.SANDBOX_MEMORY_LIMIT_BYTES),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.jobs_run = 0
+
+    def is_usable(self) -> bool:
+        return self.process.is_alive() and self.jobs_run < settings.SANDBOX_MAX_JOBS_PER_WORKER
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def run(self, job: tuple, timeout: float, load_frame: Callable[[str, bool], Any] = None, load_derived: Callable[[str, str, str], Any] = None) -> tuple:
+        """
+        Send a job and block until the worker answers, serving its requests for deferred
+        frames with load_frame and for their derived columns with load_derived.
+        Time spent serving requests does not count against the timeout.
+
+        Raises:
+            TimeoutError: If the worker did not answer in time
+        """
+        self.jobs_run += 1
+        _send_job(self.connection, job)
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.connection.poll(max(0, deadline - time.monotonic())):
+                raise TimeoutError()
+            answer = pickle.loads(self.connection.recv_bytes())
+            if answer[0] not in ("load", "derive"):
+                break
+            started_at = time.monotonic()
+            try:
+                if answer[0] == "load":
+                    reply = ("frame", load_frame(*answer[1:]))
+                else:
+                    reply = ("derived", load_derived(*answer[1:]))
+            except Exception as e:
+                reply = ("error", str(e))
+            _send_job(self.connection, reply)
+            deadline += time.monotonic() - started_at
+        if answer[0] == "error" and answer[1]["kind"] == "memory":
+            # The worker exits after a MemoryError; wait so it is not handed another job
+            self.process.join()
+        return answer
+
+
+# Global sandbox pool, shared by the agent, KPI generation and visuals
+sandbox_context: multiprocessing.context.BaseContext = None
+idle_sandbox_workers: asyncio.Queue = None
+# Workers whose replacement failed to start; started again before the next job
+missing_sandbox_workers = 0
+
+
+def start_code_sandbox():
+    """Pre-fork the sandbox workers that run generated code"""
+    global sandbox_context, idle_sandbox_workers, missing_sandbox_workers
+
+    sandbox_context = multiprocessing.get_context("forkserver")
+    sandbox_context.set_forkserver_preload(SANDBOX_PRELOAD_MODULES)
+    idle_sandbox_workers = asyncio.Queue()
+    missing_sandbox_workers = 0
+    for _ in range(settings.SANDBOX_WORKERS):
+        idle_sandbox_workers.put_nowait(SandboxWorker(sandbox_context))
+    logger.info(f"Started code sandbox with {settings.SANDBOX_WORKERS} workers")
+
+
+def shutdown_code_sandbox():
+    """Kill the idle sandbox workers; busy ones are killed when their job returns"""
+    global sandbox_context, idle_sandbox_workers
+
+    if idle_sandbox_workers is not None:
+        while not idle_sandbox_workers.empty():
+            idle_sandbox_workers.get_nowait().kill()
+        sandbox_context = None
+        idle_sandbox_workers = None
+        logger.info("Code sandbox shut down")
+
+
+async def _acquire_worker(pool: asyncio.Queue) -> SandboxWorker:
+    """
+    Take an idle worker, first starting one whose replacement failed earlier.
+
+    Raises:
+        CodeExecutionError: If no worker is left and none can be started
+    """
+    global missing_sandbox_workers
+    if missing_sandbox_workers and pool is idle_sandbox_workers:
+        missing_sandbox_workers -= 1
+        try:
+            pool.put_nowait(await asyncio.to_thread(SandboxWorker, sandbox_context))
+        except Exception as e:
+            missing_sandbox_workers += 1
+            logger.error(f"Could not start a sandbox worker, {missing_sandbox_workers} missing: {str(e)}")
+            if missing_sandbox_workers >= settings.SANDBOX_WORKERS:
+                raise CodeExecutionError("worker_died", f"No sandbox worker could be started: {str(e)}")
+    return await pool.get()
+
+
+async def _release_worker(worker: SandboxWorker, pool: asyncio.Queue) -> None:
+    """
+    Return a worker to the pool, replacing it if it is dead, killed or used up.
+    A replacement that fails to start is retried before the next job rather than lost.
+    """
+    global missing_sandbox_workers
+    if pool is not idle_sandbox_workers:
+        # The sandbox was shut down or restarted while the job ran
+        worker.kill()
+        return
+    if not worker.is_usable():
+        worker.kill()
+        try:
+            worker = await asyncio.to_thread(SandboxWorker, sandbox_context)
+        except Exception as e:
+            missing_sandbox_workers += 1
+            logger.error(f"Could not replace sandbox worker, retrying before the next job: {str(e)}")
+            return
+    pool.put_nowait(worker)
+
+
+async def run_generated_code(code: str, dataframes: dict[str, Union[SharedFrameHandle, pd.DataFrame]], engine: str = "pandas", entry_point: str = "main", timeout: float = None, sample_rows: int = None, load_frame: Callable[[str, bool], Awaitable[Any]] = None, load_derived: Callable[[str, str, str], Awaitable[Any]] = None) -> Any:
+    """
+    Run generated code in a sandbox worker process, off the event loop.
+
+    Args:
+        code: Generated code defining the entry point function
+        dataframes: Frames passed to the entry point, keyed by data source id; shared frame
+            handles (see share_dataframe) are mapped by the worker without copying,
+            deferred frames (see lazy_dataframes_dict) are requested through load_frame on first read
+        engine: Engine the code was generated for ("pandas" or "polars")
+        entry_point: Name of the function to call
+        timeout: Wall-clock limit in seconds, defaults to SANDBOX_TIMEOUT_SECONDS
+        sample_rows: Run on only the first sample_rows rows of each frame
+        load_frame: Loads a deferred frame, with every column when its second argument is True
+        load_derived: Gets a transformation of a column of a deferred frame from the derived column
+            cache, given the data source id, column and transformation
+
+    Returns:
+        The entry point's return value
+
+    Raises:
+        CodeExecutionError: If the code fails, times out, runs out of memory or kills its worker
+    """
+    if idle_sandbox_workers is None:
+        start_code_sandbox()
+    timeout = timeout or settings.SANDBOX_TIMEOUT_SECONDS
+    pool = idle_sandbox_workers
+
+    loop = asyncio.get_running_loop()
+
+    def load_frame_from_thread(data_source_id: str, all_columns: bool) -> Any:
+        if load_frame is None:
+            raise RuntimeError("No loader for deferred frames")
+        return asyncio.run_coroutine_threadsafe(load_frame(data_source_id, all_columns), loop).result()
+
+    def load_derived_from_thread(data_source_id: str, column: str, transformation: str) -> Any:
+        if load_derived is None:
+            raise RuntimeError("No loader for derived columns")
+        return asyncio.run_coroutine_threadsafe(load_derived(data_source_id, column, transformation), loop).result()
+
+    worker = await _acquire_worker(pool)
+    started_at = time.perf_counter()
+    try:
+        status, details, usage = await asyncio.to_thread(
+            worker.run, (code, engine, entry_point, dataframes, sample_rows), timeout,
+            load_frame_from_thread, load_derived_from_thread)
+    except TimeoutError:
+        # Killing the worker is the only way to stop code stuck in a C extension
+        worker.kill()
+        raise CodeExecutionError("timeout", f"Code did not finish within {timeout}s")
+    except asyncio.CancelledError:
+        worker.kill()
+        raise
+    except (EOFError, OSError) as e:
+        worker.kill()
+        raise CodeExecutionError("worker_died", f"Sandbox worker exited with code {worker.process.exitcode}: {str(e)}")
+    finally:
+        await _release_worker(worker, pool)
+
+    logger.info(f"Ran {entry_point} in sandbox worker {worker.process.pid} in {time.perf_counter() - started_at:.2f}s")
+    record_code_cache_usage(usage)
+    if status == "error":
+        raise CodeExecutionError(**details)
+    return details
@@ -0,0 +1,53 @@
+import io
+import logging
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.config import get_settings
+from app.utils.dtypes import COMPACT_STRING_DTYPE, widen_integers
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COLUMNAR_SUFFIX = ".parquet"
+
+
+def get_columnar_blob_path(blob_path: str) -> str:
+    """
+    Get the path of the columnar sidecar stored next to a CSV blob.
+    """
+    return f"{blob_path}{COLUMNAR_SUFFIX}"
+
+
+def dataframe_to_parquet_bytes(df: pd.DataFrame) -> Optional[bytes]:
+    """
+    Serialize a dataframe to Parquet, preserving its dtypes.
+
+    Returns None when the frame cannot be represented in Parquet
+    (e.g. object columns mixing numbers and strings), in which case
+    readers keep using the CSV.
+    """
+    try:
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, engine="pyarrow", index=False, compression="zstd")
+        return buffer.getvalue()
+    except Exception as e:
+        logger.warning(f"Could not convert dataframe to Parquet: {str(e)}")
+        return None
+
+
+def parquet_bytes_to_dataframe(content: bytes, columns: list[str] = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Read a dataframe from Parquet bytes, Arrow-backed when CSV_ARROW_DTYPES is set.
+    Only the given columns are decoded when columns is provided.
+    Compact sidecars keep their string columns Arrow-backed instead of expanding them to objects.
+    """
+    if compact and not settings.CSV_ARROW_DTYPES:
+        table = pq.read_table(io.BytesIO(content), columns=columns)
+        string_types = {pa.string(): COMPACT_STRING_DTYPE, pa.large_string(): COMPACT_STRING_DTYPE}
+        return widen_integers(table.to_pandas(types_mapper=string_types.get))
+    if settings.CSV_ARROW_DTYPES:
+        return pd.read_parquet(io.BytesIO(content), engine="pyarrow", columns=columns, dtype_backend="pyarrow")
+    return pd.read_parquet(io.BytesIO(content), engine="pyarrow", columns=columns)
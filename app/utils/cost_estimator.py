@@ -0,0 +1,269 @@
+import ast
+import logging
+import math
+from typing import Optional
+from app.config import get_settings
+from app.models.cost_estimate import CostEstimate, CostStrategy, OperationCost
+from app.models.data_sources import DataSource
+from app.models.relationships import Relationship, RelationshipType
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Method names (pandas and Polars) grouped by how their cost grows with the rows they read
+JOIN_METHODS = {"merge", "join"}
+HASH_METHODS = {"groupby", "group_by", "pivot_table", "pivot", "value_counts", "drop_duplicates", "unique", "nunique", "unstack"}
+SORT_METHODS = {"sort_values", "sort_index", "sort", "rank"}
+ROW_WISE_METHODS = {"apply", "applymap", "map_elements", "map_rows", "iterrows", "itertuples", "iter_rows"}
+LIMIT_METHODS = {"head", "tail", "nlargest", "nsmallest", "limit"}
+
+# A Python call per row costs about as much as this many vectorised row operations
+PYTHON_ROW_COST = 100
+# A Python function per group runs vectorised inside each group
+GROUP_APPLY_COST = 10
+
+# Calls on grouped data that return one row per input row rather than per group
+GROUP_PRESERVING_METHODS = {"transform", "apply", "filter", "cumsum", "cumcount", "rank", "shift", "fillna", "map_elements"}
+# Calls whose result has one row per distinct value
+AGGREGATING_METHODS = {"pivot_table", "value_counts", "unique", "nunique"}
+
+_NO_FRAME = (0, frozenset())
+
+
+def _constant_strings(node: Optional[ast.AST]) -> list[str]:
+    """String constants of a node that is a string or a list/tuple of strings"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+    return []
+
+
+def _is_grouped(node: ast.AST) -> bool:
+    """Whether an expression is a groupby result, e.g. df.groupby("a") or df.groupby("a")["b"]"""
+    while isinstance(node, (ast.Subscript, ast.Attribute)):
+        node = node.value
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in ("groupby", "group_by")
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.AST]:
+    return next((keyword.value for keyword in call.keywords if keyword.arg == name), None)
+
+
+class _CodeCostEstimator:
+    """
+    Walks generated code, tracking which variables hold (a derivation of) which data source
+    and how many rows they have at most, and prices each costly operation.
+    """
+
+    def __init__(self, tree: ast.AST, data_sources: list[DataSource], relationships: list[Relationship]):
+        self.tree = tree
+        self.data_sources = {str(ds.id): ds for ds in data_sources}
+        self.relationships = relationships
+        # Variable name -> (max rows, ids of the data sources it derives from)
+        self.frames: dict[str, tuple[int, frozenset]] = {}
+
+    def frame_of(self, node: ast.AST) -> tuple[int, frozenset]:
+        """Upper bound on the rows of the frame an expression evaluates to, and its data sources"""
+        if isinstance(node, ast.Name):
+            return self.frames.get(node.id, _NO_FRAME)
+        if isinstance(node, ast.Subscript):
+            keys = _constant_strings(node.slice)
+            if len(keys) == 1 and keys[0] in self.data_sources:
+                return self.data_sources[keys[0]].rows, frozenset(keys)
+            return self.frame_of(node.value)
+        if isinstance(node, ast.Attribute):
+            return self.frame_of(node.value)
+        if isinstance(node, ast.Call):
+            return self._call_frame(node)
+        frames = [self.frame_of(child) for child in ast.iter_child_nodes(node)]
+        if not frames:
+            return _NO_FRAME
+        return max(rows for rows, _ in frames), frozenset().union(*(sources for _, sources in frames))
+
+    def _call_frame(self, call: ast.Call) -> tuple[int, frozenset]:
+        if not isinstance(call.func, ast.Attribute):
+            return _NO_FRAME
+        method = call.func.attr
+        if method == "get" and call.args:
+            keys = _constant_strings(call.args[0])
+            if len(keys) == 1 and keys[0] in self.data_sources:
+                return self.data_sources[keys[0]].rows, frozenset(keys)
+        if method in JOIN_METHODS:
+            left, right = self._join_sides(call)
+            if left is not None and right is not None:
+                output_rows, _ = self.join_output(call)
+                return output_rows, self.frame_of(left)[1] | self.frame_of(right)[1]
+        if method == "concat" and call.args:
+            frames = [self.frame_of(elt) for elt in getattr(call.args[0], "elts", [call.args[0]])]
+            return sum(rows for rows, _ in frames), frozenset().union(*(sources for _, sources in frames))
+        rows, sources = self.frame_of(call.func.value)
+        if method in AGGREGATING_METHODS or (_is_grouped(call.func.value) and method not in GROUP_PRESERVING_METHODS):
+            # Number of groups is unknown; assume about sqrt(n) of them
+            rows = math.isqrt(rows)
+        if method in LIMIT_METHODS:
+            limit = call.args[0] if call.args else _keyword(call, "n")
+            if isinstance(limit, ast.Constant) and isinstance(limit.value, int):
+                rows = min(rows, limit.value)
+        return rows, sources
+
+    def _join_sides(self, call: ast.Call) -> tuple[Optional[ast.AST], Optional[ast.AST]]:
+        """The left and right frames of df.merge(other) / pd.merge(left, right) / df.join(other)"""
+        receiver = call.func.value
+        if isinstance(receiver, ast.Name) and receiver.id in ("pd", "pandas"):
+            if len(call.args) >= 2:
+                return call.args[0], call.args[1]
+            return _keyword(call, "left"), _keyword(call, "right")
+        right = call.args[0] if call.args else _keyword(call, "right") or _keyword(call, "other")
+        return receiver, right
+
+    def _find_relationship(self, left_sources: frozenset, right_sources: frozenset, left_keys: list[str], right_keys: list[str]) -> Optional[Relationship]:
+        def matches(table: str, sources: frozenset) -> bool:
+            return any(table in (data_source_id, self.data_sources[data_source_id].filename) for data_source_id in sources)
+
+        for relationship in self.relationships:
+            for (table_l, key_l), (table_r, key_r) in (
+                ((relationship.tableA, relationship.keyA), (relationship.tableB, relationship.keyB)),
+                ((relationship.tableB, relationship.keyB), (relationship.tableA, relationship.keyA)),
+            ):
+                if not (matches(table_l, left_sources) and matches(table_r, right_sources)):
+                    continue
+                if (not left_keys or key_l in left_keys) and (not right_keys or key_r in right_keys):
+                    return relationship
+        return None
+
+    def join_output(self, call: ast.Call) -> tuple[int, Optional[str]]:
+        """Estimated output rows of a join, with a note when the estimate is uncertain or large"""
+        left, right = self._join_sides(call)
+        left_rows, left_sources = self.frame_of(left) if left is not None else _NO_FRAME
+        right_rows, right_sources = self.frame_of(right) if right is not None else _NO_FRAME
+        on = _constant_strings(_keyword(call, "on"))
+        left_keys = on or _constant_strings(_keyword(call, "left_on"))
+        right_keys = on or _constant_strings(_keyword(call, "right_on"))
+
+        relationship = self._find_relationship(left_sources, right_sources, left_keys, right_keys)
+        if relationship is not None and relationship.type == RelationshipType.MANY_TO_MANY:
+            # Without key statistics, assume every key repeats about sqrt(n) times on each side
+            fanout = math.sqrt(max(1, min(left_rows, right_rows)))
+            return int(left_rows * right_rows / fanout), f"many-to-many join on {relationship.keyA}/{relationship.keyB}"
+        note = None if relationship is not None else "key cardinality unknown"
+        return max(left_rows, right_rows), note
+
+    def operations(self) -> list[OperationCost]:
+        """Price every costly call and Python loop over frame rows"""
+        operations = []
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.For):
+                rows, _ = self.frame_of(node.iter)
+                is_row_iterator = isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Attribute) \
+                    and node.iter.func.attr in ROW_WISE_METHODS
+                if rows and not is_row_iterator:
+                    operations.append(OperationCost(
+                        operation="python loop", line=node.lineno, rows=rows, cost=rows * PYTHON_ROW_COST))
+                continue
+            if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+                continue
+            method = node.func.attr
+            if method in JOIN_METHODS:
+                left, right = self._join_sides(node)
+                rows = sum(self.frame_of(side)[0] for side in (left, right) if side is not None)
+                if not rows:
+                    continue
+                output_rows, note = self.join_output(node)
+                operations.append(OperationCost(
+                    operation=method, line=node.lineno, rows=rows, output_rows=output_rows,
+                    cost=rows + output_rows, note=note))
+                continue
+
+            rows, _ = self.frame_of(node.func.value)
+            if not rows:
+                continue
+            if method in HASH_METHODS:
+                operations.append(OperationCost(operation=method, line=node.lineno, rows=rows, cost=rows))
+            elif method in SORT_METHODS:
+                operations.append(OperationCost(
+                    operation=method, line=node.lineno, rows=rows, cost=rows * math.log2(max(rows, 2))))
+            elif method in ROW_WISE_METHODS or (method == "map" and any(isinstance(arg, ast.Lambda) for arg in node.args)):
+                per_group = any(
+                    isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute) and child.func.attr in ("groupby", "group_by")
+                    for child in ast.walk(node.func.value)
+                )
+                operations.append(OperationCost(
+                    operation=method, line=node.lineno, rows=rows,
+                    cost=rows * (GROUP_APPLY_COST if per_group else PYTHON_ROW_COST),
+                    note="Python function per group" if per_group else "Python function per row"))
+        return operations
+
+    def estimate(self) -> CostEstimate:
+        assignments = sorted(
+            (node for node in ast.walk(self.tree) if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None),
+            key=lambda node: (node.lineno, node.col_offset)
+        )
+        for node in assignments:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            frame = self.frame_of(node.value)
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    self.frames[target.id] = frame
+
+        referenced = {
+            node.value for node in ast.walk(self.tree)
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value in self.data_sources
+        }
+        # Code that iterates over every frame reads them all
+        rows_scanned = sum(self.data_sources[data_source_id].rows for data_source_id in referenced or self.data_sources)
+        operations = self.operations()
+        cost = rows_scanned + sum(operation.cost for operation in operations)
+        return CostEstimate(
+            rows_scanned=rows_scanned,
+            cost=cost,
+            estimated_seconds=round(cost / settings.COST_UNITS_PER_SECOND, 3),
+            operations=operations,
+        )
+
+
+def choose_strategy(estimate: CostEstimate, can_regenerate: bool, can_use_columnar: bool) -> CostEstimate:
+    """
+    Pick how to run code with the given estimate:
+        - run it when it should finish within COST_RUN_MAX_SECONDS
+        - regenerate it with a hint when row-wise Python or a many-to-many join dominates
+        - hand the question to DuckDB when joins, groupbys and sorts over many rows dominate
+        - otherwise run it on a sample first so a failure or blow-up shows up early
+    """
+    if estimate.estimated_seconds <= settings.COST_RUN_MAX_SECONDS:
+        estimate.strategy = CostStrategy.RUN
+        return estimate
+
+    row_wise = [op for op in estimate.operations if op.note and op.note.startswith("Python")] + \
+        [op for op in estimate.operations if op.operation == "python loop"]
+    many_to_many = [op for op in estimate.operations if op.note and op.note.startswith("many-to-many")]
+    if can_regenerate and (many_to_many or sum(op.cost for op in row_wise) * 2 >= estimate.cost):
+        hints = []
+        if row_wise:
+            lines = ", ".join(str(op.line) for op in row_wise)
+            hints.append(f"Replace the row-by-row Python at line(s) {lines} (apply/iterrows/loops) with vectorised column operations.")
+        for op in many_to_many:
+            hints.append(f"The {op.note} at line {op.line} may produce about {op.output_rows} rows; aggregate or deduplicate before joining.")
+        estimate.strategy = CostStrategy.REGENERATE
+        estimate.hint = " ".join(hints)
+    elif can_use_columnar:
+        estimate.strategy = CostStrategy.COLUMNAR
+    else:
+        estimate.strategy = CostStrategy.SAMPLE
+        estimate.sample_rows = settings.COST_SAMPLE_ROWS
+    return estimate
+
+
+def estimate_code_cost(code: str, data_sources: list[DataSource], relationships: list[Relationship] = None) -> Optional[CostEstimate]:
+    """
+    Statically estimate the cost of generated code from the row counts of its data sources,
+    the known key cardinalities (relationships) and the operations it performs.
+
+    Returns None when the code does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    return _CodeCostEstimator(tree, data_sources, relationships or []).estimate()
@@ -1,15 +1,189 @@
+import codecs
+import csv
 import io
 import logging
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from typing import Tuple, List, Dict, Any
+from app.config import get_settings
+from app.models.data_sources import CsvDialect
+from app.utils.datetime_columns import detect_datetime_columns
+from app.utils.parse_pool import run_parse_job
 
 # Set up logging
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
-async def read_and_parse_csv(content: bytes, file_size: int, filename: str) -> Tuple[pd.DataFrame, List[Dict], List[str], Dict[str, str]]:
+# pandas' default missing value markers, so both engines agree on what is null
+PANDAS_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+
+# Only this many leading bytes are inspected to detect encoding and delimiter
+DIALECT_SNIFF_BYTES = 64 * 1024
+CANDIDATE_DELIMITERS = ",;\t|"
+
+def detect_csv_dialect(content: bytes) -> CsvDialect:
+    """
+    Detect the encoding and delimiter of a CSV file from a bounded prefix of its bytes.
+    
+    Args:
+        content: The raw bytes of the CSV file (only the first DIALECT_SNIFF_BYTES are read)
+        
+    Returns:
+        The detected CsvDialect
+    """
+    prefix = content[:DIALECT_SNIFF_BYTES]
+    
+    if prefix.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = "utf-16"
+    else:
+        try:
+            prefix.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off by the prefix boundary is still UTF-8
+            is_truncated = len(prefix) == DIALECT_SNIFF_BYTES and e.start >= len(prefix) - 3
+            encoding = "utf-8" if is_truncated else "latin1"
+    
+    text = prefix.decode(encoding, errors="ignore")
+    if len(prefix) == DIALECT_SNIFF_BYTES and "\n" in text:
+        # Drop the last, possibly partial, line
+        text = text[:text.rfind("\n")]
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    
+    return CsvDialect(encoding=encoding, delimiter=delimiter)
+
+def _read_csv_pyarrow(content: bytes, dialect: CsvDialect, columns: list[str] = None) -> pd.DataFrame:
+    """
+    Parse CSV bytes with pyarrow's multi-threaded reader, configured to infer the same types as pandas.
+    """
+    read_options = pa_csv.ReadOptions(use_threads=True, encoding=dialect.encoding)
+    parse_options = pa_csv.ParseOptions(delimiter=dialect.delimiter)
+    convert_options = pa_csv.ConvertOptions(
+        null_values=PANDAS_NA_VALUES,
+        strings_can_be_null=True,
+        true_values=["True", "TRUE", "true"],
+        false_values=["False", "FALSE", "false"],
+        include_columns=columns or [],
+    )
+    
+    # pandas leaves date strings as text, so keep columns pyarrow would turn into timestamps as strings
+    first_block_schema = pa_csv.open_csv(
+        io.BytesIO(content), read_options=read_options, parse_options=parse_options, convert_options=convert_options
+    ).schema
+    convert_options.column_types = {
+        field.name: pa.string()
+        for field in first_block_schema
+        if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type) or pa.types.is_time(field.type)
+    }
+    
+    table = pa_csv.read_csv(io.BytesIO(content), read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_binary(field.type):
+            # pyarrow falls back to binary where pandas raises on undecodable text
+            raise UnicodeDecodeError(dialect.encoding, b"", 0, 1, f"column {field.name} is not valid {dialect.encoding}")
+        if pa.types.is_null(field.type):
+            # pandas reads all-empty columns as float64
+            table = table.set_column(index, field.name, pa.nulls(table.num_rows, pa.float64()))
+    if settings.CSV_ARROW_DTYPES:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+def read_csv_frame(content: bytes, dialect: CsvDialect, engine: str = None, columns: list[str] = None) -> pd.DataFrame:
+    """
+    Parse CSV bytes with the configured engine.
+    
+    Args:
+        content: The raw bytes of the CSV file
+        dialect: Encoding and delimiter of the file
+        engine: "pandas" (single-threaded C parser) or "pyarrow" (multi-threaded), defaults to CSV_PARSE_ENGINE
+        columns: Only parse these columns; None parses all of them
+        
+    Returns:
+        DataFrame of the parsed CSV
+    """
+    engine = engine or settings.CSV_PARSE_ENGINE
+    if engine == "pyarrow":
+        return _read_csv_pyarrow(content, dialect, columns)
+    if engine == "pandas":
+        return pd.read_csv(io.BytesIO(content), encoding=dialect.encoding, sep=dialect.delimiter, usecols=columns)
+    raise ValueError(f"Unknown CSV parse engine: {engine}")
+
+def to_numpy_backed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert Arrow-backed columns to the NumPy dtypes pandas' default parser produces.
+    """
+    arrow_columns = [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.ArrowDtype)]
+    if not arrow_columns:
+        return df
+    converted = pa.Table.from_pandas(df[arrow_columns], preserve_index=False).to_pandas()
+    converted.index = df.index
+    return df.assign(**{col: converted[col] for col in arrow_columns})
+
+def column_type_name(dtype) -> str:
     """
-    Read and parse a CSV file with proper encoding detection and error handling.
+    Name a column dtype the way columnMetadata always has, i.e. with NumPy dtype names,
+    whichever engine produced the frame. Compacted string columns are named "string".
+    """
+    if isinstance(dtype, pd.StringDtype):
+        return "string"
+    if not isinstance(dtype, pd.ArrowDtype):
+        return str(dtype)
+    arrow_type = dtype.pyarrow_dtype
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return "object"
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        return "datetime64[ns]"
+    return str(dtype.numpy_dtype)
+
+def get_sample_data(df: pd.DataFrame) -> List[Dict]:
+    """
+    Get the first rows of a frame as JSON-safe records, for a data source's sampleData.
+    """
+    sample = to_numpy_backed(df.head(5))
+    # Dates as ISO text; Timestamps and NaT are neither JSON nor BSON values
+    datetime_columns = [col for col, dtype in sample.dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+    if datetime_columns:
+        sample = sample.assign(**{
+            col: sample[col].astype(str).where(sample[col].notna(), None) for col in datetime_columns
+        })
+    sample_data = sample.replace({
+        np.nan: None,  # Replace NaN with None
+        np.inf: None,  # Replace infinity with None
+        -np.inf: None  # Replace negative infinity with None
+    }).to_dict(orient='records')
+    
+    # Convert NumPy types to Python native types in sample data
+    from app.utils.json_encoders import convert_numpy_types
+    return convert_numpy_types(sample_data)
+
+def get_column_types(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Get the columnMetadata type name of every column of a frame.
+    """
+    return {col: column_type_name(dtype) for col, dtype in df.dtypes.items()}
+
+async def read_and_parse_csv(content: bytes, file_size: int, filename: str) -> Tuple[pd.DataFrame, List[Dict], List[str], Dict[str, str], Dict[str, str], CsvDialect]:
+    """
+    Read and parse a CSV file in the parse pool, keeping the event loop free.
+    
+    See parse_csv_content for arguments and return value.
+    """
+    return await run_parse_job(parse_csv_content, content, file_size, filename, description=f"parsing {filename}")
+
+def parse_csv_content(content: bytes, file_size: int, filename: str) -> Tuple[pd.DataFrame, List[Dict], List[str], Dict[str, str], Dict[str, str], CsvDialect]:
+    """
+    Read and parse a CSV file, detecting its encoding and delimiter once up front.
+    Text columns holding dates in a single format are converted to datetime64 when CSV_PARSE_DATES is set.
     
     Args:
         content: The raw bytes of the CSV file
@@ -22,49 +196,32 @@ async def read_and_parse_csv(content: bytes, file_size: int, filename: str) -> T
         - Sample data as list of dicts
         - Column names list
         - Column types dict
+        - Date format of each column converted to datetime64
+        - Detected CsvDialect, to be passed to every later reader
     """
     logger.info(f"Parsing CSV file: {filename} ({file_size} bytes)")
     
-    def read_csv_with_encoding(content, encodings_to_try):
-        """Try reading CSV with different encodings until one works"""
-        for encoding in encodings_to_try:
-            try:
-                logger.debug(f"Trying encoding: {encoding}")
-                return pd.read_csv(io.BytesIO(content), encoding=encoding)
-            except UnicodeDecodeError:
-                logger.debug(f"Encoding {encoding} failed")
-                continue
-            except Exception as e:
-                # If it's not an encoding error, re-raise
-                if not isinstance(e, UnicodeDecodeError):
-                    logger.error(f"Non-encoding error with {encoding}: {str(e)}")
-                    raise
-        
-        logger.error("Failed to read CSV")
-        raise ValueError("Failed to read CSV")
-    
-    # Try common encodings in order of likelihood
-    encodings = ['utf-8', 'latin1', 'cp1252', 'ISO-8859-1']
+    dialect = detect_csv_dialect(content)
+    logger.info(f"Detected encoding {dialect.encoding} and delimiter {dialect.delimiter!r} for {filename}")
     
-    df = read_csv_with_encoding(content, encodings)
+    try:
+        df = read_csv_frame(content, dialect)
+    except UnicodeDecodeError:
+        # The prefix looked like UTF-8 but a later byte is not; latin1 decodes any byte
+        logger.warning(f"{filename} is not {dialect.encoding} past the sniffed prefix, falling back to latin1")
+        dialect = CsvDialect(encoding="latin1", delimiter=dialect.delimiter)
+        df = read_csv_frame(content, dialect)
     
     logger.info(f"Successfully parsed CSV with {len(df)} rows and {len(df.columns)} columns")
     
-    # Convert sample data to JSON-safe values
-    sample_data = df.head(5).replace({
-        np.nan: None,  # Replace NaN with None
-        np.inf: None,  # Replace infinity with None
-        -np.inf: None  # Replace negative infinity with None
-    }).to_dict(orient='records')
+    date_formats = {}
+    if settings.CSV_PARSE_DATES:
+        df, date_formats = detect_datetime_columns(df)
     
-    # Convert NumPy types to Python native types in sample data
-    from app.utils.json_encoders import convert_numpy_types
-    sample_data = convert_numpy_types(sample_data)
+    sample_data = get_sample_data(df)
     
     # Handle column types (pandas dtypes aren't directly JSON serializable)
     column_names = df.columns.tolist()
-    column_types = {}
-    for col, dtype in df.dtypes.items():
-        column_types[col] = str(dtype)
+    column_types = get_column_types(df)
     
-    return df, sample_data, column_names, column_types 
\ No newline at end of file
+    return df, sample_data, column_names, column_types, date_formats, dialect 
\ No newline at end of file
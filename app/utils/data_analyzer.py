@@ -12,6 +12,7 @@ from datetime import datetime
 
 from app.services.azure_ai import query_azure_openai
 from app.utils.json_encoders import convert_numpy_types
+from app.utils.dataframe_cache import private_view
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -155,8 +156,8 @@ async def analyze_csv_data(df: pd.DataFrame, column_names: List[str]) -> Dict[st
         # Define a safe execution environment for running the generated code
         def safe_exec(code_str, df, column_name):
             """Safely execute the generated Python code with limited scope"""
-            # Create a copy of the dataframe to prevent modifications
-            df_copy = df.copy()
+            # A private view keeps the code's modifications away from df and the next column's run
+            df_copy = private_view(df)
             
             # Create a restricted globals dictionary with only necessary modules
             restricted_globals = {
@@ -346,8 +347,8 @@ async def analyze_csv_data(df: pd.DataFrame, column_names: List[str]) -> Dict[st
             if null_count > 0:
                 issues.append(f"{null_count} null values")
             
-            # Check for type issues in date columns
-            if 'date' in col.lower() or 'time' in col.lower():
+            # Check for type issues in date columns; columns parsed at upload have none
+            if ('date' in col.lower() or 'time' in col.lower()) and not pd.api.types.is_datetime64_any_dtype(df[col]):
                 try:
                     pd.to_datetime(df[col], errors='raise')
                 except:
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional
+import pandas as pd
+from app.config import get_settings
+from app.models.data_sources import DataSource
+from app.utils.key_index import invalidate_key_indexes
+from app.utils.shared_frames import retire_shared_frames, clear_shared_frames
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class _CacheEntry(NamedTuple):
+    version: str
+    df: pd.DataFrame
+    size: int
+    # False when only some columns of the blob were loaded
+    is_full: bool
+
+
+# blobPath -> entry, least recently used first
+_entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "sharedLoads": 0}
+# Merges of partial frames read, concatenate and store an entry as one step per blob.
+# Striped so the number of locks stays fixed however many blobs pass through the cache.
+_merge_locks = [threading.Lock() for _ in range(64)]
+# (blobPath, version, columns) -> load in progress, so concurrent misses download and parse once
+_loads: dict[tuple, asyncio.Task] = {}
+# pandas 3 always copies on write and deprecates the option, warning whenever it is read or set
+COPY_ON_WRITE_ALWAYS = int(pd.__version__.split(".")[0]) >= 3
+
+
+def get_content_version(data_source: DataSource) -> str:
+    """
+    Get the content version of a data source.
+
+    Uploads always write a new blob and stamp lastUpdatedAt, so the timestamp
+    changes whenever the underlying file does.
+    """
+    return data_source.lastUpdatedAt.isoformat()
+
+
+def configure_copy_on_write() -> None:
+    """Turn on pandas copy-on-write for this process when COPY_ON_WRITE is set"""
+    if settings.COPY_ON_WRITE and not COPY_ON_WRITE_ALWAYS:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def is_copy_on_write() -> bool:
+    """Whether pandas copies on write in this process, so shallow views are safe to hand out"""
+    return COPY_ON_WRITE_ALWAYS or pd.options.mode.copy_on_write is True
+
+
+def private_view(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get a frame the caller may mutate without touching df.
+
+    Under copy-on-write this is a shallow view: columns are only copied once they are
+    written to. Otherwise it is a deep copy.
+    """
+    if is_copy_on_write():
+        return df.copy(deep=False)
+    return df.copy()
+
+
+def _drop_entry(blob_path: str, retire_shared: bool = True) -> None:
+    """Remove an entry and release its bytes. Caller must hold the lock."""
+    global _total_bytes
+    entry = _entries.pop(blob_path)
+    _total_bytes -= entry.size
+    if retire_shared:
+        # Shared-memory copies of an evicted or stale version go with it
+        retire_shared_frames(blob_path)
+
+
+def get_cached_dataframe(blob_path: str, version: str, columns: list[str] = None, copy: bool = True) -> Optional[pd.DataFrame]:
+    """
+    Get a cached dataframe for a blob at the given content version.
+
+    Args:
+        blob_path: Path of the source blob
+        version: Content version of the blob
+        columns: Only these columns are needed; None means the full frame
+        copy: Return a private view (see private_view); only callers that never mutate the frame may pass False
+
+    Returns a private view by default, since generated code routinely mutates the frames it is given.
+    Stale versions are dropped on lookup.
+    """
+    with _lock:
+        entry = _entries.get(blob_path)
+        if entry is not None and entry.version != version:
+            _drop_entry(blob_path)
+            entry = None
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        has_columns = entry.is_full if columns is None else set(columns).issubset(entry.df.columns)
+        if not has_columns:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(blob_path)
+        _stats["hits"] += 1
+        df = entry.df
+    if columns is not None:
+        df = df[columns]
+    return private_view(df) if copy else df
+
+
+def cache_dataframe(blob_path: str, version: str, df: pd.DataFrame, is_full: bool = True) -> None:
+    """
+    Store a dataframe for a blob, evicting least recently used entries to stay within budget.
+    Partial frames of the same version are merged so the cached columns accumulate.
+    """
+    global _total_bytes
+    # The blob's merge lock is held from reading the entry to storing the merged one, so concurrent
+    # merges cannot drop each other's columns; the cache lock is only held for the lookups
+    with _merge_locks[hash(blob_path) % len(_merge_locks)]:
+        with _lock:
+            existing = _entries.get(blob_path)
+        if existing is not None and existing.version == version and not is_full:
+            if existing.is_full:
+                return
+            new_columns = [col for col in df.columns if col not in existing.df.columns]
+            df = pd.concat([existing.df, df[new_columns]], axis=1)
+
+        size = int(df.memory_usage(deep=True).sum())
+        max_bytes = settings.DATAFRAME_CACHE_MAX_BYTES
+        if size > max_bytes:
+            logger.info(f"Not caching {blob_path}: {size} bytes exceeds cache budget of {max_bytes} bytes")
+            return
+
+        with _lock:
+            if blob_path in _entries:
+                # Merged partial entries of the same version keep their shared frames
+                _drop_entry(blob_path, retire_shared=_entries[blob_path].version != version)
+            while _entries and _total_bytes + size > max_bytes:
+                evicted_path = next(iter(_entries))
+                _drop_entry(evicted_path)
+                _stats["evictions"] += 1
+                logger.info(f"Evicted {evicted_path} from dataframe cache")
+            _entries[blob_path] = _CacheEntry(version, df, size, is_full)
+            _total_bytes += size
+
+
+async def get_or_load_dataframe(blob_path: str, version: str, columns: Optional[list[str]], load: Callable[[], Awaitable[pd.DataFrame]], copy: bool = True) -> pd.DataFrame:
+    """
+    Get a dataframe from the cache, loading and caching it on a miss.
+    Concurrent misses for the same blob version wait for one load instead of each downloading
+    and parsing the blob; a projected request also waits for a full load already running.
+
+    Args:
+        blob_path: Path of the source blob
+        version: Content version of the blob
+        columns: Only these columns are needed; None means the full frame
+        load: Loads the frame (with only columns, when given) on a miss
+        copy: See get_cached_dataframe
+
+    Raises:
+        Exception: Whatever load raised, in every request that waited for it
+    """
+    df = get_cached_dataframe(blob_path, version, columns, copy=copy)
+    if df is not None:
+        return df
+
+    key = (blob_path, version, tuple(columns) if columns is not None else None)
+    task = _loads.get(key)
+    if task is None and columns is not None:
+        task = _loads.get((blob_path, version, None))
+    if task is not None:
+        with _lock:
+            _stats["sharedLoads"] += 1
+    else:
+        async def load_and_cache() -> pd.DataFrame:
+            loaded = await load()
+            # Sizing object columns and merging partial entries take long enough to stall the event loop
+            await asyncio.to_thread(cache_dataframe, blob_path, version, loaded, columns is None)
+            return loaded
+
+        def forget(done: asyncio.Task) -> None:
+            _loads.pop(key, None)
+            if not done.cancelled():
+                # Retrieved here too, so a failure nobody waited for is not reported as unretrieved
+                done.exception()
+
+        task = asyncio.ensure_future(load_and_cache())
+        _loads[key] = task
+        task.add_done_callback(forget)
+
+    # Shielded: a cancelled request must not cancel the load other requests wait for
+    df = await asyncio.shield(task)
+    if columns is not None and list(df.columns) != list(columns):
+        df = df[columns]
+    return private_view(df) if copy else df
+
+
+def invalidate_dataframe(blob_path: str) -> None:
+    """
+    Drop any cached dataframe for a blob, e.g. after it is deleted or overwritten.
+    """
+    with _lock:
+        if blob_path in _entries:
+            _drop_entry(blob_path)
+            _stats["invalidations"] += 1
+            logger.info(f"Invalidated {blob_path} in dataframe cache")
+    # Frames too large for the cache may still be shared
+    retire_shared_frames(blob_path)
+    invalidate_key_indexes(blob_path)
+
+
+def clear_dataframe_cache() -> None:
+    """Drop every cached dataframe."""
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+    clear_shared_frames()
+
+
+def get_dataframe_cache_stats() -> dict:
+    """
+    Get hit/miss/eviction counters and current usage of the dataframe cache.
+    """
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "maxBytes": settings.DATAFRAME_CACHE_MAX_BYTES,
+        }
@@ -0,0 +1,127 @@
+import logging
+import warnings
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_object_dtype, is_string_dtype
+from pandas.tseries.api import guess_datetime_format
+from app.config import get_settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Leading sample values whose guessed formats are tried on the whole sample
+GUESSED_VALUES = 5
+
+
+def _is_text_column(series: pd.Series) -> bool:
+    return is_object_dtype(series.dtype) or is_string_dtype(series.dtype)
+
+
+def _has_date_parts(date_format: str) -> bool:
+    """Whether a format names a calendar date; bare years and times of day stay text"""
+    has_year = "%Y" in date_format or "%y" in date_format
+    has_month = any(directive in date_format for directive in ("%m", "%b", "%B"))
+    return has_year and has_month
+
+
+def _candidate_formats(values: List[str]) -> List[str]:
+    """Formats guessed from a few values, month first before day first like pandas' default"""
+    candidates = []
+    with warnings.catch_warnings():
+        # guess_datetime_format warns whenever the guess contradicts dayfirst
+        warnings.simplefilter("ignore")
+        for value in values[:GUESSED_VALUES]:
+            for dayfirst in (False, True):
+                date_format = guess_datetime_format(value, dayfirst=dayfirst)
+                if date_format and date_format not in candidates and _has_date_parts(date_format):
+                    candidates.append(date_format)
+    return candidates
+
+
+def _parse_exactly(series: pd.Series, date_format: str) -> Optional[pd.Series]:
+    """
+    series parsed with date_format, or None if any value does not match it.
+    Each distinct value is parsed once, since formats other than ISO 8601 parse value by value.
+    Values with UTC offsets are converted to UTC, which Parquet stores as is.
+    """
+    codes, uniques = pd.factorize(series)
+    try:
+        parsed_uniques = pd.to_datetime(pd.Index(uniques, dtype=object), format=date_format, errors="coerce", utc="%z" in date_format)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if parsed_uniques.isna().any():
+        return None
+    # Null codes (-1) take the appended NaT
+    parsed = parsed_uniques.append(pd.DatetimeIndex([pd.NaT], dtype=parsed_uniques.dtype)).take(codes)
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+
+def detect_datetime_format(series: pd.Series) -> Optional[str]:
+    """
+    Find the format every value of a text column is a date or timestamp in.
+
+    Formats guessed from the first values are tried, vectorised, on a sample of
+    DATE_DETECTION_SAMPLE_ROWS values; the first that parses the whole sample is
+    returned, for detect_datetime_columns to confirm on the full column.
+
+    Returns None when the column is not text or no single format fits the sample.
+    """
+    if not _is_text_column(series):
+        return None
+    values = series.dropna()
+    if values.empty:
+        return None
+    # Evenly spaced, so the sample spans the file rather than its first rows
+    positions = np.linspace(0, len(values) - 1, min(len(values), settings.DATE_DETECTION_SAMPLE_ROWS)).astype(int)
+    sample = values.iloc[positions]
+    if infer_dtype(sample, skipna=True) != "string":
+        return None
+    for date_format in _candidate_formats(values.head(GUESSED_VALUES).tolist()):
+        if _parse_exactly(sample, date_format) is not None:
+            return date_format
+    return None
+
+
+def parse_datetime_columns(df: pd.DataFrame, formats: Dict[str, str]) -> pd.DataFrame:
+    """
+    Convert the text columns of df named in formats to datetime64 with their format.
+    Columns that are missing, already parsed, or have a value the format does not match are left as they are.
+    """
+    converted = {}
+    for col, date_format in formats.items():
+        if col not in df.columns or not _is_text_column(df[col]):
+            continue
+        parsed = _parse_exactly(df[col], date_format)
+        if parsed is None:
+            logger.warning(f"Column {col} does not match its date format {date_format!r}, keeping it as text")
+            continue
+        converted[col] = parsed
+    return df.assign(**converted) if converted else df
+
+
+def detect_datetime_columns(df: pd.DataFrame) -> tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Detect the date and timestamp columns of a freshly parsed frame and convert them to datetime64.
+
+    Returns:
+        Tuple containing:
+        - The frame with its date columns converted
+        - Format of each converted column, to record in columnMetadata so CSV readers convert them the same way
+    """
+    converted = {}
+    formats = {}
+    for col in df.columns:
+        date_format = detect_datetime_format(df[col])
+        if date_format is None:
+            continue
+        # Confirm on the full column; one unmatched value keeps it as text
+        parsed = _parse_exactly(df[col], date_format)
+        if parsed is not None:
+            converted[col] = parsed
+            formats[col] = date_format
+    if not converted:
+        return df, formats
+    logger.info(f"Parsed date columns {formats}")
+    return df.assign(**converted), formats
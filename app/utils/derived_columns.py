@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+import pandas as pd
+from app.config import get_settings
+from app.utils.dataframe_cache import is_copy_on_write
+from app.utils.dtypes import COMPACT_STRING_DTYPE
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _normalize_text(series: pd.Series) -> pd.Series:
+    """Trimmed, lower-cased text with runs of whitespace collapsed, for grouping messy categories"""
+    return series.astype(COMPACT_STRING_DTYPE).str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+
+
+# Transformation name -> (function of its input, transformation whose result is the input or None for the column)
+DERIVATIONS: dict[str, tuple[Callable[[pd.Series], pd.Series], Optional[str]]] = {
+    "datetime": (lambda series: pd.to_datetime(series, errors="coerce"), None),
+    "date": (lambda series: series.dt.normalize(), "datetime"),
+    "year": (lambda series: series.dt.year, "datetime"),
+    "quarter": (lambda series: series.dt.to_period("Q"), "datetime"),
+    "month": (lambda series: series.dt.to_period("M"), "datetime"),
+    "week": (lambda series: series.dt.to_period("W"), "datetime"),
+    "weekday": (lambda series: series.dt.day_name(), "datetime"),
+    "normalized": (_normalize_text, None),
+}
+
+
+class _CacheEntry(NamedTuple):
+    version: str
+    series: pd.Series
+    size: int
+    # Seconds it took to derive, i.e. what each later hit saves
+    seconds: float
+
+
+# (blobPath, column, transformation) -> entry, least recently used first.
+# Lives in the API process next to the dataframe cache; sandbox workers get cached columns as shared frames.
+_entries: "OrderedDict[tuple[str, str, str], _CacheEntry]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "secondsComputing": 0.0, "secondsSaved": 0.0, "byTransformation": {}}
+
+
+def _record_usage(transformation: str, hit: bool, seconds: float) -> None:
+    """Count a lookup; seconds is the time saved by a hit or spent by a miss. Caller must hold the lock."""
+    counts = _stats["byTransformation"].setdefault(
+        transformation, {"hits": 0, "misses": 0, "secondsComputing": 0.0, "secondsSaved": 0.0})
+    for totals in (counts, _stats):
+        totals["hits" if hit else "misses"] += 1
+        totals["secondsSaved" if hit else "secondsComputing"] += seconds
+
+
+def _derive(frame: pd.DataFrame, column: str, transformation: str, blob_path: Optional[str], version: Optional[str]) -> pd.Series:
+    global _total_bytes
+    function, parent = DERIVATIONS[transformation]
+    key = (blob_path, column, transformation)
+    if blob_path is not None:
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None and entry.version == version:
+                _entries.move_to_end(key)
+                _record_usage(transformation, True, entry.seconds)
+                return entry.series
+            if entry is not None:
+                del _entries[key]
+                _total_bytes -= entry.size
+
+    source = frame[column] if parent is None else _derive(frame, column, parent, blob_path, version)
+    started_at = time.perf_counter()
+    series = function(source)
+    seconds = time.perf_counter() - started_at
+    with _lock:
+        _record_usage(transformation, False, seconds)
+        size = int(series.memory_usage(index=False))
+        if blob_path is None or size > settings.DERIVED_COLUMN_CACHE_MAX_BYTES:
+            return series
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _total_bytes -= previous.size
+        _entries[key] = _CacheEntry(version, series, size, seconds)
+        _total_bytes += size
+        while _total_bytes > settings.DERIVED_COLUMN_CACHE_MAX_BYTES:
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted.size
+    return series
+
+
+def get_derived_column(frame: pd.DataFrame, column: str, transformation: str, blob_path: str = None, version: str = None) -> pd.Series:
+    """
+    Get a transformation of a data source column (see DERIVATIONS), cached per content version
+    of the blob so repeated parsing of the same dates or categories happens once.
+
+    Args:
+        frame: The frame as loaded, before any code modified it
+        column: Source column
+        transformation: Name of a transformation in DERIVATIONS
+        blob_path: Path of the data source's blob; None derives without caching
+        version: Content version of the blob
+
+    Returns:
+        The derived column, with frame's index so it aligns with filtered subsets of the frame.
+        It may be modified freely; the cached copy is not affected.
+
+    Raises:
+        ValueError: If the transformation is unknown
+    """
+    if transformation not in DERIVATIONS:
+        raise ValueError(f"Unknown transformation {transformation!r}, expected one of {sorted(DERIVATIONS)}")
+    series = _derive(frame, column, transformation, blob_path, version)
+    if is_copy_on_write():
+        return series.copy(deep=False)
+    return series.copy()
+
+
+def get_derived_column_stats() -> dict:
+    """Get reuse counters of the derived column cache, overall and per transformation"""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "byTransformation": {name: dict(counts) for name, counts in _stats["byTransformation"].items()},
+            "hitRate": _stats["hits"] / lookups if lookups else None,
+        }
@@ -0,0 +1,65 @@
+import logging
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_object_dtype, is_signed_integer_dtype
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Integers are never downcast: numpy arithmetic keeps the narrower width and wraps around without
+# an error, so generated code like df.QUANTITY * df.PRICE_CENTS or col * 1000 on an int32 column
+# silently returns wrong numbers however much headroom its values had
+INTEGER_DTYPE = np.dtype("int64")
+
+
+def _get_string_dtype() -> pd.StringDtype:
+    """
+    Arrow-backed strings that keep NaN as the missing value, like object columns do.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:
+        # pandas < 2.3 spells the same dtype differently
+        return pd.StringDtype("pyarrow_numpy")
+
+
+COMPACT_STRING_DTYPE = _get_string_dtype()
+
+
+def widen_integers(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Widen signed integer columns narrower than int64 back to int64,
+    e.g. those of compact Parquet sidecars written when integers were still downcast to int32.
+    """
+    narrow = [
+        col for col, dtype in df.dtypes.items()
+        if is_signed_integer_dtype(dtype) and not isinstance(dtype, pd.ArrowDtype) and dtype.itemsize < INTEGER_DTYPE.itemsize
+    ]
+    return df.astype({col: INTEGER_DTYPE for col in narrow}) if narrow else df
+
+
+def compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a dataframe to compact dtypes without changing any value.
+
+    - object columns holding only strings become Arrow-backed strings
+    - integer columns stay int64 (see INTEGER_DTYPE), narrower ones are widened back to it
+
+    Floats are left alone: float32 sums and means accumulate in float32, which changes results.
+    Strings are not turned into categories, because grouping by a category also returns
+    groups for categories that a filter removed.
+    """
+    df = widen_integers(df)
+    converted = {}
+    for col, dtype in df.dtypes.items():
+        series = df[col]
+        if is_object_dtype(dtype) and infer_dtype(series, skipna=True) == "string":
+            converted[col] = series.astype(COMPACT_STRING_DTYPE)
+
+    if not converted:
+        return df
+    before = int(df.memory_usage(deep=True).sum())
+    df = df.assign(**converted)
+    after = int(df.memory_usage(deep=True).sum())
+    logger.info(f"Compacted {len(converted)} columns from {before} to {after} bytes")
+    return df
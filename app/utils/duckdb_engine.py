@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+import duckdb
+import pandas as pd
+from app.config import get_settings
+from app.models.data_sources import DataSource
+from app.utils.blob_storage import download_blob_to_file
+from app.utils.dataframe_cache import get_content_version
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+FILE_CACHE_DIR = os.path.join(settings.DUCKDB_WORK_DIR, "files")
+SPILL_DIR = os.path.join(settings.DUCKDB_WORK_DIR, "spill")
+
+# DuckDB's names for the encodings detect_csv_dialect produces
+DUCKDB_ENCODINGS = {"utf-8": "utf-8", "utf-8-sig": "utf-8", "utf-16": "utf-16", "latin1": "latin-1"}
+
+_SQL_FENCE = re.compile(r"^\s*```(?:sql)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def get_table_name(data_source_id: str) -> str:
+    """
+    Get the SQL table name a data source is exposed under.
+    """
+    return f"dataset_{data_source_id}"
+
+
+def strip_sql_fences(sql: str) -> str:
+    """
+    Remove the markdown fences the LLM sometimes wraps SQL in.
+    """
+    return _SQL_FENCE.sub("", sql).strip()
+
+
+def _evict_cached_files(keep: set[str]) -> None:
+    """
+    Delete least recently used local copies until the file cache fits its budget.
+    """
+    files = []
+    for name in os.listdir(FILE_CACHE_DIR):
+        path = os.path.join(FILE_CACHE_DIR, name)
+        if path in keep or name.endswith(".part"):
+            continue
+        stat = os.stat(path)
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files) + sum(os.path.getsize(path) for path in keep if os.path.exists(path))
+    for _, size, path in sorted(files):
+        if total <= settings.DUCKDB_FILE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            logger.info(f"Evicted {path} from DuckDB file cache")
+        except OSError as e:
+            logger.warning(f"Could not evict {path}: {str(e)}")
+
+
+async def get_local_copy(blob_path: str, version: str) -> str:
+    """
+    Get a local file holding a blob at the given content version, downloading it on first use.
+    DuckDB scans the file from disk, so the blob never has to fit in memory.
+    """
+    os.makedirs(FILE_CACHE_DIR, exist_ok=True)
+    key = hashlib.sha256(f"{blob_path}@{version}".encode()).hexdigest()
+    extension = os.path.splitext(blob_path)[1]
+    local_path = os.path.join(FILE_CACHE_DIR, f"{key}{extension}")
+    if os.path.exists(local_path):
+        # Mark as recently used for eviction
+        os.utime(local_path)
+        return local_path
+
+    part_path = f"{local_path}.{uuid.uuid4().hex}.part"
+    try:
+        await download_blob_to_file(blob_path, part_path)
+        os.replace(part_path, local_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return local_path
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_csv_scan(local_path: str, data_source: DataSource) -> str:
+    """
+    Build the DuckDB scan of a local CSV copy with the dialect detected at upload.
+    Date columns are read as text and parsed with the formats recorded at upload, so they are
+    TIMESTAMPs as in the Parquet sidecar rather than whatever DuckDB's own sniffing makes of them.
+    """
+    options = ["header = true"]
+    if data_source.dialect:
+        options.append(f"delim = {_quote_literal(data_source.dialect.delimiter)}")
+        options.append(f"encoding = {_quote_literal(DUCKDB_ENCODINGS.get(data_source.dialect.encoding, 'utf-8'))}")
+    date_formats = data_source.get_date_formats()
+    if date_formats:
+        text_types = ", ".join(f"{_quote_literal(col)}: 'VARCHAR'" for col in date_formats)
+        options.append(f"types = {{{text_types}}}")
+    scan = f"read_csv({_quote_literal(local_path)}, {', '.join(options)})"
+    if not date_formats:
+        return scan
+    parsed = ", ".join(
+        f"strptime({_quote_identifier(col)}, {_quote_literal(date_format)}) AS {_quote_identifier(col)}"
+        for col, date_format in date_formats.items()
+    )
+    return f"(SELECT * REPLACE ({parsed}) FROM {scan})"
+
+
+async def get_table_sources(data_sources: list[DataSource]) -> dict[str, str]:
+    """
+    Download the data sources to local files and build the DuckDB scan for each table.
+    The Parquet sidecar is preferred; CSVs are read as get_csv_scan describes.
+
+    Returns:
+        Table name -> DuckDB table function reading the local file
+    """
+    async def get_table_source(data_source: DataSource) -> tuple[str, str]:
+        version = get_content_version(data_source)
+        if data_source.columnarBlobPath:
+            try:
+                local_path = await get_local_copy(data_source.columnarBlobPath, version)
+                return local_path, f"read_parquet('{local_path}')"
+            except Exception as e:
+                logger.warning(f"Falling back to CSV for {data_source.blobPath}, could not fetch {data_source.columnarBlobPath}: {str(e)}")
+        local_path = await get_local_copy(data_source.blobPath, version)
+        return local_path, get_csv_scan(local_path, data_source)
+
+    table_sources = await asyncio.gather(*[get_table_source(data_source) for data_source in data_sources])
+    await asyncio.to_thread(_evict_cached_files, {local_path for local_path, _ in table_sources})
+    return {
+        get_table_name(str(data_source.id)): table_source
+        for data_source, (_, table_source) in zip(data_sources, table_sources)
+    }
+
+
+def _run_query(connection: duckdb.DuckDBPyConnection, sql: str, table_sources: dict[str, str]) -> list[dict]:
+    """
+    Expose the tables as views over the local files and run a read-only query,
+    fetching at most DUCKDB_MAX_RESULT_ROWS rows. Closes the connection when done.
+    """
+    try:
+        for table_name, table_source in table_sources.items():
+            connection.execute(f'CREATE VIEW "{table_name}" AS SELECT * FROM {table_source}')
+        # From here on only the cached files and the spill directory are reachable
+        connection.execute(f"SET allowed_directories = ['{FILE_CACHE_DIR}/', '{SPILL_DIR}/']")
+        connection.execute("SET enable_external_access = false")
+
+        statements = connection.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Generated SQL must be a single SELECT statement")
+
+        cursor = connection.execute(sql)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(settings.DUCKDB_MAX_RESULT_ROWS + 1)
+        if len(rows) > settings.DUCKDB_MAX_RESULT_ROWS:
+            logger.warning(f"Query returned more than {settings.DUCKDB_MAX_RESULT_ROWS} rows, truncating")
+            rows = rows[:settings.DUCKDB_MAX_RESULT_ROWS]
+        return pd.DataFrame.from_records(rows, columns=columns).to_dict(orient="records")
+    finally:
+        connection.close()
+
+
+async def execute_duckdb_query(sql: str, data_sources: list[DataSource]) -> list[dict]:
+    """
+    Run generated SQL over the data sources with an embedded DuckDB.
+
+    DuckDB streams the files from disk with DUCKDB_THREADS threads and spills to
+    DUCKDB_WORK_DIR beyond DUCKDB_MEMORY_LIMIT, so tables larger than memory can be queried.
+
+    Args:
+        sql: A single SELECT statement over the tables named by get_table_name
+        data_sources: Data sources the query reads
+
+    Returns:
+        The result rows as records
+
+    Raises:
+        TimeoutError: If the query runs past DUCKDB_QUERY_TIMEOUT_SECONDS
+    """
+    table_sources = await get_table_sources(data_sources)
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    connection = duckdb.connect(":memory:", config={
+        "memory_limit": settings.DUCKDB_MEMORY_LIMIT,
+        "threads": settings.DUCKDB_THREADS,
+        "temp_directory": SPILL_DIR,
+    })
+    started_at = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(
+            asyncio.to_thread(_run_query, connection, strip_sql_fences(sql), table_sources),
+            settings.DUCKDB_QUERY_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        # The worker thread closes the connection once the interrupted query unwinds
+        connection.interrupt()
+        raise TimeoutError(f"Query did not finish within {settings.DUCKDB_QUERY_TIMEOUT_SECONDS}s")
+    logger.info(f"DuckDB query over {len(table_sources)} tables returned {len(result)} rows in {time.perf_counter() - started_at:.2f}s")
+    return result
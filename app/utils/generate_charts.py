@@ -3,6 +3,7 @@ from typing import List, Dict, Any
 import json
 from datetime import datetime
 from app.utils.json_encoders import ensure_json_serializable
+from app.utils.code_cache import get_entry_point
 from app.services.mongodb import get_collection
 from app.services.azure_ai import query_azure_openai
 from bson.objectid import ObjectId
@@ -331,12 +332,10 @@ async def generate_chart_real_data(project_id: str, chart_info: Dict[str, Any],
         # Return sample data if we can't find the data sources
         return sample_series, sample_options
 
-    # Import necessary libraries for data processing
-    import pandas as pd
-    import io
-    from app.utils.blob_storage import download_from_blob_storage
+    from app.utils.blob_storage import generate_blob_df
+    from app.models.data_sources import CsvDialect
 
-    # Download and load data from blob storage
+    # Download and load data from blob storage, preferring the columnar copy
     dataframes = {}
     for ds in chart_data_sources:
         try:
@@ -347,40 +346,17 @@ async def generate_chart_real_data(project_id: str, chart_info: Dict[str, Any],
                     f"No blob path found for data source: {ds.get('filename')}")
                 continue
 
-            # Download blob content
-            blob_content = await download_from_blob_storage(blob_path)
-            if not blob_content:
+            dialect = CsvDialect(**ds["dialect"]) if ds.get("dialect") else None
+            date_formats = {col["name"]: col["format"] for col in ds.get("columnMetadata", []) if col.get("format")}
+            df = await generate_blob_df(blob_path, ds.get("columnarBlobPath"), ds.get("size"), dialect, ds.get("compactDtypes", False), date_formats)
+            if df is None:
                 logger.warning(
-                    f"Could not download blob for data source: {ds.get('filename')}")
+                    f"Could not load data for data source: {ds.get('filename')}")
                 continue
 
-            # Convert to DataFrame - try different encodings
-            try:
-                # First try UTF-8
-                df = pd.read_csv(io.BytesIO(blob_content))
-                dataframes[ds.get("filename")] = df
-                logger.info(
-                    f"Successfully loaded data for {ds.get('filename')} with {len(df)} rows")
-            except UnicodeDecodeError:
-                try:
-                    # If UTF-8 fails, try Latin-1 (a more permissive encoding)
-                    df = pd.read_csv(io.BytesIO(blob_content),
-                                     encoding='latin1')
-                    dataframes[ds.get("filename")] = df
-                    logger.info(
-                        f"Successfully loaded data for {ds.get('filename')} with {len(df)} rows using latin1 encoding")
-                except Exception as encoding_error:
-                    try:
-                        # If Latin-1 fails, try with error handling
-                        df = pd.read_csv(io.BytesIO(
-                            blob_content), encoding='utf-8', errors='replace')
-                        dataframes[ds.get("filename")] = df
-                        logger.info(
-                            f"Successfully loaded data for {ds.get('filename')} with {len(df)} rows using error replacement")
-                    except Exception as replace_error:
-                        logger.error(
-                            f"Failed to read {ds.get('filename')} with multiple encodings: {str(replace_error)}")
-                        continue
+            dataframes[ds.get("filename")] = df
+            logger.info(
+                f"Successfully loaded data for {ds.get('filename')} with {len(df)} rows")
 
         except Exception as e:
             logger.error(
@@ -413,9 +389,7 @@ async def generate_chart_real_data(project_id: str, chart_info: Dict[str, Any],
     # Extract the Python code from the response
     code = llm_response
 
-    namespace = {}
-    exec(code, {}, namespace)   # second arg {} keeps globals clean
-    build_chart = namespace["build_chart"]
+    build_chart = get_entry_point(code, "build_chart")
     chart_data = build_chart(dataframes)
     return chart_data['series'], chart_data['options']
 
@@ -0,0 +1,42 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from app.utils.columnar import dataframe_to_parquet_bytes
+from app.utils.csv_parser import get_column_types, get_sample_data
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def build_joined_frame(many: pd.DataFrame, one: pd.DataFrame, many_key: str, one_key: str, one_name: str) -> pd.DataFrame:
+    """
+    Denormalise a relationship: every row of the many side with the columns of its one-side row.
+
+    Keys that repeat on the one side keep their first row, so the join never multiplies rows
+    even when the relationship's cardinality was misjudged. One-side columns whose names the
+    many side already uses are prefixed with one_name; the one-side key is dropped.
+    """
+    one = one.drop_duplicates(subset=[one_key])
+    one = one.rename(columns={
+        column: f"{one_name}_{column}" for column in one.columns if column in many.columns and column != one_key
+    })
+    right_key = one_key if one_key == many_key else "__join_key__"
+    one = one.rename(columns={one_key: right_key})
+    joined = many.merge(one, left_on=many_key, right_on=right_key, how="left")
+    return joined if right_key == many_key else joined.drop(columns=[right_key])
+
+
+def write_joined_parquet(many: pd.DataFrame, one: pd.DataFrame, many_key: str, one_key: str, one_name: str) -> Tuple[Optional[bytes], int, Dict[str, str], List[Dict]]:
+    """
+    Build a relationship's joined frame and serialize it to Parquet in one parse pool job,
+    so only the bytes and metadata travel back.
+
+    Returns:
+        Tuple containing:
+        - Parquet bytes, None when the frame cannot be represented in Parquet
+        - Row count
+        - Column types, as columnMetadata names them
+        - Sample data as list of dicts
+    """
+    joined = build_joined_frame(many, one, many_key, one_key, one_name)
+    return dataframe_to_parquet_bytes(joined), len(joined), get_column_types(joined), get_sample_data(joined)
@@ -0,0 +1,234 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.arrays import ArrowExtensionArray
+from app.config import get_settings
+from app.models.data_sources import DataSource
+from app.models.relationships import Relationship
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _detached(keys: pd.Series) -> pd.Series:
+    """
+    A copy of keys sharing no memory with it. Arrow-backed copies share their buffers, which for
+    shared frames are mapped from a file the index must not keep alive once the frame is retired.
+    """
+    if isinstance(keys.array, ArrowExtensionArray):
+        chunks = keys.array.__arrow_array__().chunks
+        combined = pa.concat_arrays(chunks) if chunks else pa.array([], type=keys.array.__arrow_array__().type)
+        return pd.Series(type(keys.array)(pa.chunked_array([combined])), index=keys.index, name=keys.name)
+    return keys.copy(deep=True)
+
+
+class KeyIndex:
+    """
+    Index of one column of a loaded frame: its distinct keys in sorted order, with the row
+    positions of each key. Joins probe the keys' hash table, range filters bisect them.
+    """
+
+    def __init__(self, keys: pd.Series):
+        try:
+            codes, uniques = pd.factorize(keys, sort=True)
+            self.is_sorted = True
+        except TypeError:
+            # Mixed types that cannot be ordered can still be joined on
+            codes, uniques = pd.factorize(keys)
+            self.is_sorted = False
+        # merge matches nulls with nulls, so they get the group after the last key
+        codes = np.where(codes < 0, len(uniques), codes)
+        order = np.argsort(codes, kind="stable")
+        # The indexed values, to check that a frame still has them before using the index
+        self.keys = _detached(keys)
+        self.uniques = pd.Index(uniques)
+        # Row positions grouped by key; positions of key i are order[starts[i]:starts[i + 1]]
+        self.order = order
+        self.starts = np.searchsorted(codes[order], np.arange(len(uniques) + 2))
+        self.nbytes = int(
+            self.order.nbytes + self.starts.nbytes
+            + self.uniques.memory_usage() + keys.memory_usage(index=False)
+        )
+
+    def has_keys(self, series: pd.Series) -> bool:
+        """Whether series holds the indexed values in the indexed order, so row positions carry over"""
+        return len(series) == len(self.keys) and series.dtype == self.keys.dtype and series.equals(self.keys)
+
+    def join_positions(self, probe: pd.Series, how: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Row positions of an inner or left join of probe onto the indexed column, in probe order.
+        Indexed positions are -1 for unmatched probe rows of a left join.
+        """
+        groups = self.uniques.get_indexer(probe)
+        groups[probe.isna().to_numpy()] = len(self.uniques)
+        safe_groups = np.where(groups >= 0, groups, 0)
+        counts = np.where(groups >= 0, self.starts[safe_groups + 1] - self.starts[safe_groups], 0)
+        matched = counts > 0
+        if how == "left":
+            counts = np.maximum(counts, 1)
+        probe_positions = np.repeat(np.arange(len(probe)), counts)
+        if not len(self.order):
+            return probe_positions, np.full(len(probe_positions), -1)
+        # Offset of each output row within the run of positions of its key
+        run_offsets = np.arange(len(probe_positions)) - np.repeat(np.cumsum(counts) - counts, counts)
+        slots = np.repeat(self.starts[safe_groups], counts) + run_offsets
+        indexed_positions = self.order[np.minimum(slots, len(self.order) - 1)]
+        indexed_positions[~matched[probe_positions]] = -1
+        return probe_positions, indexed_positions
+
+    def range_positions(self, low: Any = None, high: Any = None) -> np.ndarray:
+        """Row positions with low <= value <= high, in row order; None leaves a side open"""
+        start = 0 if low is None else self.uniques.searchsorted(low, side="left")
+        stop = len(self.uniques) if high is None else self.uniques.searchsorted(high, side="right")
+        if start >= stop:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(self.order[self.starts[start]:self.starts[stop]])
+
+
+class _CacheEntry(NamedTuple):
+    version: str
+    index: KeyIndex
+
+
+# (blobPath, column) -> entry, least recently used first
+_entries: "OrderedDict[tuple[str, str], _CacheEntry]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "fallbacks": 0}
+
+
+def get_key_index(frame: pd.DataFrame, column: str, blob_path: str, version: str) -> Optional[KeyIndex]:
+    """
+    Get the index of a column of a data source frame, building and caching it on first use.
+    Indexes of other content versions of the blob are dropped on lookup.
+
+    Args:
+        frame: The frame as loaded; any column projection, but every row in file order
+        column: Column to index
+        blob_path: Path of the data source's blob
+        version: Content version of the blob
+
+    Returns None when the index would not fit in KEY_INDEX_CACHE_MAX_BYTES.
+    """
+    global _total_bytes
+    key = (blob_path, column)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry.version == version:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry.index
+        if entry is not None:
+            del _entries[key]
+            _total_bytes -= entry.index.nbytes
+        _stats["misses"] += 1
+
+    index = KeyIndex(frame[column])
+    if index.nbytes > settings.KEY_INDEX_CACHE_MAX_BYTES:
+        return None
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _total_bytes -= previous.index.nbytes
+        _entries[key] = _CacheEntry(version, index)
+        _total_bytes += index.nbytes
+        while _total_bytes > settings.KEY_INDEX_CACHE_MAX_BYTES:
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted.index.nbytes
+            _stats["evictions"] += 1
+    logger.info(f"Indexed {blob_path}:{column} ({len(index.uniques)} keys, {index.nbytes} bytes)")
+    return index
+
+
+def index_pays_off(probe_rows: int, indexed_rows: int) -> bool:
+    """Whether probing the index of a join side beats merge, which hashes the smaller side anyway"""
+    return indexed_rows >= probe_rows * settings.KEY_INDEX_JOIN_MIN_RATIO
+
+
+def merge_on_index(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str, how: str = "inner", index: KeyIndex = None) -> pd.DataFrame:
+    """
+    left.merge(right, left_on=left_on, right_on=right_on, how=how), probing index instead of hashing
+    right's key column again. Falls back to merge when index does not apply: no index, a join other
+    than inner/left, a right frame too small relative to left (see index_pays_off), mismatched key
+    types, or a right frame whose key column no longer matches it.
+    """
+    if (index is None or how not in ("inner", "left") or not index_pays_off(len(left), len(right))
+            or left[left_on].dtype.kind != right[right_on].dtype.kind or not index.has_keys(right[right_on])):
+        with _lock:
+            _stats["fallbacks"] += 1
+        return left.merge(right, left_on=left_on, right_on=right_on, how=how)
+
+    left_positions, right_positions = index.join_positions(left[left_on], how)
+    # Like merge, a key column shared by name appears once
+    right_columns = [column for column in right.columns if not (column == right_on == left_on)]
+    overlap = set(left.columns) & set(right_columns)
+    left_part = left.take(left_positions).reset_index(drop=True)
+    right_part = right[right_columns].reset_index(drop=True)
+    if (right_positions < 0).any():
+        # Unmatched rows of a left join become nulls, upcasting the way merge does
+        right_part = right_part.reindex(right_positions).reset_index(drop=True)
+    else:
+        right_part = right_part.take(right_positions).reset_index(drop=True)
+    left_part.columns = [f"{column}_x" if column in overlap else column for column in left_part.columns]
+    right_part.columns = [f"{column}_y" if column in overlap else column for column in right_part.columns]
+    return pd.concat([left_part, right_part], axis=1)
+
+
+def filter_range_on_index(frame: pd.DataFrame, column: str, low: Any = None, high: Any = None, index: KeyIndex = None) -> pd.DataFrame:
+    """
+    Rows of frame with low <= frame[column] <= high, in row order; None leaves a side open.
+    Bisects index when it applies, otherwise compares the column.
+    """
+    if index is not None and index.is_sorted and index.has_keys(frame[column]):
+        return frame.take(index.range_positions(low, high))
+    with _lock:
+        _stats["fallbacks"] += 1
+    mask = frame[column].notna()
+    if low is not None:
+        mask &= frame[column] >= low
+    if high is not None:
+        mask &= frame[column] <= high
+    return frame[mask]
+
+
+def invalidate_key_indexes(blob_path: str) -> None:
+    """Drop every index of a blob, e.g. after it was replaced"""
+    global _total_bytes
+    with _lock:
+        for key in [key for key in _entries if key[0] == blob_path]:
+            _total_bytes -= _entries.pop(key).index.nbytes
+
+
+def get_indexed_columns(data_sources: list[DataSource], relationships: list[Relationship]) -> dict[str, list[str]]:
+    """
+    Columns worth indexing per data source id: relationship keys, which nearly every join uses,
+    and date columns, which range filters use.
+    """
+    indexed = {}
+    for data_source in data_sources:
+        names = (str(data_source.id), data_source.filename)
+        known = [col.name for col in data_source.columnMetadata]
+        columns = [col.name for col in data_source.columnMetadata if col.type.startswith("datetime")]
+        for relationship in relationships or []:
+            for table, key in ((relationship.tableA, relationship.keyA), (relationship.tableB, relationship.keyB)):
+                if table in names and key in known and key not in columns:
+                    columns.append(key)
+        if columns:
+            indexed[str(data_source.id)] = columns
+    return indexed
+
+
+def get_key_index_stats() -> dict:
+    """Get hit/miss counters and current usage of the key index cache"""
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "maxBytes": settings.KEY_INDEX_CACHE_MAX_BYTES,
+        }
@@ -0,0 +1,196 @@
+import logging
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+import pandas as pd
+from app.utils.dataframe_cache import is_copy_on_write
+from app.utils.derived_columns import get_derived_column
+from app.utils.key_index import KeyIndex, get_key_index, index_pays_off, merge_on_index, filter_range_on_index
+from app.utils.shared_frames import SharedFrameHandle, open_shared_frame
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class DeferredFrame(NamedTuple):
+    """
+    Placeholder for a data source that is only loaded when generated code first reads it.
+    The sandbox worker asks the API process for it (see run_generated_code's load_frame).
+    """
+    data_source_id: str
+    # Columns loaded on first read; None loads every column
+    columns: Optional[tuple]
+    # Identify the loaded content, so key indexes can be cached across jobs
+    blob_path: Optional[str] = None
+    version: Optional[str] = None
+
+
+class LazyDatasets(Mapping):
+    """
+    The datasets mapping generated code receives in the sandbox worker.
+
+    Entries are materialised on first subscript: shared frames are mapped, deferred
+    frames are fetched from the API process first. Iterating the keys is free;
+    items() and values() read every dataset, as they would on a dict.
+
+    indexed_merge and indexed_range join and filter datasets through cached key indexes;
+    derived returns transformations of their columns, from the API process's cache through fetch_derived.
+    """
+
+    def __init__(self, frames: dict[str, Any], fetch: Callable[[str, bool], Any] = None, sample_rows: int = None, fetch_derived: Callable[[str, str, str], Any] = None):
+        self._frames = frames
+        self._fetch = fetch
+        self._fetch_derived = fetch_derived
+        self._sample_rows = sample_rows
+        self._materialised: dict[str, pd.DataFrame] = {}
+        # Frames as loaded, before the code could modify them; key indexes are built from these
+        self._sources: dict[str, pd.DataFrame] = {}
+        self._private_copies = False
+        # Deferred datasets read with only some of their columns
+        self._projected: set[str] = set()
+
+    def _open(self, key: str, frame: Any) -> pd.DataFrame:
+        is_shared = isinstance(frame, SharedFrameHandle)
+        if is_shared:
+            frame = open_shared_frame(frame)
+        if self._sample_rows:
+            frame = frame.head(self._sample_rows)
+        self._sources[key] = frame
+        # Under copy-on-write, assigning into a shallow view copies the written column
+        # instead of failing on the read-only shared one
+        if is_copy_on_write() and not self._private_copies:
+            return frame.copy(deep=False)
+        # Otherwise writes to shared frames fail and the job reruns on private copies,
+        # while writable frames are copied so the source keeps describing the loaded rows
+        if self._private_copies or not is_shared:
+            return frame.copy()
+        return frame
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        if key not in self._materialised:
+            frame = self._frames[key]
+            if isinstance(frame, DeferredFrame):
+                if frame.columns is not None:
+                    self._projected.add(key)
+                frame = self._fetch(key, False)
+            self._materialised[key] = self._open(key, frame)
+        return self._materialised[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._frames)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._frames
+
+    @property
+    def has_shared_frames(self) -> bool:
+        """Whether any materialised frame maps shared memory read-only"""
+        return not self._private_copies and any(
+            isinstance(frame, (SharedFrameHandle, DeferredFrame)) for frame in self._frames.values()
+        )
+
+    def use_private_copies(self) -> None:
+        """Give the code writable copies of the frames, for code that modifies them in place"""
+        self._private_copies = True
+        self._materialised = {key: frame.copy() for key, frame in self._materialised.items()}
+
+    def load_all_columns(self) -> bool:
+        """
+        Refetch the projected datasets the code read with every column.
+        Returns False when there was nothing to refetch.
+        """
+        if not self._projected:
+            return False
+        for key in self._projected:
+            self._materialised[key] = self._open(key, self._fetch(key, True))
+        self._projected.clear()
+        return True
+
+    def _key_index(self, key: str, column: str) -> Optional[KeyIndex]:
+        frame = self._frames[key]
+        source = self._sources.get(key)
+        # Sampled frames are not the rows the cached index describes
+        if not isinstance(frame, DeferredFrame) or frame.blob_path is None or self._sample_rows:
+            return None
+        if source is None or column not in source.columns:
+            return None
+        return get_key_index(source, column, frame.blob_path, frame.version)
+
+    def indexed_merge(self, left: pd.DataFrame, key: str, left_on: str, right_on: str, how: str = "inner") -> pd.DataFrame:
+        """left.merge(self[key], left_on=left_on, right_on=right_on, how=how) through the key index of right_on"""
+        right = self[key]
+        if not index_pays_off(len(left), len(right)):
+            return left.merge(right, left_on=left_on, right_on=right_on, how=how)
+        return merge_on_index(left, right, left_on, right_on, how, self._key_index(key, right_on))
+
+    def indexed_range(self, key: str, column: str, low: Any = None, high: Any = None) -> pd.DataFrame:
+        """Rows of self[key] with low <= column <= high through the column's key index; None leaves a side open"""
+        frame = self[key]
+        return filter_range_on_index(frame, column, low, high, self._key_index(key, column))
+
+    def derived(self, key: str, column: str, transformation: str) -> pd.Series:
+        """
+        A transformation of a column of self[key] (see DERIVATIONS), computed from the column as
+        loaded. Indexed like the dataset, so it can be assigned to filtered frames.
+        Columns of deferred datasets come from the API process's cache, shared by every worker and job;
+        others are computed here.
+        """
+        self[key]  # Materialise the dataset
+        source = self._sources[key]
+        if not isinstance(self._frames[key], DeferredFrame) or self._sample_rows or self._fetch_derived is None:
+            return get_derived_column(source, column, transformation)
+        if column not in source.columns:
+            # Raise what reading the column would, so a projected dataset is refetched in full
+            source[column]
+        derived = self._fetch_derived(key, column, transformation)
+        series = open_shared_frame(derived)[column] if isinstance(derived, SharedFrameHandle) else derived
+        # Shared frames come back with a fresh RangeIndex
+        series = series.set_axis(source.index)
+        if is_copy_on_write() and not self._private_copies:
+            return series
+        # Mapped columns are read-only and by-value ones may be the sender's
+        return series.copy()
+
+
+# Data source id -> how often generated code was handed it, read it, and which columns were loaded
+_access_stats: dict[str, dict] = {}
+_access_lock = threading.Lock()
+
+
+def record_dataset_access(requested_ids: list[str], read: dict[str, Optional[list[str]]]) -> None:
+    """
+    Record which of the datasets handed to generated code it actually read.
+
+    Args:
+        requested_ids: Data sources the code was given
+        read: Data sources the code read -> columns loaded for it, None for every column
+    """
+    with _access_lock:
+        for data_source_id in requested_ids:
+            stats = _access_stats.setdefault(
+                data_source_id, {"requested": 0, "read": 0, "fullReads": 0, "columns": Counter()})
+            stats["requested"] += 1
+            if data_source_id not in read:
+                continue
+            stats["read"] += 1
+            if read[data_source_id] is None:
+                stats["fullReads"] += 1
+            else:
+                stats["columns"].update(read[data_source_id])
+    logger.info(f"Generated code read {len(read)} of {len(requested_ids)} datasets: {read}")
+
+
+def get_dataset_access_stats() -> dict:
+    """
+    Get per data source counts of how often generated code was handed it and actually read it,
+    with the columns loaded for it.
+    """
+    with _access_lock:
+        return {
+            data_source_id: {**stats, "columns": dict(stats["columns"])}
+            for data_source_id, stats in _access_stats.items()
+        }
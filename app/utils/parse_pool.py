@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+from app.config import get_settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Global parse pool, shared by uploads and dataframe loaders
+parse_executor: Executor = None
+parse_slots: asyncio.Semaphore = None
+# Jobs whose caller timed out but whose worker is still running, with their description and start time.
+# Neither threads nor running pool processes can be cancelled, so these keep their worker and slot until they end.
+orphaned_jobs: dict[asyncio.Future, tuple[str, float]] = {}
+_stats = {"completed": 0, "timedOut": 0, "rejected": 0}
+
+
+def start_parse_pool():
+    """Create the worker pool used for CSV parsing and other CPU-heavy dataframe work"""
+    global parse_executor, parse_slots
+
+    orphaned_jobs.clear()
+    if settings.PARSE_POOL_KIND == "process":
+        parse_executor = ProcessPoolExecutor(max_workers=settings.PARSE_POOL_WORKERS)
+    elif settings.PARSE_POOL_KIND == "thread":
+        parse_executor = ThreadPoolExecutor(max_workers=settings.PARSE_POOL_WORKERS, thread_name_prefix="parse")
+    else:
+        raise ValueError(f"Unknown parse pool kind: {settings.PARSE_POOL_KIND}")
+
+    # Running jobs plus the jobs allowed to queue behind them
+    parse_slots = asyncio.Semaphore(settings.PARSE_POOL_WORKERS + settings.PARSE_POOL_MAX_QUEUE)
+    logger.info(f"Started {settings.PARSE_POOL_KIND} parse pool with {settings.PARSE_POOL_WORKERS} workers")
+
+
+def shutdown_parse_pool():
+    """Shut down the parse pool, cancelling queued jobs"""
+    global parse_executor, parse_slots
+
+    if parse_executor:
+        parse_executor.shutdown(wait=False, cancel_futures=True)
+        parse_executor = None
+        parse_slots = None
+        orphaned_jobs.clear()
+        logger.info("Parse pool shut down")
+
+
+async def run_parse_job(fn: Callable, *args: Any, description: str, timeout: float = None) -> Any:
+    """
+    Run a CPU-heavy function in the parse pool without blocking the event loop.
+
+    Args:
+        fn: Module-level function to run (must be picklable for the process pool)
+        *args: Arguments for the function
+        description: Short description of the job for logging
+        timeout: Seconds to wait for the result, defaults to PARSE_JOB_TIMEOUT_SECONDS
+
+    Returns:
+        The function's return value
+
+    Raises:
+        TimeoutError: If every worker is held by an orphaned job, no slot frees up in time,
+            or the job runs past its timeout (the job keeps its worker and slot until it ends)
+    """
+    if not parse_executor:
+        start_parse_pool()
+    timeout = timeout or settings.PARSE_JOB_TIMEOUT_SECONDS
+
+    # Queued jobs would only wait out their own timeout behind jobs nobody is waiting for
+    if len(orphaned_jobs) >= settings.PARSE_POOL_WORKERS:
+        _stats["rejected"] += 1
+        raise TimeoutError(f"All parse workers are busy with {len(orphaned_jobs)} timed out jobs, cannot run {description}")
+
+    if parse_slots.locked():
+        logger.warning(f"Parse pool is full, {description} is waiting for a slot")
+    wait_started_at = time.perf_counter()
+    try:
+        await asyncio.wait_for(parse_slots.acquire(), settings.PARSE_SLOT_WAIT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _stats["rejected"] += 1
+        raise TimeoutError(f"Timed out after {settings.PARSE_SLOT_WAIT_TIMEOUT_SECONDS}s waiting for a parse slot for {description}")
+    waited = time.perf_counter() - wait_started_at
+    if waited > 1:
+        logger.warning(f"{description} waited {waited:.1f}s for a parse slot")
+
+    # The slot is held until the worker actually finishes, even if the caller stops waiting
+    slots = parse_slots
+    started_at = time.perf_counter()
+
+    def finish(future: asyncio.Future):
+        slots.release()
+        _stats["completed"] += 1
+        if orphaned_jobs.pop(future, None):
+            logger.warning(f"Timed out job {description} finished after {time.perf_counter() - started_at:.1f}s, its parse slot is free again")
+
+    future = asyncio.get_running_loop().run_in_executor(parse_executor, functools.partial(fn, *args))
+    future.add_done_callback(finish)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        _stats["timedOut"] += 1
+        orphaned_jobs[future] = (description, started_at)
+        logger.error(f"{description} did not finish within {timeout}s, {len(orphaned_jobs)} timed out jobs still hold parse workers")
+        raise TimeoutError(f"{description} did not finish within {timeout}s")
+
+
+def get_parse_pool_stats() -> dict:
+    """Job counts, and the timed out jobs still holding a worker"""
+    now = time.perf_counter()
+    return {
+        **_stats,
+        "orphaned": [
+            {"description": description, "runningSeconds": round(now - started_at, 1)}
+            for description, started_at in orphaned_jobs.values()
+        ],
+    }
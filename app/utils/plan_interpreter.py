@@ -0,0 +1,278 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+import pandas as pd
+from app.config import get_settings
+from app.models.data_sources import DataSource
+from app.models.operation_plan import ColumnRef, FilterOperator, JoinHow, OperationPlan, PlanFilter
+from app.utils.dataframe_cache import get_content_version
+from app.utils.key_index import get_key_index, index_pays_off, merge_on_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Filtered and joined frames, keyed by the plan steps that produced them, least recently used first
+_intermediates: "OrderedDict[str, tuple[pd.DataFrame, int]]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0}
+
+
+class PlanError(ValueError):
+    """Raised when a plan cannot be run against the datasets; callers fall back to generated code"""
+
+
+def _qualified(ref: ColumnRef) -> str:
+    return f"{ref.dataset_id}.{ref.column}"
+
+
+def get_plan_columns(plan: OperationPlan) -> dict[str, list[str]]:
+    """Columns each dataset must load for the plan; everything else is pruned"""
+    refs = [f.column for f in plan.filters] + plan.group_by + plan.select
+    refs += [agg.column for agg in plan.aggregations if agg.column is not None]
+    for join in plan.joins:
+        refs += join.left_on
+        refs += [ColumnRef(dataset_id=join.dataset_id, column=column) for column in join.right_on]
+    columns: dict[str, list[str]] = {plan.base_dataset_id: []}
+    for ref in refs:
+        dataset_columns = columns.setdefault(ref.dataset_id, [])
+        if ref.column not in dataset_columns:
+            dataset_columns.append(ref.column)
+    return columns
+
+
+def validate_plan(plan: OperationPlan, data_sources: list[DataSource]) -> None:
+    """
+    Check that a plan only uses known datasets and columns.
+
+    Raises:
+        PlanError: Describing the first problem found
+    """
+    known_columns = {str(ds.id): {col.name for col in ds.columnMetadata} for ds in data_sources}
+    plan_datasets = [plan.base_dataset_id] + [join.dataset_id for join in plan.joins]
+    if len(set(plan_datasets)) != len(plan_datasets):
+        raise PlanError("A dataset is joined more than once")
+    for dataset_id, columns in get_plan_columns(plan).items():
+        if dataset_id not in known_columns:
+            raise PlanError(f"Unknown dataset {dataset_id}")
+        if dataset_id not in plan_datasets:
+            raise PlanError(f"Dataset {dataset_id} is used but never joined")
+        unknown = set(columns) - known_columns[dataset_id]
+        if unknown:
+            raise PlanError(f"Unknown columns {sorted(unknown)} in dataset {dataset_id}")
+    for join in plan.joins:
+        if len(join.left_on) != len(join.right_on) or not join.left_on:
+            raise PlanError(f"Join of {join.dataset_id} needs matching left_on and right_on keys")
+    if plan.select and (plan.group_by or plan.aggregations):
+        raise PlanError("select cannot be combined with group_by or aggregations")
+
+
+def _filter_mask(series: pd.Series, plan_filter: PlanFilter) -> pd.Series:
+    operator, value = plan_filter.operator, plan_filter.value
+    if operator == FilterOperator.EQ:
+        return series == value
+    if operator == FilterOperator.NE:
+        return series != value
+    if operator == FilterOperator.GT:
+        return series > value
+    if operator == FilterOperator.GTE:
+        return series >= value
+    if operator == FilterOperator.LT:
+        return series < value
+    if operator == FilterOperator.LTE:
+        return series <= value
+    if operator == FilterOperator.IN:
+        return series.isin(value if isinstance(value, list) else [value])
+    if operator == FilterOperator.NOT_IN:
+        return ~series.isin(value if isinstance(value, list) else [value])
+    if operator == FilterOperator.BETWEEN:
+        if not isinstance(value, list) or len(value) != 2:
+            raise PlanError(f"between on {plan_filter.column.column} needs [low, high]")
+        return series.between(value[0], value[1])
+    if operator == FilterOperator.CONTAINS:
+        return series.astype("string").str.contains(str(value), case=False, regex=False).fillna(False).astype(bool)
+    if operator == FilterOperator.IS_NULL:
+        return series.isna()
+    return series.notna()
+
+
+def _apply_filters(df: pd.DataFrame, filters: list[PlanFilter]) -> pd.DataFrame:
+    """Apply filters to a frame with qualified column names"""
+    if not filters:
+        return df
+    mask = None
+    for plan_filter in filters:
+        condition = _filter_mask(df[_qualified(plan_filter.column)], plan_filter)
+        mask = condition if mask is None else mask & condition
+    return df[mask]
+
+
+def _load_dataset(df: pd.DataFrame, dataset_id: str, columns: list[str], filters: list[PlanFilter]) -> pd.DataFrame:
+    """
+    Project a dataset to the plan's columns under qualified names, applying its pushed-down
+    filters first so only matching rows are copied.
+    """
+    mask = None
+    for plan_filter in filters:
+        condition = _filter_mask(df[plan_filter.column.column], plan_filter)
+        mask = condition if mask is None else mask & condition
+    frame = df.loc[mask, columns] if mask is not None else df[columns]
+    frame.columns = [f"{dataset_id}.{column}" for column in columns]
+    return frame
+
+
+def _get_intermediate_key(plan: OperationPlan, columns: dict[str, list[str]], data_sources: dict[str, DataSource]) -> str:
+    payload = json.dumps([
+        plan.base_dataset_id,
+        [join.model_dump(mode="json") for join in plan.joins],
+        [plan_filter.model_dump(mode="json") for plan_filter in plan.filters],
+        columns,
+        {dataset_id: get_content_version(data_sources[dataset_id]) for dataset_id in columns},
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_intermediate(key: str, frame: pd.DataFrame) -> None:
+    global _total_bytes
+    size = int(frame.memory_usage(deep=True).sum())
+    if size > settings.PLAN_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if key in _intermediates:
+            return
+        _intermediates[key] = (frame, size)
+        _total_bytes += size
+        while _total_bytes > settings.PLAN_CACHE_MAX_BYTES:
+            _, (_, evicted_size) = _intermediates.popitem(last=False)
+            _total_bytes -= evicted_size
+
+
+def _filter_and_join(plan: OperationPlan, data_sources: dict[str, DataSource], dataframes: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Build the filtered and joined frame of a plan, reusing a cached one when an earlier
+    plan had the same datasets, joins and filters.
+
+    Filters on the base dataset and on inner-joined datasets are pushed below the joins;
+    filters on left-joined datasets run after the join so unmatched rows are kept correctly.
+    """
+    columns = get_plan_columns(plan)
+    key = _get_intermediate_key(plan, columns, data_sources)
+    with _lock:
+        cached = _intermediates.get(key)
+        if cached is not None:
+            _intermediates.move_to_end(key)
+            _stats["hits"] += 1
+            return cached[0]
+        _stats["misses"] += 1
+
+    pushable = {plan.base_dataset_id} | {join.dataset_id for join in plan.joins if join.how == JoinHow.INNER}
+    pushed = {dataset_id: [f for f in plan.filters if f.column.dataset_id == dataset_id] for dataset_id in pushable}
+    remaining = [f for f in plan.filters if f.column.dataset_id not in pushable]
+
+    frame = _load_dataset(
+        dataframes[plan.base_dataset_id], plan.base_dataset_id, columns[plan.base_dataset_id], pushed[plan.base_dataset_id])
+    for join in plan.joins:
+        right = _load_dataset(
+            dataframes[join.dataset_id], join.dataset_id, columns[join.dataset_id], pushed.get(join.dataset_id, []))
+        if len(join.right_on) == 1 and not pushed.get(join.dataset_id) and index_pays_off(len(frame), len(right)):
+            # Large unfiltered right side: probe the cached index of its key instead of hashing it per plan
+            data_source = data_sources[join.dataset_id]
+            index = get_key_index(
+                dataframes[join.dataset_id], join.right_on[0], data_source.blobPath, get_content_version(data_source))
+            frame = merge_on_index(
+                frame, right, _qualified(join.left_on[0]), f"{join.dataset_id}.{join.right_on[0]}", join.how.value, index)
+            continue
+        frame = frame.merge(
+            right,
+            left_on=[_qualified(ref) for ref in join.left_on],
+            right_on=[f"{join.dataset_id}.{column}" for column in join.right_on],
+            how=join.how.value,
+        )
+    frame = _apply_filters(frame, remaining)
+    _cache_intermediate(key, frame)
+    return frame
+
+
+def _output_names(refs: list[ColumnRef], data_sources: dict[str, DataSource]) -> dict[str, str]:
+    """Bare column names for the output, prefixed with the file name where two datasets share one"""
+    counts: dict[str, int] = {}
+    for ref in refs:
+        counts[ref.column] = counts.get(ref.column, 0) + 1
+    return {
+        _qualified(ref): ref.column if counts[ref.column] == 1
+        else f"{os.path.splitext(data_sources[ref.dataset_id].filename)[0]}.{ref.column}"
+        for ref in refs
+    }
+
+
+def execute_plan(plan: OperationPlan, data_sources: list[DataSource], dataframes: dict[str, pd.DataFrame]) -> list[dict]:
+    """
+    Run an operation plan with vectorised pandas operations.
+
+    Args:
+        plan: A plan that passed validate_plan
+        data_sources: Data sources the plan reads
+        dataframes: Frames of those data sources, with at least the columns of get_plan_columns;
+            they are never modified
+
+    Returns:
+        The result rows as records, at most PLAN_MAX_RESULT_ROWS of them
+
+    Raises:
+        PlanError: If the plan cannot be run, e.g. it sorts by a column it does not return
+    """
+    data_sources_by_id = {str(ds.id): ds for ds in data_sources}
+    frame = _filter_and_join(plan, data_sources_by_id, dataframes)
+
+    if plan.aggregations:
+        keys = [_qualified(ref) for ref in plan.group_by]
+        # Row counts only need a column to group; without keys the frame may have none
+        named = {
+            agg.alias: (
+                _qualified(agg.column) if agg.column is not None else (keys[0] if keys else None),
+                "size" if agg.column is None else agg.function.value
+            )
+            for agg in plan.aggregations
+        }
+        if keys:
+            result = frame.groupby(keys, sort=False, dropna=False, observed=True).agg(**named).reset_index()
+        else:
+            result = pd.DataFrame([{
+                alias: len(frame) if function == "size" else getattr(frame[column], function)()
+                for alias, (column, function) in named.items()
+            }])
+        result = result.rename(columns=_output_names(plan.group_by, data_sources_by_id))
+    elif plan.group_by:
+        # Distinct combinations of the grouped columns
+        result = frame[[_qualified(ref) for ref in plan.group_by]].drop_duplicates()
+        result = result.rename(columns=_output_names(plan.group_by, data_sources_by_id))
+    else:
+        refs = plan.select or [
+            ColumnRef(dataset_id=name.split(".", 1)[0], column=name.split(".", 1)[1]) for name in frame.columns
+        ]
+        result = frame[[_qualified(ref) for ref in refs]].rename(columns=_output_names(refs, data_sources_by_id))
+
+    if plan.sort:
+        missing = [sort.column for sort in plan.sort if sort.column not in result.columns]
+        if missing:
+            raise PlanError(f"Cannot sort by {missing}, the result only has {list(result.columns)}")
+        result = result.sort_values([sort.column for sort in plan.sort], ascending=[sort.ascending for sort in plan.sort])
+
+    limit = min(plan.limit or settings.PLAN_MAX_RESULT_ROWS, settings.PLAN_MAX_RESULT_ROWS)
+    return result.head(limit).to_dict(orient="records")
+
+
+def get_plan_cache_stats() -> dict:
+    """Get hit/miss counters and current usage of the intermediate frame cache"""
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_intermediates),
+            "bytes": _total_bytes,
+            "maxBytes": settings.PLAN_CACHE_MAX_BYTES,
+        }
@@ -0,0 +1,121 @@
+import ast
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any
+from app.config import get_settings
+from app.models.data_sources import DataSource
+from app.services.mongodb import get_collection
+from app.utils.dataframe_cache import get_content_version
+from app.utils.json_encoders import ensure_json_serializable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RESULT_CACHE_COLLECTION = "codeResults"
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0}
+
+
+def normalise_code(code: str) -> str:
+    """
+    Normalise code so formatting and comments do not change its cache key.
+    Code that does not parse is used as is; it will fail to run anyway.
+    """
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return code.strip()
+
+
+def get_result_key(code: str, data_sources: list[DataSource], engine: str = "pandas", entry_point: str = "main") -> str:
+    """
+    Get the cache key of running code against data sources.
+
+    The key covers the normalised code, the engine and entry point, and the content
+    version of every data source handed to the code, so a new upload changes it.
+    """
+    versions = sorted((str(ds.id), get_content_version(ds)) for ds in data_sources)
+    payload = json.dumps([normalise_code(code), engine, entry_point, versions])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def ensure_result_cache_indexes():
+    """Create the lookup and TTL indexes of the result cache"""
+    collection = get_collection(RESULT_CACHE_COLLECTION)
+    await collection.create_index("key", unique=True)
+    # Entries nobody has read for RESULT_CACHE_TTL_SECONDS are removed by Mongo
+    await collection.create_index("lastUsedAt", expireAfterSeconds=settings.RESULT_CACHE_TTL_SECONDS)
+
+
+async def get_cached_result(key: str) -> tuple[bool, Any]:
+    """
+    Look up a cached result, marking it as recently used.
+
+    Returns:
+        (True, result) on a hit, (False, None) on a miss or when the cache is unavailable
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return False, None
+    try:
+        entry = await get_collection(RESULT_CACHE_COLLECTION).find_one_and_update(
+            {"key": key},
+            {"$set": {"lastUsedAt": datetime.now()}, "$inc": {"hits": 1}},
+            projection={"result": 1}
+        )
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {str(e)}")
+        return False, None
+    if entry is None:
+        _stats["misses"] += 1
+        return False, None
+    _stats["hits"] += 1
+    return True, entry["result"]
+
+
+async def cache_result(key: str, result: Any, data_sources: list[DataSource]) -> None:
+    """
+    Store the result of running code, then trim the cache to RESULT_CACHE_MAX_ENTRIES.
+    Results larger than RESULT_CACHE_MAX_RESULT_BYTES are not cached.
+    A failure to store is logged and otherwise ignored.
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return
+    result = ensure_json_serializable(result)
+    size = len(json.dumps(result))
+    if size > settings.RESULT_CACHE_MAX_RESULT_BYTES:
+        _stats["skipped"] += 1
+        logger.info(f"Not caching result {key[:12]}: {size} bytes exceeds RESULT_CACHE_MAX_RESULT_BYTES")
+        return
+
+    now = datetime.now()
+    collection = get_collection(RESULT_CACHE_COLLECTION)
+    try:
+        await collection.update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "result": result,
+                    "size": size,
+                    "dataSources": [{"id": str(ds.id), "version": get_content_version(ds)} for ds in data_sources],
+                    "lastUsedAt": now
+                },
+                "$setOnInsert": {"createdAt": now, "hits": 0}
+            },
+            upsert=True
+        )
+        _stats["stores"] += 1
+
+        overflow = await collection.estimated_document_count() - settings.RESULT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale_ids = [entry["_id"] async for entry in collection.find({}, {"_id": 1}).sort("lastUsedAt", 1).limit(overflow)]
+            await collection.delete_many({"_id": {"$in": stale_ids}})
+    except Exception as e:
+        logger.warning(f"Could not cache result {key[:12]}: {str(e)}")
+
+
+def get_result_cache_stats() -> dict:
+    """Get the result cache hit and store counters of this process"""
+    return dict(_stats)
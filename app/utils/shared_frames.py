@@ -0,0 +1,219 @@
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+import pandas as pd
+import pyarrow as pa
+from app.config import get_settings
+from app.utils.dtypes import COMPACT_STRING_DTYPE
+
+# Set up logging
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class SharedFrameHandle(NamedTuple):
+    """
+    Reference to a dataframe stored as an Arrow IPC file in shared memory.
+    Cheap to pickle, so it is what crosses the pipe to sandbox workers instead of the frame.
+    """
+    path: str
+    # Map Arrow strings back to compact string columns rather than objects
+    strings_as_arrow: bool
+    # The frame was Arrow-backed (CSV_ARROW_DTYPES)
+    arrow_backed: bool
+
+
+class _SharedFrame:
+    def __init__(self, handle: SharedFrameHandle, size: int):
+        self.handle = handle
+        self.size = size
+        self.refs = 0
+        self.retired = False
+
+
+# (blobPath, version, columns, derivation) -> shared frame, least recently used first
+_frames: "OrderedDict[tuple, _SharedFrame]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+
+
+def get_shared_frames_dir() -> str:
+    """
+    Directory of this process's shared frames. Each API process has its own,
+    so one process never deletes another's files.
+    """
+    return os.path.join(settings.SHARED_FRAMES_DIR, str(os.getpid()))
+
+
+@lru_cache()
+def get_shared_frames_budget() -> int:
+    """
+    Bytes this process may keep in shared frames: SHARED_FRAMES_MAX_BYTES, capped at
+    SHARED_FRAMES_MAX_FILESYSTEM_FRACTION of the filesystem holding SHARED_FRAMES_DIR.
+    """
+    path = settings.SHARED_FRAMES_DIR
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    try:
+        stats = os.statvfs(path)
+    except OSError as e:
+        logger.warning(f"Could not size {settings.SHARED_FRAMES_DIR}, using SHARED_FRAMES_MAX_BYTES: {str(e)}")
+        return settings.SHARED_FRAMES_MAX_BYTES
+    filesystem_bytes = stats.f_blocks * stats.f_frsize
+    budget = min(settings.SHARED_FRAMES_MAX_BYTES, int(filesystem_bytes * settings.SHARED_FRAMES_MAX_FILESYSTEM_FRACTION))
+    if budget < settings.SHARED_FRAMES_MAX_BYTES:
+        logger.info(f"Shared frames limited to {budget} bytes by the {filesystem_bytes} byte filesystem at {path}")
+    return budget
+
+
+def _get_key(blob_path: str, version: str, columns: Optional[list[str]], derivation: Optional[str] = None) -> tuple:
+    return (blob_path, version, tuple(columns) if columns else None, derivation)
+
+
+def _remove_frame(key: tuple) -> None:
+    """Forget a shared frame and delete its file. Caller must hold the lock."""
+    global _total_bytes
+    frame = _frames.pop(key)
+    _total_bytes -= frame.size
+    try:
+        # Workers that still map the file keep their pages until they are done
+        os.remove(frame.handle.path)
+    except OSError as e:
+        logger.warning(f"Could not remove shared frame {frame.handle.path}: {str(e)}")
+
+
+def write_shared_frame(df: pd.DataFrame, path: str) -> int:
+    """
+    Write a dataframe to an Arrow IPC file, returning its size in bytes.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        with pa.OSFile(temp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, path)
+    finally:
+        # Left behind only when the write or rename failed, e.g. on a full /dev/shm
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return os.path.getsize(path)
+
+
+def acquire_shared_frame(blob_path: str, version: str, columns: list[str] = None, derivation: str = None) -> Optional[SharedFrameHandle]:
+    """
+    Get a handle to an already shared frame, taking a reference that must be released.
+    """
+    key = _get_key(blob_path, version, columns, derivation)
+    with _lock:
+        frame = _frames.get(key)
+        if frame is None or frame.retired:
+            return None
+        frame.refs += 1
+        _frames.move_to_end(key)
+        return frame.handle
+
+
+def share_dataframe(blob_path: str, version: str, columns: list[str], df: pd.DataFrame, derivation: str = None) -> Optional[SharedFrameHandle]:
+    """
+    Store a dataframe in shared memory once and take a reference to it.
+    Frames computed from the blob's columns rather than loaded from it name their derivation,
+    e.g. a derived column's transformation; they are retired with the blob's frames.
+
+    Returns None when the frame is over the budget (see get_shared_frames_budget) or cannot be
+    represented in Arrow (e.g. object columns mixing numbers and strings); callers then
+    hand the frame over by value.
+    """
+    global _total_bytes
+    os.makedirs(get_shared_frames_dir(), exist_ok=True)
+    path = os.path.join(get_shared_frames_dir(), f"{uuid.uuid4().hex}.arrow")
+    try:
+        size = write_shared_frame(df, path)
+    except Exception as e:
+        logger.warning(f"Could not share {blob_path}, passing it by value: {str(e)}")
+        return None
+    if size > get_shared_frames_budget():
+        os.remove(path)
+        logger.info(f"Not sharing {blob_path}: {size} bytes exceeds shared frame budget")
+        return None
+
+    handle = SharedFrameHandle(
+        path=path,
+        strings_as_arrow=any(isinstance(dtype, pd.StringDtype) for dtype in df.dtypes),
+        arrow_backed=any(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes),
+    )
+    key = _get_key(blob_path, version, columns, derivation)
+    with _lock:
+        existing = _frames.get(key)
+        if existing is not None and not existing.retired:
+            # Another request shared the same frame meanwhile
+            os.remove(path)
+            existing.refs += 1
+            return existing.handle
+        if existing is not None:
+            _remove_frame(key)
+        frame = _SharedFrame(handle, size)
+        frame.refs = 1
+        _frames[key] = frame
+        _total_bytes += size
+        for old_key in [k for k, f in _frames.items() if f.refs == 0]:
+            if _total_bytes <= get_shared_frames_budget():
+                break
+            _remove_frame(old_key)
+    return handle
+
+
+def release_shared_frames(handles: Iterable[SharedFrameHandle]) -> None:
+    """
+    Drop references taken by acquire_shared_frame or share_dataframe.
+    Retired frames are deleted once nothing references them.
+    """
+    paths = {handle.path for handle in handles}
+    with _lock:
+        for key, frame in list(_frames.items()):
+            if frame.handle.path in paths:
+                frame.refs -= 1
+                if frame.retired and frame.refs <= 0:
+                    _remove_frame(key)
+
+
+def retire_shared_frames(blob_path: str) -> None:
+    """
+    Stop handing out the shared frames of a blob, e.g. when its version is evicted or deleted.
+    Frames still in use are deleted when their last reference is released.
+    """
+    with _lock:
+        for key, frame in list(_frames.items()):
+            if key[0] != blob_path:
+                continue
+            frame.retired = True
+            if frame.refs <= 0:
+                _remove_frame(key)
+
+
+def clear_shared_frames() -> None:
+    """Delete every shared frame of this process"""
+    global _total_bytes
+    with _lock:
+        _frames.clear()
+        _total_bytes = 0
+    shutil.rmtree(get_shared_frames_dir(), ignore_errors=True)
+
+
+def open_shared_frame(handle: SharedFrameHandle) -> pd.DataFrame:
+    """
+    Map a shared frame read-only. Fixed-width columns point straight into shared memory;
+    writing to them in place raises "assignment destination is read-only".
+    """
+    table = pa.ipc.open_file(pa.memory_map(handle.path, "r")).read_all()
+    if handle.arrow_backed:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    if handle.strings_as_arrow:
+        string_types = {pa.string(): COMPACT_STRING_DTYPE, pa.large_string(): COMPACT_STRING_DTYPE}
+        return table.to_pandas(split_blocks=True, types_mapper=string_types.get)
+    return table.to_pandas(split_blocks=True)
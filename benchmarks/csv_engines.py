@@ -0,0 +1,54 @@
+"""
+Compare the pandas and pyarrow CSV engines used by app.utils.csv_parser.
+
+Each data/*/sales.csv fixture is scaled up 100x by repeating its rows, then parsed
+with both engines. Run from the repository root (settings are read from .env):
+
+    python -m benchmarks.csv_engines
+"""
+import glob
+import time
+from app.utils.csv_parser import column_type_name, detect_csv_dialect, read_csv_frame
+
+SCALE_FACTOR = 100
+REPEATS = 3
+ENGINES = ["pandas", "pyarrow"]
+
+
+def scale_csv(content: bytes, factor: int) -> bytes:
+    """Repeat the data rows of a CSV file, keeping a single header"""
+    header, body = content.split(b"\n", 1)
+    if not body.endswith(b"\n"):
+        body += b"\n"
+    return header + b"\n" + body * factor
+
+
+def time_engine(content: bytes, engine: str):
+    """Parse the content REPEATS times and return the best time and the last frame"""
+    dialect = detect_csv_dialect(content)
+    best = float("inf")
+    df = None
+    for _ in range(REPEATS):
+        started_at = time.perf_counter()
+        df = read_csv_frame(content, dialect, engine)
+        best = min(best, time.perf_counter() - started_at)
+    return best, df
+
+
+def main():
+    print(f"{'fixture':<50} {'engine':<8} {'rows':>10} {'MB':>8} {'best s':>8} {'MB/s':>8} {'types match':>12}")
+    for path in sorted(glob.glob("data/*/sales.csv")):
+        content = scale_csv(open(path, "rb").read(), SCALE_FACTOR)
+        size_mb = len(content) / (1024 * 1024)
+        results = {engine: time_engine(content, engine) for engine in ENGINES}
+        baseline_types = {col: column_type_name(dtype) for col, dtype in results["pandas"][1].dtypes.items()}
+        for engine, (seconds, df) in results.items():
+            types = {col: column_type_name(dtype) for col, dtype in df.dtypes.items()}
+            print(
+                f"{path:<50} {engine:<8} {len(df):>10} {size_mb:>8.1f} {seconds:>8.3f} "
+                f"{size_mb / seconds:>8.1f} {str(types == baseline_types):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
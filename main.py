@@ -1,6 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.services.mongodb import close_mongo_connection, connect_to_mongo
+from app.utils.blob_storage import close_blob_storage_connection, connect_to_blob_storage
+from app.utils.parse_pool import get_parse_pool_stats, start_parse_pool, shutdown_parse_pool
+from app.utils.code_cache import get_code_cache_stats
+from app.utils.code_sandbox import start_code_sandbox, shutdown_code_sandbox
+from app.utils.shared_frames import clear_shared_frames
+from app.utils.dataframe_cache import configure_copy_on_write, get_dataframe_cache_stats
+from app.utils.result_cache import ensure_result_cache_indexes
 from contextlib import asynccontextmanager
 from app.api.projects import router as projects_router
 from app.middleware.mongodb_serializer import MongoDBSerializerMiddleware
@@ -9,8 +16,17 @@ from fastapi import Depends
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_copy_on_write()
     await connect_to_mongo()
+    await ensure_result_cache_indexes()
+    await connect_to_blob_storage()
+    start_parse_pool()
+    start_code_sandbox()
     yield
+    shutdown_code_sandbox()
+    clear_shared_frames()
+    shutdown_parse_pool()
+    await close_blob_storage_connection()
     await close_mongo_connection()
 
 app = FastAPI(lifespan=lifespan, redirect_slashes=False)
@@ -32,6 +48,15 @@ app.add_middleware(MongoDBSerializerMiddleware)
 @app.get("/health")
 async def health_check():
     return {"status": "Flow AI API is running"} 
+
+@app.get("/diagnostics")
+async def get_diagnostics(user: dict = Depends(verify_jwt_token)):
+    """Cache and worker pool counters of this API process, e.g. to check hit rates"""
+    return {
+        "dataframeCache": get_dataframe_cache_stats(),
+        "codeCache": get_code_cache_stats(),
+        "parsePool": get_parse_pool_stats(),
+    }
 app.include_router(projects_router, prefix="/projects", tags=["projects"])
 
 @app.get("/secure-data")
@@ -0,0 +1,27 @@
+import os
+import pytest
+import pandas as pd
+
+# Settings without defaults; no test reaches MongoDB, Azure OpenAI or Blob Storage
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_KEY", "test")
+os.environ.setdefault(
+    "AZURE_STORAGE_CONNECTION_STRING",
+    "DefaultEndpointsProtocol=https;AccountName=test;AccountKey=dGVzdA==;EndpointSuffix=core.windows.net",
+)
+
+# Imported once the settings above are in place
+from app.utils.dataframe_cache import COPY_ON_WRITE_ALWAYS
+
+
+@pytest.fixture(params=[True, False], ids=["copy_on_write", "deep_copy"])
+def copy_on_write(request):
+    """Run a test with pandas copy-on-write on and off, as COPY_ON_WRITE selects"""
+    if COPY_ON_WRITE_ALWAYS:
+        if not request.param:
+            pytest.skip("pandas >= 3 always copies on write")
+        yield True
+        return
+    with pd.option_context("mode.copy_on_write", request.param):
+        yield request.param
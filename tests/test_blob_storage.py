@@ -0,0 +1,23 @@
+import pandas as pd
+from app.utils import blob_storage
+from app.utils.blob_storage import generate_blob_df
+
+
+async def test_generate_blob_df_streams_large_blobs(monkeypatch):
+    streamed = []
+
+    async def stream_blob_df(blob_path, blob_size, *args):
+        streamed.append((blob_path, blob_size))
+        return pd.DataFrame({"a": [1]})
+
+    async def download_from_blob_storage(blob_path):
+        raise AssertionError("large blobs must not be downloaded whole")
+
+    monkeypatch.setattr(blob_storage, "stream_blob_df", stream_blob_df)
+    monkeypatch.setattr(blob_storage, "download_from_blob_storage", download_from_blob_storage)
+    blob_size = blob_storage.settings.BLOB_STREAMING_THRESHOLD_BYTES + 1
+
+    df = await generate_blob_df("project/sales.csv", None, blob_size)
+
+    assert df is not None
+    assert streamed == [("project/sales.csv", blob_size)]
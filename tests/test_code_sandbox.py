@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils import code_sandbox
+from app.utils.code_cache import get_code_cache_stats
+from app.utils.code_sandbox import CodeExecutionError, run_generated_code, shutdown_code_sandbox, start_code_sandbox
+
+POLARS_CODE = """
+def main(datasets):
+    import polars as pl
+    return (
+        datasets["sales"]
+        .group_by("region")
+        .agg(pl.col("revenue").sum())
+        .sort("region")
+        .collect()
+        .to_dicts()
+    )
+"""
+
+PANDAS_CODE = """
+def main(datasets):
+    return float(datasets["sales"]["revenue"].sum())
+"""
+
+MEMORY_HOG_CODE = """
+def main(datasets):
+    import numpy as np
+    return float(np.ones(192 * 1024 * 1024).sum())
+"""
+
+
+@pytest.fixture
+def sales() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"region": rng.choice(["north", "south"], 100_000), "revenue": rng.random(100_000)})
+
+
+@pytest.fixture
+async def sandbox(monkeypatch):
+    # A many-core host: polars reserves address space for each of its threads
+    monkeypatch.setenv("POLARS_MAX_THREADS", "32")
+    monkeypatch.setattr(code_sandbox.settings, "SANDBOX_WORKERS", 1)
+    # Below the ~1 GB of address space the preloaded libraries reserve, above what the jobs allocate
+    monkeypatch.setattr(code_sandbox.settings, "SANDBOX_MEMORY_LIMIT_BYTES", 1024 * 1024 * 1024)
+    start_code_sandbox()
+    yield
+    shutdown_code_sandbox()
+
+
+async def test_polars_job_runs_under_memory_limit(sandbox, sales):
+    result = await run_generated_code(POLARS_CODE, {"sales": sales}, engine="polars")
+
+    expected = sales.groupby("region")["revenue"].sum()
+    assert [row["region"] for row in result] == ["north", "south"]
+    assert [row["revenue"] for row in result] == pytest.approx(expected.tolist())
+
+
+async def test_memory_limit_stops_large_allocations(sandbox, sales):
+    with pytest.raises(CodeExecutionError) as error:
+        await run_generated_code(MEMORY_HOG_CODE, {"sales": sales})
+
+    assert error.value.kind == "memory"
+    # The worker that hit the limit is replaced
+    assert await run_generated_code(PANDAS_CODE, {"sales": sales}) == pytest.approx(sales["revenue"].sum())
+
+
+async def test_failed_replacement_is_retried_before_next_job(sandbox, sales, monkeypatch):
+    monkeypatch.setattr(code_sandbox.settings, "SANDBOX_MAX_JOBS_PER_WORKER", 1)
+    start_worker = code_sandbox.SandboxWorker
+    failures = iter([OSError("fork failed")])
+
+    def flaky_worker(context):
+        failure = next(failures, None)
+        if failure is not None:
+            raise failure
+        return start_worker(context)
+    monkeypatch.setattr(code_sandbox, "SandboxWorker", flaky_worker)
+
+    # The used-up worker's replacement fails to start; the job itself still succeeds
+    assert await run_generated_code(PANDAS_CODE, {"sales": sales}) == pytest.approx(sales["revenue"].sum())
+    assert code_sandbox.missing_sandbox_workers == 1
+
+    assert await run_generated_code(PANDAS_CODE, {"sales": sales}) == pytest.approx(sales["revenue"].sum())
+    assert code_sandbox.missing_sandbox_workers == 0
+
+
+async def test_no_worker_and_none_startable_raises(sandbox, sales, monkeypatch):
+    monkeypatch.setattr(code_sandbox.settings, "SANDBOX_MAX_JOBS_PER_WORKER", 1)
+
+    def broken_worker(context):
+        raise OSError("fork failed")
+    monkeypatch.setattr(code_sandbox, "SandboxWorker", broken_worker)
+
+    await run_generated_code(PANDAS_CODE, {"sales": sales})
+    with pytest.raises(CodeExecutionError) as error:
+        await run_generated_code(PANDAS_CODE, {"sales": sales})
+
+    assert error.value.kind == "worker_died"
+
+
+async def test_worker_code_cache_lookups_are_reported(sandbox, sales):
+    before = get_code_cache_stats()["sandboxWorkers"]
+
+    for _ in range(2):
+        await run_generated_code(PANDAS_CODE, {"sales": sales})
+
+    after = get_code_cache_stats()["sandboxWorkers"]
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
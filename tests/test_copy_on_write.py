@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+from app.utils.dataframe_cache import cache_dataframe, clear_dataframe_cache, get_cached_dataframe, private_view
+from app.utils.lazy_datasets import LazyDatasets
+
+BLOB_PATH = "project/20250101_000000_sales.csv"
+VERSION = "2025-01-01T00:00:00"
+
+
+def make_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "region": ["north", "south", "east", "west"],
+        "revenue": [10.0, 20.0, 30.0, 40.0],
+        "units": [1, 2, 3, 4],
+    })
+
+
+def mutate_loc(df: pd.DataFrame) -> None:
+    df.loc[0, "revenue"] = -1.0
+    df.loc[df["units"] > 2, "region"] = "changed"
+
+
+def mutate_iloc(df: pd.DataFrame) -> None:
+    df.iloc[1, 1] = -1.0
+    df.iloc[:, 2] = 0
+
+
+def mutate_inplace(df: pd.DataFrame) -> None:
+    df.drop(columns=["units"], inplace=True)
+    df.rename(columns={"region": "area"}, inplace=True)
+    df.sort_values("revenue", ascending=False, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+
+
+def mutate_values_inplace(df: pd.DataFrame) -> None:
+    df.fillna({"revenue": 0}, inplace=True)
+    df.replace({"north": "n"}, inplace=True)
+    # Writes into the existing column arrays unless the frame is a view or copy of its own
+    df.update(df["units"].clip(upper=2))
+
+
+def mutate_columns(df: pd.DataFrame) -> None:
+    df["revenue"] = df["revenue"] * 2
+    df["margin"] = 0.5
+    df["units"] += 1
+    del df["region"]
+
+
+MUTATIONS = [mutate_loc, mutate_iloc, mutate_inplace, mutate_values_inplace, mutate_columns]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_dataframe_cache()
+    yield
+    clear_dataframe_cache()
+
+
+@pytest.mark.parametrize("mutate", MUTATIONS)
+def test_cached_frame_survives_mutation(copy_on_write, mutate):
+    cache_dataframe(BLOB_PATH, VERSION, make_frame())
+
+    mutate(get_cached_dataframe(BLOB_PATH, VERSION))
+
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
+
+
+@pytest.mark.parametrize("mutate", MUTATIONS)
+def test_projected_cached_frame_survives_mutation(copy_on_write, mutate):
+    cache_dataframe(BLOB_PATH, VERSION, make_frame())
+
+    mutate(get_cached_dataframe(BLOB_PATH, VERSION, columns=["region", "revenue", "units"]))
+
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
+
+
+@pytest.mark.parametrize("mutate", MUTATIONS)
+def test_private_view_survives_mutation(copy_on_write, mutate):
+    original = make_frame()
+
+    mutate(private_view(original))
+
+    assert original.equals(make_frame())
+
+
+@pytest.mark.parametrize("mutate", MUTATIONS)
+def test_lazy_datasets_survive_mutation(copy_on_write, mutate):
+    cache_dataframe(BLOB_PATH, VERSION, make_frame())
+    cached = get_cached_dataframe(BLOB_PATH, VERSION, copy=False)
+    datasets = LazyDatasets({"sales": cached})
+
+    mutate(datasets["sales"])
+
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
+    assert datasets._sources["sales"].equals(make_frame())
+
+
+@pytest.mark.parametrize("mutate", MUTATIONS)
+def test_lazy_datasets_private_copies_survive_mutation(copy_on_write, mutate):
+    cache_dataframe(BLOB_PATH, VERSION, make_frame())
+    datasets = LazyDatasets({"sales": get_cached_dataframe(BLOB_PATH, VERSION, copy=False)})
+    datasets["sales"]
+    datasets.use_private_copies()
+
+    mutate(datasets["sales"])
+
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
+
+
+def test_mutation_is_visible_to_the_caller(copy_on_write):
+    cache_dataframe(BLOB_PATH, VERSION, make_frame())
+    df = get_cached_dataframe(BLOB_PATH, VERSION)
+
+    mutate_loc(df)
+
+    assert df.loc[0, "revenue"] == -1.0
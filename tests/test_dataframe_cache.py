@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from app.utils import dataframe_cache
+from app.utils.dataframe_cache import (
+    cache_dataframe, clear_dataframe_cache, get_cached_dataframe, get_or_load_dataframe
+)
+
+BLOB_PATH = "project/20250101_000000_sales.csv"
+VERSION = "2025-01-01T00:00:00"
+
+
+def make_frame(columns: list[str] = None) -> pd.DataFrame:
+    df = pd.DataFrame({"region": ["north", "south"], "revenue": [10.0, 20.0], "units": [1, 2]})
+    return df if columns is None else df[columns]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_dataframe_cache()
+    yield
+    clear_dataframe_cache()
+
+
+class CountingLoader:
+    """A blob load that takes a while, so concurrent requests overlap it"""
+
+    def __init__(self, columns: list[str] = None, error: Exception = None):
+        self.columns = columns
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> pd.DataFrame:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.error is not None:
+            raise self.error
+        return make_frame(self.columns)
+
+
+async def test_concurrent_misses_load_once():
+    load = CountingLoader()
+
+    frames = await asyncio.gather(*[get_or_load_dataframe(BLOB_PATH, VERSION, None, load) for _ in range(5)])
+
+    assert load.calls == 1
+    assert all(df.equals(make_frame()) for df in frames)
+    # Each request still gets a frame of its own
+    frames[0].loc[0, "revenue"] = -1.0
+    assert frames[1].equals(make_frame())
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
+
+
+async def test_projected_request_waits_for_running_full_load():
+    full_load = CountingLoader()
+    projected_load = CountingLoader(["revenue"])
+
+    full, projected = await asyncio.gather(
+        get_or_load_dataframe(BLOB_PATH, VERSION, None, full_load),
+        get_or_load_dataframe(BLOB_PATH, VERSION, ["revenue"], projected_load),
+    )
+
+    assert (full_load.calls, projected_load.calls) == (1, 0)
+    assert projected.equals(make_frame(["revenue"]))
+
+
+async def test_other_versions_load_separately():
+    old_load, new_load = CountingLoader(), CountingLoader()
+
+    await asyncio.gather(
+        get_or_load_dataframe(BLOB_PATH, VERSION, None, old_load),
+        get_or_load_dataframe(BLOB_PATH, "2025-02-01T00:00:00", None, new_load),
+    )
+
+    assert (old_load.calls, new_load.calls) == (1, 1)
+
+
+async def test_failed_load_reaches_every_waiter_and_is_retried():
+    failing = CountingLoader(error=ValueError("blob missing"))
+
+    results = await asyncio.gather(
+        *[get_or_load_dataframe(BLOB_PATH, VERSION, None, failing) for _ in range(3)], return_exceptions=True)
+
+    assert failing.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    retry = CountingLoader()
+    assert (await get_or_load_dataframe(BLOB_PATH, VERSION, None, retry)).equals(make_frame())
+    assert retry.calls == 1
+
+
+async def test_cancelled_request_does_not_cancel_shared_load():
+    load = CountingLoader()
+    cancelled = asyncio.ensure_future(get_or_load_dataframe(BLOB_PATH, VERSION, None, load))
+    waiting = asyncio.ensure_future(get_or_load_dataframe(BLOB_PATH, VERSION, None, load))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+
+    assert (await waiting).equals(make_frame())
+    assert load.calls == 1
+
+
+def test_concurrent_partial_merges_keep_every_column():
+    columns = [f"column_{i}" for i in range(32)]
+    rows = pd.DataFrame({column: range(10_000) for column in columns})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda column: cache_dataframe(BLOB_PATH, VERSION, rows[[column]], is_full=False), columns))
+
+    cached = get_cached_dataframe(BLOB_PATH, VERSION, columns, copy=False)
+    assert cached is not None
+    assert sorted(cached.columns) == sorted(columns)
+
+
+async def test_loaded_frame_is_cached_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def record_thread(*args):
+        threads.append(threading.get_ident())
+        cache_dataframe(*args)
+
+    monkeypatch.setattr(dataframe_cache, "cache_dataframe", record_thread)
+
+    await get_or_load_dataframe(BLOB_PATH, VERSION, None, CountingLoader())
+
+    assert threads and threads[0] != threading.get_ident()
+    assert get_cached_dataframe(BLOB_PATH, VERSION, copy=False).equals(make_frame())
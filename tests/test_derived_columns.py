@@ -0,0 +1,86 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from app.models.data_sources import DataSource, DataSourceColumnMetadata
+from app.utils import blob_storage, code_sandbox, derived_columns, shared_frames
+from app.utils.blob_storage import lazy_dataframes_dict
+from app.utils.code_sandbox import run_generated_code, shutdown_code_sandbox, start_code_sandbox
+from app.utils.dataframe_cache import clear_dataframe_cache
+from app.utils.derived_columns import get_derived_column_stats
+from app.utils.shared_frames import clear_shared_frames, get_shared_frames_budget
+
+MONTH_CODE = """
+def main(datasets):
+    return datasets.derived("ds1", "order_date", "month").astype(str).tolist()
+"""
+
+ASSIGN_CODE = """
+def main(datasets):
+    orders = datasets["ds1"]
+    orders = orders[orders["units"] > 1].copy()
+    orders["month"] = datasets.derived("ds1", "order_date", "month")
+    month = datasets.derived("ds1", "order_date", "month")
+    month.iloc[0] = None
+    return orders["month"].astype(str).tolist()
+"""
+
+
+def make_data_source() -> DataSource:
+    now = datetime(2025, 1, 1)
+    return DataSource(
+        id="ds1", projectId="p1", type="csv", filename="orders.csv", blobPath="p1/orders.csv",
+        blobUrl="https://example.invalid/orders.csv", size=100, rows=3, columns=2, sampleData=[],
+        columnMetadata=[
+            DataSourceColumnMetadata(name="order_date", type="object"),
+            DataSourceColumnMetadata(name="units", type="int64"),
+        ],
+        status="READY", createdAt=now, lastUpdatedAt=now,
+    )
+
+
+@pytest.fixture
+async def sandbox(monkeypatch, tmp_path):
+    monkeypatch.setattr(code_sandbox.settings, "SANDBOX_WORKERS", 2)
+    monkeypatch.setattr(shared_frames.settings, "SHARED_FRAMES_DIR", str(tmp_path / "frames"))
+    get_shared_frames_budget.cache_clear()
+    loads = []
+
+    async def load_blob_df(blob_path, *args):
+        loads.append(blob_path)
+        return pd.DataFrame({"order_date": ["2025-01-15", "2025-02-03", "2025-02-20"], "units": [1, 2, 3]})
+
+    monkeypatch.setattr(blob_storage, "load_blob_df", load_blob_df)
+    clear_dataframe_cache()
+    derived_columns._entries.clear()
+    start_code_sandbox()
+    yield loads
+    shutdown_code_sandbox()
+    clear_dataframe_cache()
+    clear_shared_frames()
+    derived_columns._entries.clear()
+    get_shared_frames_budget.cache_clear()
+
+
+async def run(code: str) -> list:
+    async with lazy_dataframes_dict([make_data_source()]) as (dataframes, load_frame, load_derived):
+        return await run_generated_code(code, dataframes, load_frame=load_frame, load_derived=load_derived)
+
+
+async def test_derived_column_is_reused_across_workers(sandbox):
+    before = get_derived_column_stats()["byTransformation"].get("month", {"hits": 0, "misses": 0})
+
+    # Jobs take the idle workers in turn, so the second runs in the other worker
+    first = await run(MONTH_CODE)
+    second = await run(MONTH_CODE)
+
+    assert first == second == ["2025-01", "2025-02", "2025-02"]
+    after = get_derived_column_stats()["byTransformation"]["month"]
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+    assert sandbox == ["p1/orders.csv"]
+
+
+async def test_derived_column_aligns_with_filtered_rows_and_stays_private(sandbox):
+    assert await run(ASSIGN_CODE) == ["2025-02", "2025-02"]
+    # The job's write to its copy did not reach the cache
+    assert await run(MONTH_CODE) == ["2025-01", "2025-02", "2025-02"]
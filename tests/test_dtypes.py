@@ -0,0 +1,30 @@
+import io
+import numpy as np
+import pandas as pd
+from app.utils.columnar import parquet_bytes_to_dataframe
+from app.utils.dtypes import COMPACT_STRING_DTYPE, compact_dataframe
+
+
+def test_integers_stay_wide_enough_for_generated_arithmetic():
+    df = compact_dataframe(pd.DataFrame({"quantity": [2_000_000_000, 1_500_000_000], "units": [1, 2]}))
+
+    assert df["quantity"].dtype == np.int64 and df["units"].dtype == np.int64
+    assert (df["quantity"] * 2).tolist() == [4_000_000_000, 3_000_000_000]
+    assert (df["units"] * df["quantity"]).tolist() == [2_000_000_000, 3_000_000_000]
+
+
+def test_strings_are_compacted():
+    df = compact_dataframe(pd.DataFrame({"region": ["north", None, "east"], "mixed": ["a", 1, None]}))
+
+    assert df["region"].dtype == COMPACT_STRING_DTYPE
+    assert df["mixed"].dtype == object
+
+
+def test_int32_columns_of_older_compact_sidecars_are_widened():
+    content = io.BytesIO()
+    pd.DataFrame({"units": np.array([2_000_000_000, 1], dtype="int32"), "region": ["n", "s"]}).to_parquet(content)
+
+    df = parquet_bytes_to_dataframe(content.getvalue(), compact=True)
+
+    assert df["units"].dtype == np.int64
+    assert (df["units"] * 2).tolist() == [4_000_000_000, 2]
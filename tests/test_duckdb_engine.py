@@ -0,0 +1,61 @@
+from datetime import datetime
+import duckdb
+import pandas as pd
+import pytest
+from app.models.data_sources import CsvDialect, DataSource, DataSourceColumnMetadata
+from app.utils.datetime_columns import detect_datetime_columns
+from app.utils.duckdb_engine import get_csv_scan
+
+CSV_TEXT = (
+    "order date;shipped's at;region\n"
+    "31/01/2025;01-02-2025 09:30;north\n"
+    "02/02/2025;;south\n"
+    "15/03/2025;16-03-2025 18:05;east\n"
+)
+
+
+def make_data_source(df: pd.DataFrame, formats: dict[str, str], dialect: CsvDialect = None) -> DataSource:
+    now = datetime(2025, 1, 1)
+    return DataSource(
+        id="ds1", projectId="p1", type="csv", filename="orders.csv",
+        blobPath="p1/orders.csv", blobUrl="https://example.invalid/orders.csv",
+        dialect=dialect, size=len(CSV_TEXT), rows=len(df), columns=len(df.columns), sampleData=[],
+        columnMetadata=[
+            DataSourceColumnMetadata(name=col, type=str(df[col].dtype), format=formats.get(col))
+            for col in df.columns
+        ],
+        status="completed", createdAt=now, lastUpdatedAt=now,
+    )
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "orders.csv"
+    path.write_text(CSV_TEXT)
+    return str(path)
+
+
+def test_csv_scan_parses_recorded_date_formats(csv_path):
+    df, formats = detect_datetime_columns(pd.read_csv(csv_path, sep=";", dtype=str))
+    assert formats == {"order date": "%d/%m/%Y", "shipped's at": "%d-%m-%Y %H:%M"}
+    data_source = make_data_source(df, formats, CsvDialect(encoding="utf-8", delimiter=";"))
+
+    scanned = duckdb.sql(f"SELECT * FROM {get_csv_scan(csv_path, data_source)}")
+
+    assert dict(zip(scanned.columns, scanned.types)) == {
+        "order date": "TIMESTAMP", "shipped's at": "TIMESTAMP", "region": "VARCHAR",
+    }
+    assert scanned.fetchall() == [
+        (datetime(2025, 1, 31), datetime(2025, 2, 1, 9, 30), "north"),
+        (datetime(2025, 2, 2), None, "south"),
+        (datetime(2025, 3, 15), datetime(2025, 3, 16, 18, 5), "east"),
+    ]
+
+
+def test_csv_scan_without_date_formats(csv_path):
+    df = pd.read_csv(csv_path, sep=";", dtype=str)
+    data_source = make_data_source(df, {}, CsvDialect(encoding="utf-8", delimiter=";"))
+
+    scanned = duckdb.sql(f"SELECT region FROM {get_csv_scan(csv_path, data_source)}")
+
+    assert scanned.fetchall() == [("north",), ("south",), ("east",)]
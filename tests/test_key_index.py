@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from app.utils.key_index import KeyIndex, get_key_index_stats, merge_on_index
+
+
+def make_frames(probe_rows: int, indexed_rows: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    left = pd.DataFrame({"customer_id": np.arange(probe_rows) % 7, "amount": np.arange(probe_rows, dtype=float)})
+    right = pd.DataFrame({"id": np.arange(indexed_rows) % 5, "segment": [f"s{i}" for i in range(indexed_rows)]})
+    return left, right
+
+
+@pytest.mark.parametrize("how", ["inner", "left"])
+def test_large_indexed_side_probes_the_index(how):
+    left, right = make_frames(3, 40)
+    fallbacks = get_key_index_stats()["fallbacks"]
+
+    merged = merge_on_index(left, right, "customer_id", "id", how, KeyIndex(right["id"]))
+
+    assert get_key_index_stats()["fallbacks"] == fallbacks
+    expected = left.merge(right, left_on="customer_id", right_on="id", how=how)
+    pd.testing.assert_frame_equal(merged, expected, check_dtype=False)
+
+
+def test_small_indexed_side_falls_back_to_merge():
+    left, right = make_frames(40, 5)
+    fallbacks = get_key_index_stats()["fallbacks"]
+
+    merged = merge_on_index(left, right, "customer_id", "id", "inner", KeyIndex(right["id"]))
+
+    assert get_key_index_stats()["fallbacks"] == fallbacks + 1
+    pd.testing.assert_frame_equal(merged, left.merge(right, left_on="customer_id", right_on="id"))
+
+
+def test_index_does_not_share_memory_with_numpy_keys():
+    keys = pd.Series(np.arange(10))
+
+    assert not np.shares_memory(KeyIndex(keys).keys.to_numpy(), keys.to_numpy())
+
+
+@pytest.mark.parametrize("dtype", ["string[pyarrow]", pd.ArrowDtype(pa.string()), pd.ArrowDtype(pa.int64())])
+def test_index_does_not_share_buffers_with_arrow_keys(dtype):
+    keys = pd.Series(["a", "b", "c"] if "string" in str(dtype) else [1, 2, 3], dtype=dtype)
+
+    indexed = KeyIndex(keys).keys
+
+    assert indexed.dtype == keys.dtype and indexed.equals(keys)
+    source_buffers = {b.address for c in keys.array.__arrow_array__().chunks for b in c.buffers() if b is not None}
+    index_buffers = {b.address for c in indexed.array.__arrow_array__().chunks for b in c.buffers() if b is not None}
+    assert not source_buffers & index_buffers
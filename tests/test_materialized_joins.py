@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from app.services import materialized_joins
+from app.services.materialized_joins import _has_failed, _record_failure, schedule_materialized_join_refresh
+
+
+@pytest.fixture(autouse=True)
+def empty_state():
+    materialized_joins._failed_builds.clear()
+    yield
+    materialized_joins._failed_builds.clear()
+    materialized_joins._pending_refreshes.clear()
+
+
+async def test_refresh_requested_during_a_refresh_runs_after_it(monkeypatch):
+    started = []
+    release = asyncio.Event()
+
+    async def refresh(project_id, data_sources, relationships):
+        started.append(relationships)
+        await release.wait()
+
+    monkeypatch.setattr(materialized_joins, "refresh_materialized_joins", refresh)
+
+    schedule_materialized_join_refresh("p1", [], ["first"])
+    task = materialized_joins._refreshes["p1"]
+    await asyncio.sleep(0)
+    schedule_materialized_join_refresh("p1", [], ["second"])
+    schedule_materialized_join_refresh("p1", [], ["third"])
+    release.set()
+    await task
+
+    assert started == [["first"], ["third"]]
+    assert "p1" not in materialized_joins._refreshes
+
+
+async def test_follow_up_refresh_runs_after_a_failed_refresh(monkeypatch):
+    started = []
+
+    async def refresh(project_id, data_sources, relationships):
+        started.append(relationships)
+        await asyncio.sleep(0)
+        if relationships == ["first"]:
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(materialized_joins, "refresh_materialized_joins", refresh)
+
+    schedule_materialized_join_refresh("p1", [], ["first"])
+    task = materialized_joins._refreshes["p1"]
+    schedule_materialized_join_refresh("p1", [], ["second"])
+    await task
+
+    assert started == [["first"], ["second"]]
+
+
+def test_failed_builds_expire(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(materialized_joins.time, "monotonic", lambda: now)
+    monkeypatch.setattr(materialized_joins.settings, "MATERIALIZED_JOIN_RETRY_SECONDS", 60)
+
+    _record_failure(("r1", ()))
+    assert _has_failed(("r1", ()))
+
+    now += 61
+    assert not _has_failed(("r1", ()))
+    assert materialized_joins._failed_builds == {}
+
+
+def test_failed_builds_are_bounded(monkeypatch):
+    monkeypatch.setattr(materialized_joins.settings, "MATERIALIZED_JOIN_MAX_FAILED_BUILDS", 2)
+
+    for relationship_id in ("r1", "r2", "r3"):
+        _record_failure((relationship_id, ()))
+
+    assert list(materialized_joins._failed_builds) == [("r2", ()), ("r3", ())]
+
+
+class FakeJoinsCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find(self, query):
+        for document in list(self.documents):
+            sides = [{"manyDataSourceId": document["manyDataSourceId"]}, {"oneDataSourceId": document["oneDataSourceId"]}]
+            if document["projectId"] == query["projectId"] and ("$or" not in query or any(side in query["$or"] for side in sides)):
+                yield document
+
+    async def delete_one(self, query):
+        self.documents = [document for document in self.documents if document["_id"] != query["_id"]]
+
+
+async def test_deleting_a_data_source_deletes_its_joins_and_blobs(monkeypatch):
+    collection = FakeJoinsCollection([
+        {"_id": 1, "projectId": "p1", "manyDataSourceId": "orders", "oneDataSourceId": "customers", "blobPath": "p1/joins/a.parquet"},
+        {"_id": 2, "projectId": "p1", "manyDataSourceId": "items", "oneDataSourceId": "orders", "blobPath": "p1/joins/b.parquet"},
+        {"_id": 3, "projectId": "p1", "manyDataSourceId": "items", "oneDataSourceId": "products", "blobPath": "p1/joins/c.parquet"},
+    ])
+    deleted_blobs = []
+
+    async def cleanup(blobs):
+        deleted_blobs.extend(blob["path"] for blob in blobs)
+
+    monkeypatch.setattr(materialized_joins, "get_collection", lambda name: collection)
+    monkeypatch.setattr(materialized_joins, "cleanup_uploaded_blobs", cleanup)
+
+    assert await materialized_joins.delete_materialized_joins("p1", "orders") == 2
+    assert deleted_blobs == ["p1/joins/a.parquet", "p1/joins/b.parquet"]
+    assert [document["_id"] for document in collection.documents] == [3]
+
+    assert await materialized_joins.delete_materialized_joins("p1") == 1
+    assert collection.documents == []
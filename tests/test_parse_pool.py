@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import pytest
+from app.utils import parse_pool
+from app.utils.parse_pool import get_parse_pool_stats, run_parse_job, shutdown_parse_pool, start_parse_pool
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    monkeypatch.setattr(parse_pool.settings, "PARSE_POOL_KIND", "thread")
+    monkeypatch.setattr(parse_pool.settings, "PARSE_POOL_WORKERS", 1)
+    monkeypatch.setattr(parse_pool.settings, "PARSE_POOL_MAX_QUEUE", 1)
+    monkeypatch.setattr(parse_pool.settings, "PARSE_SLOT_WAIT_TIMEOUT_SECONDS", 1)
+    start_parse_pool()
+    release = threading.Event()
+    yield release
+    release.set()
+    shutdown_parse_pool()
+
+
+def wait_for(event: threading.Event) -> str:
+    event.wait(5)
+    return "done"
+
+
+async def test_timeout_reaches_the_caller_and_the_job_keeps_its_slot(thread_pool):
+    release = thread_pool
+
+    with pytest.raises(TimeoutError, match="did not finish within"):
+        await run_parse_job(wait_for, release, description="stuck parse", timeout=0.1)
+
+    assert parse_pool.parse_slots._value == 1
+    assert [job["description"] for job in get_parse_pool_stats()["orphaned"]] == ["stuck parse"]
+
+
+async def test_orphaned_jobs_holding_every_worker_reject_new_jobs(thread_pool):
+    release = thread_pool
+    with pytest.raises(TimeoutError):
+        await run_parse_job(wait_for, release, description="stuck parse", timeout=0.1)
+
+    with pytest.raises(TimeoutError, match="busy with 1 timed out jobs"):
+        await run_parse_job(str, 1, description="next parse")
+    assert get_parse_pool_stats()["rejected"] == 1
+
+
+async def test_slot_and_worker_return_when_the_orphaned_job_ends(thread_pool):
+    release = thread_pool
+    with pytest.raises(TimeoutError):
+        await run_parse_job(wait_for, release, description="stuck parse", timeout=0.1)
+
+    release.set()
+    while get_parse_pool_stats()["orphaned"]:
+        await asyncio.sleep(0.01)
+    assert await run_parse_job(str, 1, description="waits for the stuck parse") == "1"
+
+    assert parse_pool.parse_slots._value == 2
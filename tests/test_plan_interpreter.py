@@ -0,0 +1,84 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from app.models.data_sources import DataSource, DataSourceColumnMetadata
+from app.models.operation_plan import (
+    AggregateFunction, ColumnRef, FilterOperator, OperationPlan, PlanAggregation, PlanFilter
+)
+from app.utils.plan_interpreter import execute_plan, get_plan_columns, validate_plan
+
+SALES_ID = "665f1c2e9b1e8a0012345678"
+
+
+@pytest.fixture
+def sales() -> pd.DataFrame:
+    return pd.DataFrame({
+        "region": ["north", "south", "north", "east", "west"],
+        "revenue": [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+
+
+@pytest.fixture
+def data_sources(sales) -> list[DataSource]:
+    now = datetime(2025, 1, 1)
+    return [DataSource(
+        id=SALES_ID,
+        projectId="665f1c2e9b1e8a0000000001",
+        type="csv",
+        filename="sales.csv",
+        blobPath="project/20250101_000000_sales.csv",
+        blobUrl="https://example.blob.core.windows.net/csvfiles/sales.csv",
+        size=100,
+        rows=len(sales),
+        columns=len(sales.columns),
+        sampleData=[],
+        columnMetadata=[DataSourceColumnMetadata(name=col, type=str(dtype)) for col, dtype in sales.dtypes.items()],
+        status="READY",
+        createdAt=now,
+        lastUpdatedAt=now,
+    )]
+
+
+def count_plan(**kwargs) -> OperationPlan:
+    return OperationPlan(
+        base_dataset_id=SALES_ID,
+        aggregations=[PlanAggregation(function=AggregateFunction.COUNT, alias="rows")],
+        **kwargs,
+    )
+
+
+def load(plan: OperationPlan, sales: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """The frames as the loader projects them to the plan's columns"""
+    return {SALES_ID: sales[get_plan_columns(plan)[SALES_ID]]}
+
+
+def test_plain_row_count(sales, data_sources):
+    plan = count_plan()
+    validate_plan(plan, data_sources)
+
+    assert get_plan_columns(plan) == {SALES_ID: []}
+    assert execute_plan(plan, data_sources, load(plan, sales)) == [{"rows": 5}]
+
+
+def test_filtered_row_count(sales, data_sources):
+    plan = count_plan(filters=[
+        PlanFilter(column=ColumnRef(dataset_id=SALES_ID, column="revenue"), operator=FilterOperator.GT, value=15)
+    ])
+
+    assert execute_plan(plan, data_sources, load(plan, sales)) == [{"rows": 4}]
+
+
+def test_grouped_row_count(sales, data_sources):
+    plan = count_plan(group_by=[ColumnRef(dataset_id=SALES_ID, column="region")])
+
+    result = {row["region"]: row["rows"] for row in execute_plan(plan, data_sources, load(plan, sales))}
+
+    assert result == {"north": 2, "south": 1, "east": 1, "west": 1}
+
+
+def test_row_count_next_to_column_aggregation(sales, data_sources):
+    plan = count_plan()
+    plan.aggregations.append(PlanAggregation(
+        column=ColumnRef(dataset_id=SALES_ID, column="revenue"), function=AggregateFunction.SUM, alias="revenue"))
+
+    assert execute_plan(plan, data_sources, load(plan, sales)) == [{"rows": 5, "revenue": 150.0}]
@@ -0,0 +1,73 @@
+import os
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from app.utils import shared_frames
+from app.utils.shared_frames import (
+    clear_shared_frames, get_shared_frames_budget, open_shared_frame, release_shared_frames, share_dataframe
+)
+
+BLOB_PATH = "project/20250101_000000_sales.csv"
+VERSION = "2025-01-01T00:00:00"
+
+
+@pytest.fixture(autouse=True)
+def shared_frames_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_frames.settings, "SHARED_FRAMES_DIR", str(tmp_path / "frames"))
+    get_shared_frames_budget.cache_clear()
+    yield tmp_path / "frames"
+    clear_shared_frames()
+    get_shared_frames_budget.cache_clear()
+
+
+def make_frame() -> pd.DataFrame:
+    return pd.DataFrame({"region": ["north", "south"], "revenue": [10.0, 20.0]})
+
+
+def list_files(directory) -> list[str]:
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+def test_share_and_open(shared_frames_dir):
+    handle = share_dataframe(BLOB_PATH, VERSION, None, make_frame())
+
+    assert open_shared_frame(handle).equals(make_frame())
+    release_shared_frames([handle])
+
+
+def test_failed_rename_leaves_no_temp_file(shared_frames_dir, monkeypatch):
+    def fail_replace(source, target):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(shared_frames.os, "replace", fail_replace)
+
+    assert share_dataframe(BLOB_PATH, VERSION, None, make_frame()) is None
+    assert list_files(shared_frames_dir) == []
+
+
+def test_failed_write_leaves_no_temp_file(shared_frames_dir, monkeypatch):
+    def fail_new_file(sink, schema):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(shared_frames.pa.ipc, "new_file", fail_new_file)
+
+    assert share_dataframe(BLOB_PATH, VERSION, None, make_frame()) is None
+    assert list_files(shared_frames_dir) == []
+
+
+def test_budget_is_capped_by_filesystem_size(monkeypatch):
+    # Docker's default 64 MB /dev/shm
+    monkeypatch.setattr(shared_frames.os, "statvfs", lambda path: SimpleNamespace(f_blocks=16384, f_frsize=4096))
+
+    assert get_shared_frames_budget() == 32 * 1024 * 1024
+
+
+def test_budget_keeps_setting_on_large_filesystem(monkeypatch):
+    monkeypatch.setattr(shared_frames.os, "statvfs", lambda path: SimpleNamespace(f_blocks=64 * 1024 * 1024, f_frsize=4096))
+
+    assert get_shared_frames_budget() == shared_frames.settings.SHARED_FRAMES_MAX_BYTES
+
+
+def test_frames_over_budget_are_not_shared(shared_frames_dir, monkeypatch):
+    monkeypatch.setattr(shared_frames.os, "statvfs", lambda path: SimpleNamespace(f_blocks=1, f_frsize=128))
+
+    assert share_dataframe(BLOB_PATH, VERSION, None, make_frame()) is None
+    assert list_files(shared_frames_dir) == []